@@ -17,8 +17,11 @@ setuptools.setup(
   packages         = setuptools.find_packages(),
   package_data     = {'' : ['*.json']},
   scripts          = ['bin/NAM40_Products',
-                      'bin/GFS_Products'],
-  install_requires = ['cartopy', 'matplotlib', 'metpy', 'pyproj', 'python-awips'],
+                      'bin/GFS_Products',
+                      'bin/HDWX_Worker',
+                      'bin/HDWX_Render'],
+  install_requires = ['cartopy', 'contourpy', 'matplotlib', 'metpy', 'numpy', 'pillow',
+                      'pyproj', 'python-awips'],
   zip_safe         = False
 )
 
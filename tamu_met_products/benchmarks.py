@@ -0,0 +1,227 @@
+"""
+Micro-benchmarks that run without EDEX, on synthetic fields
+
+Run as:
+  python -m tamu_met_products.benchmarks render
+  python -m tamu_met_products.benchmarks diagnostics
+
+"""
+import logging
+from time import perf_counter
+
+import numpy as np
+import matplotlib
+matplotlib.use( 'agg' )
+import matplotlib.pyplot as plt
+
+from .plotting.render_profile import setProfile, contourfOpts
+from .plotting.contour_cache import cachedContour
+from .data_backends.diagnostics import Diagnostics
+
+def syntheticFields( nx = 185, ny = 129, seed = 0 ):
+  """
+  Smooth synthetic fields on a grid the size of the NAM 40 km domain
+
+  Returns:
+    dict : Data with 'xx' and 'yy' grids, 'mslp' in hPa, and 'rh' in percent
+
+  """
+
+  rng    = np.random.default_rng( seed )
+  xx, yy = np.meshgrid( np.linspace( -1, 1, nx ), np.linspace( -1, 1, ny ) )
+  mslp   = 1012.0
+  rh     = 50.0
+  for _ in range(12):                                                           # Sum of random highs and lows
+    x0, y0, width = rng.uniform( -1, 1 ), rng.uniform( -1, 1 ), rng.uniform( 0.1, 0.4 )
+    bump  = np.exp( -((xx - x0)**2 + (yy - y0)**2) / (2 * width**2) )
+    mslp  = mslp + rng.uniform( -20, 20 ) * bump
+    rh    = rh   + rng.uniform( -40, 40 ) * bump
+  rh    = np.clip( rh + rng.normal( 0, 2, xx.shape ), 0, 100 )
+  return {'xx' : xx, 'yy' : yy, 'mslp' : mslp, 'rh' : rh}
+
+def _render( data, dpi ):
+  """Render one product-like image; filled RH with labeled MSLP contours"""
+
+  fig = plt.figure( figsize = (16, 9), dpi = dpi )
+  ax  = fig.add_axes( [0.005, 0.06, 0.99, 0.935] )
+  ax.contourf( data['xx'], data['yy'], data['rh'], levels = np.arange( 0, 101, 5 ),
+               cmap = 'BrBG', **contourfOpts() )
+  cachedContour( ax, data, ('mslp', '0.0MSL', 'hPa'), data['mslp'],
+                 np.arange( 960, 1060, 4 ), labels = True, colors = 'k', linewidths = 2 )
+  fig.canvas.draw()
+  img = np.asarray( fig.canvas.buffer_rgba() )[..., :3].copy()
+  plt.close( fig )
+  return img
+
+def renderProfiles( profiles = ('default', 'fast'), dpi = 120, repeat = 5 ):
+  """
+  Time rendering of the same fields under render profiles
+
+  Each repeat renders two images from the same forecast hour, as products
+  that share contours do, so the second image can reuse contour geometry
+  and label placement.
+
+  Keyword arguments:
+    profiles (tuple) : Names of profiles to compare; the first is the
+      reference for image differences
+    dpi (int) : Resolution to render at
+    repeat (int) : Number of forecast hours to render
+
+  Returns:
+    dict : Mean seconds per image, and maximum and mean absolute pixel
+      difference from the reference, for each profile
+
+  """
+
+  results   = {}
+  reference = None
+  for name in profiles:
+    setProfile( name )
+    times = []
+    for i in range( repeat ):
+      data  = syntheticFields( seed = i )
+      start = perf_counter()
+      img   = _render( data, dpi )
+      _render( data, dpi )
+      times.append( (perf_counter() - start) / 2 )
+    if reference is None: reference = img
+    diff = np.abs( img.astype(np.int16) - reference.astype(np.int16) )
+    results[name] = {'seconds' : float( np.mean( times ) ),
+                     'max diff' : int( diff.max() ), 'mean diff' : float( diff.mean() )}
+  setProfile( profiles[0] )
+  return results
+
+def syntheticLevels( nlevels = 5, nx = 185, ny = 129, seed = 0 ):
+  """
+  Synthetic winds, temperature, and dewpoint on pressure levels
+
+  Returns:
+    dict : 'lon' and 'lat' of a CONUS grid, in degrees, 'pressure' in Pa,
+      and 'u', 'v', 'temperature', and 'dewpoint', in SI units, of shape
+      (nlevels, ny, nx)
+
+  """
+
+  rng      = np.random.default_rng( seed )
+  lon, lat = np.meshgrid( np.linspace( -135, -60, nx ), np.linspace( 15, 55, ny ) )
+  pressure = np.linspace( 1000, 500, nlevels ) * 100.0
+  base     = syntheticFields( nx, ny, seed )['mslp'] - 1012.0
+  scale    = rng.uniform( 0.5, 1.5, (nlevels, 1, 1) )
+  temperature = 300.0 - 40.0 * (1.0e5 - pressure[:, None, None]) / 5.0e4 - (lat - 15) * 0.5 + base * scale
+  return {'lon'         : lon,
+          'lat'         : lat,
+          'pressure'    : pressure,
+          'u'           : 10.0 + np.gradient( base, axis = 0 )[None] * 40 * scale,
+          'v'           : -np.gradient( base, axis = 1 )[None] * 40 * scale,
+          'temperature' : temperature,
+          'dewpoint'    : temperature - rng.uniform( 2, 15, temperature.shape )}
+
+def _relError( ref, val ):
+  """Largest absolute difference relative to largest absolute value of reference"""
+
+  ref = np.asarray( getattr( ref, 'magnitude', ref ) )
+  return float( np.nanmax( np.abs( ref - val ) ) / np.nanmax( np.abs( ref ) ) )
+
+def diagnostics( nlevels = 5, repeat = 3, columns = 200 ):
+  """
+  Time diagnostics, and compare them, against the metpy equivalents
+
+  Metpy is called one level at a time, as it was in the downloader;
+  precipitable water is compared on a sample of columns only, as metpy
+  computes one column per call.
+
+  Keyword arguments:
+    nlevels (int) : Number of pressure levels
+    repeat (int) : Number of times to time each diagnostic
+    columns (int) : Number of columns to compare precipitable water on
+
+  Returns:
+    dict : Seconds for metpy and for the stencils, and largest relative
+      difference, for each diagnostic
+
+  """
+
+  import metpy.calc as mpcalc
+  from metpy.units import units
+
+  fields = syntheticLevels( nlevels )
+  lon, lat, p = fields['lon'], fields['lat'], fields['pressure']
+  u, v, T, Td = fields['u'], fields['v'], fields['temperature'], fields['dewpoint']
+  theta  = Diagnostics.potentialTemperature( T, p[:, None, None] )
+  pLevel = p[:, None, None]
+
+  start  = perf_counter()
+  diag   = Diagnostics( lon, lat )
+  setup  = perf_counter() - start
+  dx, dy = mpcalc.lat_lon_grid_deltas( lon * units.degree, lat * units.degree )
+  ms     = units('m/s')
+  K      = units.K
+
+  cases = {
+    'absolute vorticity'    : (
+      lambda : [mpcalc.absolute_vorticity( u[i] * ms, v[i] * ms, dx = dx, dy = dy,
+                                           latitude = lat * units.degree ) for i in range(nlevels)],
+      lambda : diag.absoluteVorticity( u, v ) ),
+    'temperature advection' : (
+      lambda : [mpcalc.advection( T[i] * K, u[i] * ms, v[i] * ms, dx = dx, dy = dy ) for i in range(nlevels)],
+      lambda : diag.temperatureAdvection( T, u, v ) ),
+    'frontogenesis'         : (
+      lambda : [mpcalc.frontogenesis( theta[i] * K, u[i] * ms, v[i] * ms, dx = dx, dy = dy ) for i in range(nlevels)],
+      lambda : diag.frontogenesis( theta, u, v ) ),
+    'q-vector'              : (
+      lambda : [mpcalc.q_vector( u[i] * ms, v[i] * ms, T[i] * K, p[i] * units.Pa,
+                                 dx = dx, dy = dy )[0] for i in range(nlevels)],
+      lambda : diag.qVector( u, v, T, pLevel )[0] ),
+  }
+
+  rng  = np.random.default_rng( 0 )
+  cols = list( zip( rng.integers( 0, lat.shape[0], columns ), rng.integers( 0, lat.shape[1], columns ) ) )
+  cases['precipitable water'] = (
+    lambda : [mpcalc.precipitable_water( p * units.Pa, Td[:, j, i] * K ).to('mm') for j, i in cols],
+    lambda : diag.precipitableWater( p, Td ) )
+
+  results = {}
+  for name, (reference, stencil) in cases.items():
+    times = []
+    for func in (reference, stencil):
+      start = perf_counter()
+      for _ in range( repeat ):
+        out = func()
+      times.append( (perf_counter() - start) / repeat )
+      if func is reference: ref = out
+    if name == 'precipitable water':
+      error = _relError( np.array( [col.magnitude for col in ref] ),
+                         np.array( [out[j, i] for j, i in cols] ) )
+    else:
+      error = _relError( np.stack( [np.asarray( getattr( r, 'magnitude', r ) ) for r in ref] ), out )
+    results[name] = {'metpy' : times[0], 'stencil' : times[1], 'error' : error}
+  results['grid setup'] = {'metpy' : float('nan'), 'stencil' : setup, 'error' : 0.0}
+  return results
+
+if __name__ == "__main__":
+  import argparse
+  parser = argparse.ArgumentParser( description = 'Benchmarks on synthetic fields' )
+  subparsers = parser.add_subparsers( dest = 'benchmark', required = True )
+
+  render = subparsers.add_parser( 'render', help = 'Compare render profiles' )
+  render.add_argument( '--dpi',    type=int, default=120, help='Resolution to render at')
+  render.add_argument( '--repeat', type=int, default=5,   help='Number of forecast hours to render')
+  render.add_argument( 'profiles', nargs='*', default=['default', 'fast'], help='Render profiles to compare; the first is the reference')
+
+  diag = subparsers.add_parser( 'diagnostics', help = 'Compare diagnostics against metpy' )
+  diag.add_argument( '--levels', type=int, default=5, help='Number of pressure levels')
+  diag.add_argument( '--repeat', type=int, default=3, help='Number of times to time each diagnostic')
+  args = parser.parse_args()
+
+  logging.getLogger( 'tamu_met_products' ).setLevel( logging.WARNING )
+  if args.benchmark == 'render':
+    results = renderProfiles( tuple( args.profiles ), dpi = args.dpi, repeat = args.repeat )
+    base    = results[ args.profiles[0] ]['seconds']
+    for name, res in results.items():
+      print( f"{name:>12s} : {res['seconds']*1000:8.1f} ms/image, "
+             f"{base/res['seconds']:5.2f}x, max diff {res['max diff']:3d}, mean diff {res['mean diff']:.3f}" )
+  else:
+    results = diagnostics( nlevels = args.levels, repeat = args.repeat )
+    for name, res in results.items():
+      print( f"{name:>22s} : metpy {res['metpy']*1000:9.2f} ms, stencil {res['stencil']*1000:8.2f} ms, "
+             f"{res['metpy']/res['stencil']:6.1f}x, relative error {res['error']:.2e}" )
@@ -0,0 +1,215 @@
+import logging
+
+import numpy as np
+
+PRECIP  = ('precip', '0.0SFC')                                                  # Standard name and level of period precipitation
+T2M     = ('temperature', '2.0FHAG')                                            # Standard name and level of 2 m temperature
+TOTAL   = 'precip total'
+DAILY   = 'precip 24hr'
+TMAX    = 'temperature max'
+TMIN    = 'temperature min'
+STATE   = 'accum'                                                               # Name of state files in the grid cache
+FIELDS  = (TOTAL, DAILY, TMAX, TMIN)                                            # Names of the fields added to forecast hours; never in grid cache files
+
+class Accumulator( object ):
+  """
+  Streaming accumulation of fields across the forecast hours of a model cycle
+
+  Forecast hours are passed to update() as they are downloaded; each hour is
+  processed once, and only a compact running state is kept: the total
+  precipitation, the maximum and minimum 2 m temperature, and the total
+  precipitation at the period boundaries of the last 24 hours. The fields
+  added to each forecast hour are:
+
+    'precip total'    : precipitation accumulated since initialization
+    'precip 24hr'     : precipitation accumulated over the last 24 hours
+    'temperature max' : maximum 2 m temperature over the forecast hours seen
+    'temperature min' : minimum 2 m temperature over the forecast hours seen
+
+  If a grid cache is used, the running state is written to the cache after
+  every hour, so that a later run, or another worker, can continue the
+  accumulation from there without re-downloading earlier hours.
+
+  Every available forecast hour should be passed, in order, so that the
+  extremes are sampled at the output interval of the model; see unseen().
+  Precipitation totals are only produced when every precipitation period
+  since initialization was seen; if a period was missed, e.g., because an
+  hour failed to download, the totals are left out of that hour, and its
+  running state is not written to the cache, so that later hours are not
+  built on it once the missed hour is accumulated.
+
+  """
+
+  def __init__(self, model, cache = None, period = 21600):
+    """
+    Arguments:
+      model (str) : Name of the model
+
+    Keyword arguments:
+      cache (GridCache) : Grid cache to write running state to, and read it
+        from, so accumulation can continue across runs
+      period (int) : Accumulation period, in seconds, of the precipitation
+        variable; default is 6 hours for TP6hr
+
+    """
+
+    self.log     = logging.getLogger(__name__)
+    self.model   = model
+    self.cache   = cache
+    self.period  = period
+    self._state  = None
+    self._totals = {}                                                           # Precipitation totals at period boundaries in last 24 hours
+
+  def update( self, data ):
+    """
+    Add accumulated fields to the data of the next forecast hour
+
+    Arguments:
+      data (AWIPSData) : Data for a forecast hour; updated in place
+
+    Returns:
+      AWIPSData : The input data
+
+    """
+
+    init  = data['initTime']
+    fcst  = int( (data['fcstTime'] - init).total_seconds() )
+    state = self._state
+    if state is None or state['init'] != init or state['fcst'] >= fcst or self._behind( state, fcst ):
+      state = self._restore( init, fcst )
+
+    precip = self._getVar( data, *PRECIP )
+    t2m    = self._getVar( data, *T2M )
+
+    if state is None:                                                           # First hour of cycle
+      state = {'init' : init, 'fcst' : fcst, 'total' : None,
+               'complete' : fcst < self.period, 'tmax' : None, 'tmin' : None}
+      if not state['complete']:
+        self.log.warning( f'No accumulation state before forecast hour {fcst//3600}; totals not computed' )
+    else:
+      state = state.copy()
+      ends  = range( (state['fcst'] // self.period + 1) * self.period, fcst + 1, self.period ) # Period ends between last hour and this one
+      for end in ends:
+        if end == fcst and precip is not None and state['complete']:
+          state['total'] = precip if state['total'] is None else state['total'] + precip
+        else:
+          if state['complete']:
+            self.log.warning( f'Missed precipitation period ending at hour {end//3600}; totals not computed' )
+          state['complete'] = False
+      state['fcst'] = fcst
+
+    if t2m is not None:
+      state['tmax'] = t2m if state['tmax'] is None else np.fmax( state['tmax'], t2m )
+      state['tmin'] = t2m if state['tmin'] is None else np.fmin( state['tmin'], t2m )
+
+    self._state = state
+    self._addFields( data, state )
+    self._save( state )
+    return data
+
+  def unseen( self, init, fcsts ):
+    """
+    Forecast times that were not accumulated
+
+    Arguments:
+      init (datetime) : Initialization time of the model cycle
+      fcsts (iterable) : Forecast times, in seconds since initialization
+
+    Returns:
+      list : Forecast times of fcsts that have no running state in the
+        cache; all of them if there is no cache
+
+    """
+
+    fcsts = list( fcsts )
+    if self.cache is None: return fcsts
+    seen = set( self.cache.stateTimes( self.model, init, STATE ) )
+    return [fcst for fcst in fcsts if fcst not in seen]
+
+  def _addFields( self, data, state ):
+    """Add accumulated fields to data"""
+
+    if state['tmax'] is not None:
+      data[TMAX] = {T2M[1] : state['tmax']}
+      data[TMIN] = {T2M[1] : state['tmin']}
+    if not state['complete'] or state['total'] is None: return
+
+    fcst  = state['fcst']
+    data[TOTAL] = {PRECIP[1] : state['total']}
+    if fcst % self.period == 0:
+      self._totals = {key : val for key, val in self._totals.items() if key >= fcst - 86400}
+      self._totals[fcst] = state['total']                                       # Keep totals for the last 24 hours only
+
+    start = (fcst // self.period) * self.period - 86400                         # 24 hours before last period boundary
+    if start < 0: return
+    if start == 0:
+      data[DAILY] = {PRECIP[1] : state['total']}
+      return
+    before = self._totalAt( state['init'], start )
+    if before is not None:
+      data[DAILY] = {PRECIP[1] : state['total'] - before}
+
+  def _totalAt( self, init, fcst ):
+    """Precipitation total at a period boundary; from memory or the cache"""
+
+    if fcst in self._totals: return self._totals[fcst]
+    if self.cache is None: return None
+    state = self.cache.loadState( self.model, init, fcst, STATE )
+    if state is None or TOTAL not in state: return None
+    return state[TOTAL][PRECIP[1]]
+
+  def _save( self, state ):
+    """Write running state to the cache"""
+
+    if self.cache is None: return
+    if not state['complete']:
+      self.log.debug( f'Not saving accumulation state of forecast hour {state["fcst"]//3600}; periods were missed' )
+      return
+    data = {}
+    if state['total'] is not None:
+      data[TOTAL] = {PRECIP[1] : state['total']}
+    if state['tmax'] is not None:
+      data[TMAX] = {T2M[1] : state['tmax']}
+      data[TMIN] = {T2M[1] : state['tmin']}
+    try:
+      self.cache.saveState( self.model, state['init'], state['fcst'], STATE, data )
+    except Exception as err:
+      self.log.warning( f'Failed to save accumulation state : {err}' )
+
+  def _behind( self, state, fcst ):
+    """Check if the cache has a later state, before fcst, than the running one; e.g., after rendering an earlier hour again"""
+
+    if self.cache is None: return False
+    return any( state['fcst'] < time < fcst for time in self.cache.stateTimes( self.model, state['init'], STATE ) )
+
+  def _restore( self, init, fcst ):
+    """
+    Restore running state from the latest hour, before fcst, in the cache
+
+    Returns:
+      dict : Running state; None if there is no earlier state
+
+    """
+
+    self._totals = {}
+    if self.cache is None or fcst == 0: return None
+    times = [time for time in self.cache.stateTimes( self.model, init, STATE ) if time < fcst]
+    if len(times) == 0: return None
+
+    prev  = self.cache.loadState( self.model, init, times[-1], STATE )
+    if prev is None: return None
+    self.log.debug( f'Restored accumulation state from forecast hour {times[-1]//3600}' )
+    total = prev.get( TOTAL, {} ).get( PRECIP[1], None )
+    return {'init'     : init,
+            'fcst'     : times[-1],
+            'total'    : total,
+            'complete' : total is not None or times[-1] < self.period,
+            'tmax'     : prev.get( TMAX, {} ).get( T2M[1], None ),
+            'tmin'     : prev.get( TMIN, {} ).get( T2M[1], None )}
+
+  @staticmethod
+  def _getVar( data, name, level ):
+    try:
+      return data.getVar( name, level )
+    except:
+      return None
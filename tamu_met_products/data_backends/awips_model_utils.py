@@ -1,22 +1,27 @@
 import logging
 from os import linesep
+from time import monotonic
 from datetime import datetime, timedelta
-from threading import Thread
+from threading import Thread, Condition, Event
 from queue import Queue
 
 import numpy as np
 from metpy.units import units
 from metpy.calc import (
-  absolute_vorticity, 
   mixed_parcel,
   parcel_profile,
   cape_cin,
-  equivalent_potential_temperature, 
-  lat_lon_grid_deltas
+  equivalent_potential_temperature
 )
 
 from awips.dataaccess import DataAccessLayer as DAL
 
+from .edex_requests import EDEXRequester
+from .time_index import TimeIndex, parseRefTime
+from .diagnostics import forGrid, stackLevels
+from .accumulator import PRECIP, T2M
+from ..metrics import GRIDS_DOWNLOADED, GRID_BYTES, GRID_CACHE_HITS, DOWNLOAD_SECONDS
+
 ISO = '%Y-%m-%d %H:%M:%S'  # ISO format for date
 
 def calcMLCAPE( levels, temperature, dewpoint, depth = 100.0 * units.hPa ):
@@ -44,7 +49,7 @@ def get_init_fcst_times( time, strfmt = None ):
 
   """
 
-  initTime = datetime.strptime( str(time), ISO )
+  initTime = parseRefTime( str(time) )                                          # Parsed once per reference time
   fcstTime = initTime + timedelta( seconds = time.getFcstTime() )
   if isinstance( strfmt, str ):
     initTime = initTime.strftime( strfmt )
@@ -62,8 +67,87 @@ class AWIPSData( dict ):
   exists. If the data does NOT exist, then an exception is raised.
   Place class to this method in a try/except block.
 
+  Data may also be published progressively, while it is downloaded: the
+  downloader adds fields under the lock and calls publish(), and consumers
+  wait for new fields with waitUpdate() and read a consistent snapshot()
+  until the data is complete. Consumers may release fields they are done
+  with, under the lock, except those the downloader still needs, listed
+  in pinned.
+
   """
 
+  def __init__(self, *args, **kwargs):
+    super().__init__( *args, **kwargs )
+    self.lock     = Condition()                                                 # Held while fields are added, or copied
+    self.version  = 0                                                           # Incremented every time fields are published
+    self.complete = True                                                        # Data is complete unless published progressively
+    self.error    = None                                                        # Exception that stopped a progressive download
+    self.pinned   = set()                                                       # Fields, (name, level), consumers must keep until complete
+
+  def publish( self, complete = False, error = None ):
+    """
+    Notify consumers that fields were added
+
+    Keyword arguments:
+      complete (bool) : Set if no more fields will be added
+      error (Exception) : Set if the download failed; implies complete
+
+    """
+
+    with self.lock:
+      self.version += 1
+      self.complete = complete or error is not None
+      if error is not None: self.error = error
+      self.lock.notify_all()
+
+  def waitUpdate( self, version, timeout = None ):
+    """
+    Wait until fields are published after a given version
+
+    Arguments:
+      version (int) : Version already seen by the consumer
+
+    Keyword arguments:
+      timeout (float) : Seconds to wait at most
+
+    Returns:
+      tuple : Current version, and whether the data are complete
+
+    """
+
+    with self.lock:
+      self.lock.wait_for( lambda : self.version != version or self.complete, timeout )
+      return self.version, self.complete
+
+  def snapshot( self ):
+    """
+    Copy of the data as currently published; arrays are shared, not copied
+
+    Returns:
+      AWIPSData : Data that is not modified by the downloader
+
+    """
+
+    with self.lock:
+      return AWIPSData( {key : dict(val) if isinstance( val, dict ) else val 
+                           for key, val in self.items()} )
+
+  def hasFields( self, fields ):
+    """
+    Check that fields are present
+
+    Arguments:
+      fields (dict) : Levels of each field, keyed by name
+
+    Returns:
+      bool : True if all levels of all fields are present
+
+    """
+
+    with self.lock:
+      return all( level in self.get( name, {} ) for name, levels in fields.items()
+                                                for level in levels )
+
   def getVar( self, name, level=None ):
     """
     Get a variable, at given level
@@ -109,19 +193,113 @@ class AWIPSModelDownloader( object ):
   Model data downloader
   """
 
-  def __init__(self, modelName, EDEX = "edex-cloud.unidata.ucar.edu", **kwargs):
+  def __init__(self, modelName, EDEX = "edex-cloud.unidata.ucar.edu", cache = None, 
+                     requestOpts = None, indexOpts = None, accumulator = None, **kwargs):
+    """
+    Arguments:
+      modelName (str) : Name of the model to download data for
+
+    Keyword arguments:
+      EDEX (str) : URL for EDEX host to use
+      cache (GridCache) : Local cache of downloaded grids; if set, grids are
+        read from the cache when available and saved to it after download
+      requestOpts (dict) : Keywords for the EDEXRequester; timeout, retries,
+        backoff, hedge_percentile, etc.
+      indexOpts (dict) : Keywords for the TimeIndex; final and settle
+      accumulator (Accumulator) : If set, fields accumulated over forecast
+        hours (e.g., total precipitation) are added to the data of each
+        forecast hour as it is downloaded
+
+    """
 
     self.log   = logging.getLogger(__name__)                                    # Initialize a logger
     self.log.debug( f'Using EDEX : {EDEX}' )
 
     DAL.changeEDEXHost( EDEX )                                                  # Set the EDEX host
-    self._request = DAL.newDataRequest()                                        # Initialize a new data request
-    self._request.setDatatype( "grid" )                                         # Set data request type to grid data
-    self._request.setLocationNames( modelName )                                 # Set data set to modelName
+    self.modelName = modelName
+    self.requester = EDEXRequester( EDEX, model = modelName, **(requestOpts or {}) ) # Requests with timeouts, retries, and hedging
+    self._request  = self._newRequest()                                         # Initialize a new data request
 
     self.queue = Queue( 2 )                                                     # Allow queue to have up-to 2 items
+    self.cache = cache
+    self.accumulator = accumulator
+    self._indexOpts = indexOpts or {}
+    self.index = TimeIndex( cache.indexPath( modelName ) if cache is not None else None, **self._indexOpts ) # Forecast times of each cycle; kept with the grid cache
+    self._cycleTimes = {}                                                       # Forecast times for cycles looked up by findTime()
+
+  def afterFork( self ):
+    """
+    Make the downloader safe to use in a child forked from its process
+
+    The request slots of the parent may be held by its threads, which do
+    not exist in the child, so the requester takes fresh ones; the index of
+    forecast times is re-read, as other children may have updated it.
+
+    """
+
+    self.requester.afterFork()
+    self.index       = TimeIndex( self.index.path, **self._indexOpts )
+    self._cycleTimes = {}
+
+  def _newRequest( self, parameters = None, levels = None ):
+    """
+    Create a new grid data request for the model
+
+    A new request is created for each download so that a request object is
+    never modified while an abandoned, or hedged, request may still be
+    using it.
+
+    Keyword arguments:
+      parameters (list) : Parameters to request
+      levels (list) : Levels to request
+
+    Returns:
+      IDataRequest : New data request
+
+    """
+
+    request = DAL.newDataRequest()
+    request.setDatatype( "grid" )                                               # Set data request type to grid data
+    request.setLocationNames( self.modelName )                                  # Set data set to modelName
+    if parameters: request.setParameters( *parameters )                         # Set parameters for the download request
+    if levels:     request.setLevels(     *levels )                             # Set levels for the download request
+    return request
+
+  def cycles( self, start = None, end = None ):
+    """
+    Get model cycles available on the EDEX server
 
-  def fcst_times( self, interval = 3600, max_forecast = None ):
+    Arguments:
+      None.
+
+    Keyword arguments:
+      start (datetime) : Earliest initialization time to include
+      end (datetime) : Latest initialization time to include
+
+    Returns:
+      list : Initialization datetimes of cycles, oldest first
+
+    """
+
+    cycles = self._availableCycles()
+    return [c for c in cycles if (start is None or c >= start) and (end is None or c <= end)]
+
+  def _availableCycles( self ):
+    """
+    Request the cycles available on the EDEX server, and sync the time index
+
+    Returns:
+      list : Initialization datetimes of cycles, oldest first
+
+    """
+
+    cycles = self.requester.request( 'getAvailableTimes', self._request, True,
+                                     name = 'getAvailableCycles' )
+    cycles = sorted( set( parseRefTime( str(c) ) for c in cycles ) )
+    if self.index.sync( cycles ): self.index.save()
+    return cycles
+
+  def fcst_times( self, interval = 3600, max_forecast = None, cycle = None ):
     '''
     Name:
       awips_fcst_times
@@ -136,36 +314,92 @@ class AWIPSModelDownloader( object ):
                         Default is 3600s (1 hour)
       max_forecast : Maximum forecast time to get, in seconds.
                         Default is last available time
+      cycle        : datetime of model cycle to get forecast times for.
+                        Default is latest cycle
     '''
 
-    cycles    = DAL.getAvailableTimes(self._request, True)                      # Get forecast cycles
-    times     = DAL.getAvailableTimes(self._request)                            # Get forecast times
-
-    #self.log.debug( f'Found following model cycles : {cycles}' )
-    #self.log.debug( f'Found following model times  : {times}'  )
-
     try:
-      times = DAL.getForecastRun(cycles[-1], times)                             # Get forecast times in latest cycle
+      cycles = self._availableCycles()                                          # Get forecast cycles
+      if cycle is None:
+        cycle = cycles[-1]                                                      # Latest cycle
+      elif cycle not in cycles:
+        raise Exception( f'Cycle {cycle} not available' )
+      if not self.index.isComplete( cycle ):                                    # Times of complete cycles are already indexed
+        times = self.requester.request( 'getAvailableTimes', self._request, False ) # Get forecast times
+        self.index.add( times )
+        self.index.sync( cycles )
+        self.index.save()
+      run = self.index.run( cycle )                                             # Forecast times in cycle
+      if not run: raise Exception( f'No forecast times for cycle {cycle}' )
     except Exception as err:
       self.log.error( f'Failed to get model run cycle/time : {err}' )
       return [] 
  
     if max_forecast is None:
-      max_forecast = times[-1].getFcstTime()                                    # Set max_forecast value default based on model
+      max_forecast = next( reversed( run ) )                                    # Set max_forecast value default based on model
     nTimes    =  max_forecast // interval + 1                                   # Number of forecast steps to get based on inteval
     flt_times = [ [] for i in range( nTimes ) ]                                 # Initialized list of empty lists for forecast times
     
-    for time in times:                                                          # Iterate over all times
-      fcstTime = time.getFcstTime()                                             # Get the valid forecast time
+    for fcstTime, times in run.items():                                         # Iterate over all forecast times
       if ((fcstTime % interval) == 0) and (fcstTime < max_forecast):            # If the forecast hour falls on the interval requested AND is before the max forecast time
-        fcstDur = time.getValidPeriod().duration()                              # Get duration of the forecast period
-        if (fcstDur == 0) or (fcstDur == interval):                             # If instantaneous forecast period OR period covers requested interval
-          index = fcstTime // interval                                          # Index for the times flt_times array
-          flt_times[index].append( time )                                       # Append the time to the list at index
+        for fcstDur, time in times:
+          if (fcstDur == 0) or (fcstDur == interval):                           # If instantaneous forecast period OR period covers requested interval
+            flt_times[fcstTime // interval].append( time )                      # Append the time to the list at index
  
-    return flt_times                                                            # Return forecast runs for latest cycle
+    return flt_times                                                            # Return forecast runs for cycle
+
+  def findTime( self, cycle, fcstTime, interval = 3600 ):
+    """
+    Find forecast time(s) for a given model cycle and forecast time
 
-  def _download( self, time, model_vars, mdl2stnd, previous_data = None ):
+    Arguments:
+      cycle (datetime) : Model cycle
+      fcstTime (int) : Forecast time, in seconds since cycle
+
+    Keyword arguments:
+      interval (int) : Time step between forecast times in seconds
+
+    Returns:
+      list : Forecast times, as returned in the list from fcst_times()
+
+    """
+
+    times = self.cycleTimes( cycle, interval = interval )
+    index = fcstTime // interval
+    if index >= len(times) or not times[index]:
+      raise Exception( f'No forecast time {fcstTime} s in cycle {cycle}' )
+    return times[index]
+
+  def cycleTimes( self, cycle, interval = 3600 ):
+    """
+    Forecast times of a model cycle; looked up once per cycle
+
+    Arguments:
+      cycle (datetime) : Model cycle
+
+    Keyword arguments:
+      interval (int) : Time step between forecast times in seconds
+
+    Returns:
+      list : Forecast times, as returned by fcst_times()
+
+    """
+
+    key = (cycle, interval)
+    if key not in self._cycleTimes:
+      self._cycleTimes[key] = self.fcst_times( interval = interval, cycle = cycle )
+    return self._cycleTimes[key]
+
+  def _newData( self, time ):
+    """Create empty data for a forecast time"""
+
+    initTime, fcstTime = get_init_fcst_times( time[0] )
+    return AWIPSData( model    = self._request.getLocationNames()[0],
+                      time     = time[0],
+                      initTime = initTime,
+                      fcstTime = fcstTime)
+
+  def _download( self, time, model_vars, mdl2stnd, data = None ):
     '''
     Name:
       awips_model_base
@@ -177,60 +411,196 @@ class AWIPSModelDownloader( object ):
       model_vars : Dictionary with variables/levels to get
       mdl2stnd   : Dictionary to convert from model variable names
                     to standardized names
+    Keywords:
+      data       : AWIPSData to add fields to; if set, fields are
+                    published to consumers of the data as each
+                    variable group arrives
     Outputs:
       Returns a dictionary containing all data
-    Keywords:
-      previous_data : Dictionary with data from previous time step
     '''
 
-    initTime, fcstTime = get_init_fcst_times( time[0] )
-    data = AWIPSData( model    = self._request.getLocationNames()[0],
-                      time     = time[0],
-                      initTime = initTime,
-                      fcstTime = fcstTime)                                      # Initialize empty dictionary
+    start = monotonic()
+    progressive = data is not None
+    if data is None: data = self._newData( time )                               # Initialize empty dictionary
+
+    cached = None
+    if self.cache is not None:
+      cached = self.cache.load( data['model'], time )                           # Try to load grids from local cache
+
+    if cached is not None:
+      with data.lock:
+        data.update( {key : dict(val) if isinstance( val, dict ) else val
+                        for key, val in cached.items()} )                       # Consumers may release fields of data; keep cached for the cache file
+        self._derive( data, model_vars, mdl2stnd )
+      if progressive: data.publish()
+    missing = self._missing( data, model_vars, mdl2stnd )                       # Variables, and levels, not in the cache
+
+    if len(missing) == 0:
+      self.log.info('Using cached {} data'.format( data['model'] ) )
+      GRID_CACHE_HITS.inc( model = self.modelName )
+    else:
+      self.log.info('Attempting to download {} data'.format( data['model'] ) )
+      writer = None
+      if self.cache is not None:
+        writer = self.cache.writer( data['model'], time )                       # Grids are cached as they arrive, so consumers may release them early
+        if cached is not None: writer.addFields( cached, mdl2stnd.values() )
+      cached = None                                                             # Do not hold grids that consumers release
+      try:
+        self._downloadMissing( time, data, model_vars, missing, mdl2stnd, writer, progressive )
+      except:
+        if writer is not None: writer.abort()
+        raise
+      if writer is not None:
+        writer.close()                                                          # Save raw grids to cache so they can be reused on restart
+    DOWNLOAD_SECONDS.observe( monotonic() - start, model = self.modelName )
+    return data                                                                 # Return data dictionary
+
+  def reload( self, time, model_vars, mdl2stnd ):
+    """
+    Load the data of a forecast time again from the grid cache
 
-    self.log.info('Attempting to download {} data'.format( data['model'] ) )
+    Used to render more products for a time that was already downloaded,
+    and accumulated, without keeping its grids in memory. The data are not
+    accumulated again, so they lack accumulated fields.
 
-    for var in model_vars:                                                      # Iterate over variables in the vars list
-      self.log.debug( 'Getting: {}'.format( var ) )
-      self._request.setParameters( *model_vars[var]['parameters'] )             # Set parameters for the download request
-      self._request.setLevels(     *model_vars[var]['levels'] )                 # Set levels for the download request
+    Arguments:
+      time (DataTime) : Forecast time, as returned in the list from
+        fcst_times()
+      model_vars (dict) : Model variables, and levels, required
+      mdl2stnd (dict) : Look-up table to convert awips variable names to
+        standard names
+
+    Returns:
+      AWIPSData : Data for the time; None if not all variables are cached
+
+    """
 
-      response = DAL.getGridData(self._request, time)                           # Request the data
+    if self.cache is None: return None
+    data   = self._newData( time )
+    cached = self.cache.load( data['model'], time )
+    if cached is None: return None
+    data.update( cached )
+    self._derive( data, model_vars, mdl2stnd )
+    if len( self._missing( data, model_vars, mdl2stnd ) ) > 0: return None
+    return data
+
+  def _downloadMissing( self, time, data, model_vars, missing, mdl2stnd, writer, progressive ):
+    """
+    Download the variable groups missing from the data of a forecast time
 
+    Each group is added to the data, and written to the cache, if any, as
+    soon as it arrives.
+
+    Arguments:
+      time (DataTime) : Forecast time
+      data (AWIPSData) : Data to add the grids to
+      model_vars (dict) : Model variables, and levels, being downloaded
+      missing (dict) : Variables, and levels, to download; see _missing()
+      mdl2stnd (dict) : Look-up table to convert awips variable names to
+        standard names
+      writer (CacheWriter) : Writer of the cache file; None if not cached
+      progressive (bool) : If set, publish the data after each group
+
+    """
+
+    for var in missing:                                                         # Iterate over variables in the vars list
+      self.log.debug( 'Getting: {}'.format( var ) )
+      request  = self._newRequest( missing[var]['parameters'], 
+                                   missing[var]['levels'] )
+      response = self.requester.request( 'getGridData', request, time )         # Request the data; with timeout and retries
+
+      fields = {}                                                               # Fields of the variable group; added to data all at once
       for res in response:                                                      # Iterate over all data request responses
         varName = res.getParameter()                                            # Get name of the variable in the response
         varLvl  = res.getLevel()                                                # Get level of the variable in the response
         varName = mdl2stnd [ varName ]                                          # Convert variable name to local standarized name
-        if varName not in data: data[varName] = {}                              # If variable name NOT in data dictionary, initialize new dictionary under key
+        if varName not in fields: fields[varName] = {}                          # If variable name NOT in fields dictionary, initialize new dictionary under key
 
-        data[ varName ][ varLvl ] = res.getRawData()                            # Add data under level name
+        fields[ varName ][ varLvl ] = res.getRawData()                          # Add data under level name
+        GRIDS_DOWNLOADED.inc( model = self.modelName )
+        GRID_BYTES.inc( fields[ varName ][ varLvl ].nbytes, model = self.modelName )
         try:                                                                    # Try to
           unit = units( res.getUnit() )                                         # Get units and convert to MetPy units
         except:                                                                 # On exception
           unit = '?'                                                            # Set units to ?
         else:                                                                   # If get units success
-          data[ varName ][ varLvl ] *= unit                                     # Get data and create MetPy quantity by multiplying by units
+          fields[ varName ][ varLvl ] *= unit                                   # Get data and create MetPy quantity by multiplying by units
 
         msgFMT = 'Got data for:{0}  Var:  {1}{0}  Lvl:  {2}{0}  Unit: {3}'
         self.log.debug( msgFMT.format( linesep, varName, varLvl, unit ) )
 
-    data['lon'], data['lat'] = res.getLatLonCoords()                             # Get latitude and longitude values
-    data['lon'] *= units('degree')                                               # Add units of degree to longitude
-    data['lat'] *= units('degree')                                               # Add units of degree to latitude
-  
+      with data.lock:
+        for varName, levels in fields.items():
+          data.setdefault( varName, {} ).update( levels )
+        if 'lon' not in data and len(response) > 0:
+          lon, lat = response[-1].getLatLonCoords()                             # Get latitude and longitude values
+          data['lon'] = lon * units('degree')                                   # Add units of degree to longitude
+          data['lat'] = lat * units('degree')                                   # Add units of degree to latitude
+        self._derive( data, model_vars, mdl2stnd )                              # Derive any fields whose inputs are now complete
+      if writer is not None:
+        writer.addFields( fields, fields )                                      # Cached before consumers may release them
+        writer.addFields( data, () )                                            # Along with lon and lat, once known
+      if progressive: data.publish()
+
+  def _pinned( self, model_vars, mdl2stnd ):
+    """
+    Fields that consumers must keep while the data of a time are downloading
+
+    Derivations run as soon as their inputs arrive, and run again if their
+    output is missing, so their inputs and outputs are kept; so are the
+    inputs of the accumulator, which runs once the download is done.
+
+    Arguments:
+      model_vars (dict) : Model variables, and levels, being downloaded
+      mdl2stnd (dict) : Look-up table to convert awips variable names to
+        standard names
+
+    Returns:
+      set : Tuples of (name, level) of the fields
+
+    """
+
+    pinned = {('temperature', '1000.0MB'), ('dewpoint', '1000.0MB'), ('theta_e', '1000.0MB')}
+    wind   = model_vars.get( 'wind', None )
+    if wind is not None:
+      for lvl in wind['levels']:
+        pinned.update( (mdl2stnd[param], lvl) for param in wind['parameters'][:2] )
+        pinned.add( ('abs_vort', lvl) )
+    if self.accumulator is not None:
+      pinned.update( (PRECIP, T2M) )
+    return pinned
+
+  def _derive( self, data, model_vars, mdl2stnd ):
+    """
+    Add derived fields whose inputs are in data and that are not yet derived
+
+    Called after every variable group is added, with the lock of the data
+    held, so derived fields are available as soon as their inputs are.
+
+    Arguments:
+      data (AWIPSData) : Data to add derived fields to
+      model_vars (dict) : Model variables, and levels, being downloaded
+      mdl2stnd (dict) : Look-up table to convert awips variable names to
+        standard names
+
+    """
+
+    if 'lon' not in data: return
+
     # Absolute vorticity
-    dx, dy = lat_lon_grid_deltas( data['lon'], data['lat'] )                     # Get grid spacing in x and y
-    uTag = mdl2stnd[ model_vars['wind']['parameters'][0] ]                       # Get initial tag name for u-wind
-    vTag = mdl2stnd[ model_vars['wind']['parameters'][1] ]                       # Get initial tag name for v-wind
+    wind = model_vars.get( 'wind', {'parameters' : [], 'levels' : []} )         # Wind is not required by all products
+    uTag, vTag = ([mdl2stnd[param] for param in wind['parameters']] + [None, None])[:2] # Get initial tag names for u- and v-wind
     if (uTag in data) and (vTag in data):                                         # If both tags are in the data structure
-      data['abs_vort'] = {}                                                      # Add absolute vorticity key
-      for lvl in model_vars['wind']['levels']:                                    # Iterate over all leves in the wind data
-        if (lvl in data[uTag]) and (lvl in data[vTag]):                           # If given level in both u- and v-wind dictionaries
-          self.log.debug( 'Computing absolute vorticity at {}'.format( lvl ) )
-          data['abs_vort'][ lvl ] = \
-            absolute_vorticity( data[uTag][lvl], data[vTag][lvl], 
-                                dx, dy, data['lat'] )                            # Compute absolute vorticity
+      if 'abs_vort' not in data: data['abs_vort'] = {}                           # Add absolute vorticity key
+      lvls = [lvl for lvl in wind['levels'] if (lvl in data[uTag]) and (lvl in data[vTag])
+                                               and (lvl not in data['abs_vort'])] # Levels in both u- and v-wind dictionaries, not yet derived
+      if len(lvls) > 0:
+        self.log.debug( 'Computing absolute vorticity at {}'.format( lvls ) )
+        vort = forGrid( data['lon'], data['lat'] ).absoluteVorticity(
+          stackLevels( data[uTag], lvls, 'm/s' ), stackLevels( data[vTag], lvls, 'm/s' )
+        )                                                                        # Compute absolute vorticity on all levels at once
+        for i, lvl in enumerate( lvls ):
+          data['abs_vort'][ lvl ] = vort[i] * units('1/s')
   
     # 1000 MB equivalent potential temperature  
     level = units.Quantity(1000, 'hPa')
@@ -240,12 +610,13 @@ class AWIPSModelDownloader( object ):
     except:
       pass
     else:
+      if 'theta_e' in data: return                                              # Already derived
       self.log.debug( 'Computing equivalent potential temperature at 1000 hPa' )
       data['theta_e'] = {
         f'{level.magnitude:0.1f}MB' : equivalent_potential_temperature( level, T, Td )
       }
   
-      return data
+      return
       # MLCAPE
       self.log.debug( 'Computing mixed layer CAPE' )
       T_lvl   = list( data[T].keys()  )
@@ -291,16 +662,67 @@ class AWIPSModelDownloader( object ):
             else:
               data['MLCAPE'][j,i] = cape
 
-    return data                                                                  # Return data dictionary  
+  @staticmethod
+  def _missing( data, model_vars, mdl2stnd ):
+    """
+    Find variables, and levels, of each variable group not yet in data
+
+    Arguments:
+      data (dict) : Data, e.g., as loaded from the grid cache
+      model_vars (dict) : Model variables, and levels, to download
+      mdl2stnd (dict) : Look-up table to convert awips variable names to
+        standard names
+
+    Returns:
+      dict : Model variables, and levels, that must still be downloaded;
+        same format as model_vars
 
-  def _getData( self, times, *args, **kwargs ): 
-    for time in times:
-      if time:
-        self.queue.put( 
-          self._download( time, *args, **kwargs ) 
-        )
+    """
 
-    self.queue.put(None)
+    missing = {}
+    for var, info in model_vars.items():
+      params = []
+      levels = set()
+      for param in info['parameters']:
+        have = data.get( mdl2stnd[param], {} )
+        lvls = [lvl for lvl in info['levels'] if lvl not in have]
+        if len(lvls) > 0:
+          params.append( param )
+          levels.update( lvls )
+      if len(params) > 0:
+        missing[var] = {'parameters' : params, 
+                        'levels'     : [lvl for lvl in info['levels'] if lvl in levels]}
+    return missing
+
+  def _getData( self, times, *args, progressive = False, stop = None, **kwargs ): 
+    try:
+      for time in times:
+        if stop is not None and stop.is_set(): break                            # Consumer stopped iterating
+        if time:
+          data = None
+          if progressive:
+            data = self._newData( time )
+            data.complete = False
+            data.pinned   = self._pinned( *args )
+            self.queue.put( data )                                              # Consumer starts on the data as soon as the first fields arrive
+          try:
+            data = self._download( time, *args, data = data, **kwargs ) 
+          except Exception as err:
+            self.log.error( f'Failed to download data for {time[0]}, skipping : {err}' )
+            if progressive: data.publish( error = err )
+          else:
+            if self.accumulator is not None:
+              try:
+                with data.lock:
+                  self.accumulator.update( data )                               # Forecast hours are accumulated in the order they are downloaded
+              except Exception as err:
+                self.log.error( f'Failed to accumulate data for {time[0]} : {err}' )
+            if progressive:
+              data.publish( complete = True )
+            else:
+              self.queue.put( data )
+    finally:
+      self.queue.put(None)                                                      # Always signal end so consumer never blocks forever
 
   def getData( self, *args, **kwargs ):
     """
@@ -310,18 +732,36 @@ class AWIPSModelDownloader( object ):
         standard names used in this package
 
     Keyword arguments:
-      previous_data (dict) : Data from previous time step used to compute
-        some fields that depend on previous data
+      progressive (bool) : If set, data for each forecast time are yielded
+        before they are downloaded, and fields are published as each
+        variable group arrives; see AWIPSData.waitUpdate(). Otherwise, data
+        are yielded once complete
+
+    If the consumer stops iterating, e.g., because rendering failed, and the
+    generator is closed, the download stops after the forecast time in
+    progress, so the download thread never blocks on the queue. The thread
+    is a daemon, so it never keeps the process alive either.
 
     """
 
-    thread = Thread(target = self._getData, args = args, kwargs = kwargs)       # Initialize downloader thread
+    stop   = Event()
+    thread = Thread(target = self._getData, args = args, kwargs = {**kwargs, 'stop' : stop},
+                    daemon = True)                                              # Initialize downloader thread
     thread.start()                                                              # Start downloading
-    while True:                                                                 # Iterate forever
-      tmp = self.queue.get()                                                    # Get a value from the queue
-      self.queue.task_done()                                                    # Let queue know an object has been removed
-      if tmp is None: break                                                     # If data is None, then the download has finished so break loop
-      yield tmp                                                                 # yield tmp data
+    tmp    = False
+    try:
+      while True:                                                               # Iterate forever
+        tmp = self.queue.get()                                                  # Get a value from the queue
+        self.queue.task_done()                                                  # Let queue know an object has been removed
+        if tmp is None: break                                                   # If data is None, then the download has finished so break loop
+        yield tmp                                                               # yield tmp data
+    finally:
+      if tmp is not None:                                                       # Consumer stopped early; let the download thread finish
+        stop.set()
+        while self.queue.get() is not None:
+          self.queue.task_done()
+        self.queue.task_done()
 
     thread.join()                                                               # join the thread
     self.queue.join()                                                           # join the queue
+    self.requester.report()                                                     # Log latencies of EDEX requests
@@ -4,6 +4,7 @@ stnd_levels = ['{:.1f}MB'.format(i) for i in stnd_levels]
 
 NAM40 = {
     'model_name' : 'NAM40',
+    'final_hour' : 84,
     'model_vars' : {
         'wind'          : {'parameters' : ['uW', 'vW'],
                            'levels'     : ['10.0FHAG'] + stnd_levels},
@@ -63,3 +64,5 @@ GFS = {
         'TP6hr' : 'precip'
     }
 }
+
+MODELS = {model['model_name'] : model for model in (NAM40, GFS)}              # Models by name
@@ -0,0 +1,256 @@
+import logging
+
+import numpy as np
+from pyproj import Geod
+
+OMEGA   = 7.292115e-5                                                           # Rotation rate of Earth; rad/s
+RD      = 287.04749097718457                                                    # Gas constant of dry air; J/kg/K
+KAPPA   = 2.0 / 7.0                                                             # Rd / Cp of dry air
+EPSILON = 0.6219569100577033                                                    # Molecular weight of water over that of dry air
+GRAVITY = 9.80665                                                               # m/s**2
+RHO_L   = 999.97495                                                             # Density of liquid water; kg/m**3
+
+def _stencil( delta ):
+  """
+  Coefficients of second-order first derivative on a non-uniform grid
+
+  The same three-point stencils as metpy.calc.first_derivative: centered
+  in the interior, and one-sided at the edges.
+
+  Arguments:
+    delta (ndarray) : Spacing between points along the last axis
+
+  Returns:
+    tuple : Coefficients of the (previous, current, next) points in the
+      interior, and of the first three, and last three, points at the
+      edges
+
+  """
+
+  d0, d1   = delta[..., :-1], delta[..., 1:]
+  combined = d0 + d1
+  center   = (-d1 / (combined * d0), (d1 - d0) / (d0 * d1), d0 / (combined * d1))
+
+  d0, d1   = delta[..., 0], delta[..., 1]
+  combined = d0 + d1
+  left     = (-(combined + d0) / (combined * d0), combined / (d0 * d1), -d0 / (combined * d1))
+
+  d0, d1   = delta[..., -2], delta[..., -1]
+  combined = d0 + d1
+  right    = (d1 / (d0 * combined), -combined / (d0 * d1), (d0 + combined) / (d1 * combined))
+  return center, left, right
+
+def _derivative( field, coeffs ):
+  """Apply derivative stencil along the last axis of field; any leading axes are levels"""
+
+  center, left, right = coeffs
+  out = np.empty( field.shape, dtype = np.result_type( field, center[0] ) )
+  out[..., 1:-1] = center[0] * field[..., :-2] + center[1] * field[..., 1:-1] + center[2] * field[..., 2:]
+  out[..., 0]    = left[0]   * field[..., 0]   + left[1]   * field[..., 1]    + left[2]   * field[..., 2]
+  out[..., -1]   = right[0]  * field[..., -3]  + right[1]  * field[..., -2]   + right[2]  * field[..., -1]
+  return out
+
+class Diagnostics( object ):
+  """
+  Diagnostic fields computed with finite-difference stencils
+
+  Grid spacing, derivative coefficients, and Coriolis parameter are
+  computed once for a model grid; every diagnostic is then a few array
+  operations over the whole grid. Fields are plain arrays, in SI units,
+  of shape (ny, nx) or (nlevels, ny, nx); all levels are computed at once.
+  Grid spacing is the geodesic distance between grid points, so no
+  separate map factors are applied; the same as the metpy calls with dx
+  and dy from lat_lon_grid_deltas().
+
+  """
+
+  def __init__(self, lon, lat):
+    """
+    Arguments:
+      lon (ndarray) : Longitudes, in degrees, of the model grid
+      lat (ndarray) : Latitudes, in degrees, of the model grid
+
+    """
+
+    self.log = logging.getLogger(__name__)
+    lon      = np.asarray( getattr( lon, 'magnitude', lon ), dtype = np.float64 )
+    lat      = np.asarray( getattr( lat, 'magnitude', lat ), dtype = np.float64 )
+
+    geod = Geod( ellps = 'WGS84' )
+    az, _, dx = geod.inv( lon[:, :-1], lat[:, :-1], lon[:, 1:], lat[:, 1:] )
+    dx[(az < 0.0) | (az > 180.0)] *= -1                                         # Spacing is negative where grid runs west
+    az, _, dy = geod.inv( lon[:-1, :], lat[:-1, :], lon[1:, :], lat[1:, :] )
+    dy[(az < -90.0) | (az > 90.0)] *= -1                                        # Spacing is negative where grid runs south
+
+    self.dx   = dx
+    self.dy   = dy
+    self.f    = 2.0 * OMEGA * np.sin( np.deg2rad( lat ) )                       # Coriolis parameter
+    self._ddx = _stencil( dx )
+    self._ddy = _stencil( dy.T )
+
+  def ddx( self, field ):
+    """Derivative along the x-axis of the grid"""
+
+    return _derivative( field, self._ddx )
+
+  def ddy( self, field ):
+    """Derivative along the y-axis of the grid"""
+
+    return _derivative( np.swapaxes( field, -1, -2 ), self._ddy ).swapaxes( -1, -2 )
+
+  def absoluteVorticity( self, u, v ):
+    """Absolute vertical vorticity; 1/s"""
+
+    return self.ddx( v ) - self.ddy( u ) + self.f
+
+  def advection( self, scalar, u, v ):
+    """Horizontal advection of a scalar; units of scalar per second"""
+
+    return -(u * self.ddx( scalar ) + v * self.ddy( scalar ))
+
+  def temperatureAdvection( self, temperature, u, v ):
+    """Horizontal temperature advection; K/s"""
+
+    return self.advection( temperature, u, v )
+
+  def vorticityAdvection( self, u, v ):
+    """Horizontal advection of absolute vorticity; 1/s**2"""
+
+    return self.advection( self.absoluteVorticity( u, v ), u, v )
+
+  def frontogenesis( self, theta, u, v ):
+    """
+    Two-dimensional Petterssen frontogenesis; K/m/s
+
+    Arguments:
+      theta (ndarray) : Potential temperature; K
+      u (ndarray) : x-component of wind; m/s
+      v (ndarray) : y-component of wind; m/s
+
+    """
+
+    dtdx, dtdy = self.ddx( theta ), self.ddy( theta )
+    dudx, dudy = self.ddx( u ), self.ddy( u )
+    dvdx, dvdy = self.ddx( v ), self.ddy( v )
+    mag     = np.hypot( dtdx, dtdy )
+    shear   = dvdx + dudy
+    stretch = dudx - dvdy
+    psi     = 0.5 * np.arctan2( shear, stretch )                                # Angle of axis of dilatation
+    with np.errstate( invalid = 'ignore', divide = 'ignore' ):
+      beta = np.arcsin( (-dtdx * np.cos( psi ) - dtdy * np.sin( psi )) / mag )  # Angle between isentropes and axis of dilatation
+    return 0.5 * mag * (np.hypot( shear, stretch ) * np.cos( 2.0 * beta ) - (dudx + dvdy))
+
+  def qVector( self, u, v, temperature, pressure, staticStability = 1.0 ):
+    """
+    Q-vector
+
+    Arguments:
+      u (ndarray) : x-component of geostrophic wind; m/s
+      v (ndarray) : y-component of geostrophic wind; m/s
+      temperature (ndarray) : Temperature; K
+      pressure (float, ndarray) : Pressure, in Pa, of each level; shape must
+        broadcast against the fields, e.g., (nlevels, 1, 1)
+
+    Keyword arguments:
+      staticStability (float, ndarray) : Static stability; default of 1
+        is the same as metpy
+
+    Returns:
+      tuple : x- and y-components of the Q-vector
+
+    """
+
+    dtdx, dtdy = self.ddx( temperature ), self.ddy( temperature )
+    factor = -RD / (pressure * staticStability)
+    q1 = factor * (self.ddx( u ) * dtdx + self.ddx( v ) * dtdy)
+    q2 = factor * (self.ddy( u ) * dtdx + self.ddy( v ) * dtdy)
+    return q1, q2
+
+  @staticmethod
+  def potentialTemperature( temperature, pressure ):
+    """Potential temperature, in K, from temperature in K and pressure in Pa"""
+
+    return temperature * (1.0e5 / pressure)**KAPPA
+
+  @staticmethod
+  def precipitableWater( pressure, dewpoint ):
+    """
+    Precipitable water of the column of levels
+
+    Arguments:
+      pressure (ndarray) : Pressure, in Pa, of each level; shape (nlevels,)
+      dewpoint (ndarray) : Dewpoint, in K, of shape (nlevels, ny, nx)
+
+    Returns:
+      ndarray : Precipitable water, in mm, of shape (ny, nx)
+
+    """
+
+    order    = np.argsort( pressure )[::-1]                                     # Surface to top
+    pressure = np.asarray( pressure, dtype = np.float64 )[order]
+    dewpoint = dewpoint[order]
+    e        = 611.2 * np.exp( 17.67 * (dewpoint - 273.15) / (dewpoint - 29.65) ) # Saturation vapor pressure at dewpoint; Pa
+    mixing   = EPSILON * e / (pressure[:, None, None] - e)
+    dp       = np.diff( pressure )[:, None, None]
+    total    = -np.sum( 0.5 * (mixing[1:] + mixing[:-1]) * dp, axis = 0 )       # Trapezoidal integral over pressure
+    return total / (GRAVITY * RHO_L) * 1000.0
+
+  @staticmethod
+  def lapseRate( temperature, height ):
+    """
+    Lapse rate between consecutive levels
+
+    Arguments:
+      temperature (ndarray) : Temperature, in K, of shape (nlevels, ny, nx)
+      height (ndarray) : Geopotential height, in m, of the same shape
+
+    Returns:
+      ndarray : Lapse rate, in K/km, of shape (nlevels-1, ny, nx); positive
+        where temperature decreases with height
+
+    """
+
+    return -1000.0 * np.diff( temperature, axis = 0 ) / np.diff( height, axis = 0 )
+
+_GRIDS = {}                                                                     # Diagnostics for each model grid
+
+def forGrid( lon, lat ):
+  """
+  Get diagnostics for a model grid; created once per grid
+
+  Arguments:
+    lon (ndarray) : Longitudes of the model grid
+    lat (ndarray) : Latitudes of the model grid
+
+  Returns:
+    Diagnostics
+
+  """
+
+  mlon = getattr( lon, 'magnitude', lon )
+  mlat = getattr( lat, 'magnitude', lat )
+  key  = (np.shape( mlon ), float(mlon[0,0]), float(mlon[-1,-1]), float(mlat[0,0]), float(mlat[-1,-1]))
+  if key not in _GRIDS:
+    _GRIDS[key] = Diagnostics( lon, lat )
+  return _GRIDS[key]
+
+def stackLevels( var, levels, unit ):
+  """
+  Stack levels of a variable into one array
+
+  Arguments:
+    var (dict) : Quantities of a variable keyed by level; e.g., data['u wind']
+    levels (list) : Levels to stack
+    unit (str) : Unit to convert to
+
+  Returns:
+    ndarray : Magnitudes of shape (nlevels, ny, nx)
+
+  """
+
+  return np.stack( [var[level].to( unit ).magnitude for level in levels] )
+
+def levelPressure( levels ):
+  """Pressure, in Pa, of pressure levels; e.g., '500.0MB'"""
+
+  return np.array( [float( level.replace( 'MB', '' ) ) * 100.0 for level in levels] )
@@ -0,0 +1,277 @@
+import logging
+import os, time, random, bisect
+from collections import deque
+from threading import Thread, Lock, BoundedSemaphore
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from awips.dataaccess.ThriftClientRouter import ThriftClientRouter
+
+from ..metrics import EDEX_SECONDS, EDEX_HEDGES, EDEX_FAILURES
+
+class LatencyHistogram( object ):
+  """
+  Histogram of request latencies
+
+  Counts are kept in fixed buckets, for export, and the most recent samples
+  are kept in a bounded window so that percentiles of the current latency
+  can be computed for hedging requests.
+
+  """
+
+  BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, float('inf'))
+
+  def __init__(self, window = 200):
+    self._lock   = Lock()
+    self.counts  = [0] * len(self.BUCKETS)
+    self.count   = 0
+    self.total   = 0.0
+    self.samples = deque( maxlen = window )
+
+  def observe( self, seconds ):
+    """Add a latency sample, in seconds, to the histogram"""
+
+    with self._lock:
+      self.counts[ bisect.bisect_left( self.BUCKETS, seconds ) ] += 1
+      self.count += 1
+      self.total += seconds
+      self.samples.append( seconds )
+
+  def percentile( self, pct ):
+    """
+    Compute percentile of recent latencies
+
+    Arguments:
+      pct (float) : Percentile to compute; 0 to 100
+
+    Returns:
+      float : Latency, in seconds, at the percentile; None if no samples
+
+    """
+
+    with self._lock:
+      samples = sorted( self.samples )
+    if len(samples) == 0: return None
+    index = min( int( round( pct / 100.0 * (len(samples)-1) ) ), len(samples)-1 )
+    return samples[index]
+
+  def summary( self ):
+    """Dictionary with count, mean, median, p95, p99, and bucket counts"""
+
+    return {'count'   : self.count,
+            'mean'    : self.total / self.count if self.count else None,
+            'p50'     : self.percentile( 50 ),
+            'p95'     : self.percentile( 95 ),
+            'p99'     : self.percentile( 99 ),
+            'buckets' : dict( zip( self.BUCKETS, self.counts ) )}
+
+class EDEXRequester( object ):
+  """
+  Run DataAccessLayer requests with deadlines, retries, and hedging
+
+  Each request attempt runs in its own daemon thread, with its own
+  ThriftClientRouter, so that a request that hangs can be abandoned once
+  its timeout passes, and so that a hedged duplicate never shares a
+  connection with the original request. Failed or timed out attempts are
+  retried with exponential backoff and random jitter.
+
+  The number of requests running at once against a host can be limited;
+  the limit is shared by all requesters for the host in the process, and
+  abandoned attempts hold their slot until they actually finish.
+
+  Latencies of every attempt, hedged requests, and failed attempts are
+  exported to the metrics registry, labeled by model and kind of request.
+
+  """
+
+  _slots     = {}                                                               # Semaphore limiting concurrent requests for each host
+  _slotsLock = Lock()
+
+  def __init__(self, host, timeout = 120.0, retries = 3, backoff = 2.0,
+               max_backoff = 60.0, hedge_percentile = None, hedge_min_samples = 8,
+               max_concurrent = None, model = ''):
+    """
+    Arguments:
+      host (str) : EDEX host to send requests to
+
+    Keyword arguments:
+      timeout (float) : Seconds to wait for each attempt of a request
+      retries (int) : Number of times to retry a failed request
+      backoff (float) : Base, in seconds, of the exponential backoff between
+        retries
+      max_backoff (float) : Maximum backoff, in seconds, between retries
+      hedge_percentile (float) : If set, a duplicate request is sent when an
+        attempt has been running longer than this percentile of recent
+        latencies for the same kind of request; the first to finish wins
+      hedge_min_samples (int) : Number of latency samples required before
+        requests are hedged
+      max_concurrent (int) : If set, most requests, including hedged
+        duplicates, running at once against the host; the first requester
+        to set a limit for a host sets it for all
+      model (str) : Name of the model requests are made for; used to label
+        metrics
+
+    """
+
+    self.log               = logging.getLogger(__name__)
+    self.host              = host
+    self.model             = model
+    self.timeout           = timeout
+    self.retries           = retries
+    self.backoff           = backoff
+    self.max_backoff       = max_backoff
+    self.hedge_percentile  = hedge_percentile
+    self.hedge_min_samples = hedge_min_samples
+    self.latency           = {}
+    self.hedges            = 0
+    self.failures          = 0
+    self.max_concurrent    = max_concurrent
+    self.slots             = None
+    self._claimSlots()
+
+  def _claimSlots( self ):
+    """Get the semaphore shared by requesters of the host, if limited"""
+
+    if self.max_concurrent:
+      with self._slotsLock:
+        self.slots = self._slots.setdefault( self.host, BoundedSemaphore( self.max_concurrent ) )
+
+  @classmethod
+  def _resetSlots( cls ):
+    """Replace the semaphores and lock inherited by a forked child"""
+
+    cls._slots     = {}
+    cls._slotsLock = Lock()
+
+  def afterFork( self ):
+    """
+    Make the requester safe to use in a child forked from its process
+
+    Threads of the parent that held a request slot, or the lock guarding
+    the slots, do not exist in the child, so the inherited semaphore may
+    never be released; the requester takes a slot from a fresh semaphore
+    instead. Latency histograms are kept.
+
+    """
+
+    self.slots = None
+    self._claimSlots()
+
+  def histogram( self, name ):
+    """Get latency histogram for a given kind of request"""
+
+    if name not in self.latency:
+      self.latency[name] = LatencyHistogram()
+    return self.latency[name]
+
+  def _submit( self, method, *args ):
+    """Run router method in a daemon thread; returns a Future"""
+
+    future = Future()
+    def target():
+      if self.slots is not None: self.slots.acquire()                          # Wait for a free request slot
+      try:
+        result = getattr( ThriftClientRouter( self.host ), method )( *args )
+      except BaseException as err:
+        future.set_exception( err )
+      else:
+        future.set_result( result )
+      finally:
+        if self.slots is not None: self.slots.release()
+    Thread( target = target, daemon = True ).start()
+    return future
+
+  def _hedgeDelay( self, hist ):
+    """Seconds after which to hedge a request; None to not hedge"""
+
+    if self.hedge_percentile is None: return None
+    if len( hist.samples ) < self.hedge_min_samples: return None
+    return hist.percentile( self.hedge_percentile )
+
+  def _attempt( self, method, args, hist, name ):
+    """Single attempt at a request, possibly hedged; raises on failure"""
+
+    start   = time.monotonic()
+    try:
+      return self._hedged( method, args, hist, name, start )
+    finally:
+      EDEX_SECONDS.observe( time.monotonic() - start, model = self.model, method = name )
+
+  def _hedged( self, method, args, hist, name, start ):
+    """Wait for an attempt, and its hedged duplicate, if any"""
+
+    futures = [ self._submit( method, *args ) ]
+    hedgeAt = self._hedgeDelay( hist )
+    error   = None
+    while futures:
+      elapsed = time.monotonic() - start
+      if elapsed >= self.timeout: break
+      waitFor = self.timeout - elapsed
+      if hedgeAt is not None:
+        waitFor = max( min( waitFor, hedgeAt - elapsed ), 0.0 )
+
+      done, _ = wait( futures, timeout = waitFor, return_when = FIRST_COMPLETED )
+      for future in done:
+        futures.remove( future )
+        if future.exception() is None:
+          hist.observe( time.monotonic() - start )
+          return future.result()
+        error = future.exception()
+
+      if hedgeAt is not None and (time.monotonic() - start) >= hedgeAt and futures:
+        self.log.info( f'Hedging {method} request after {hedgeAt:0.1f} s' )
+        futures.append( self._submit( method, *args ) )
+        self.hedges += 1
+        EDEX_HEDGES.inc( model = self.model, method = name )
+        hedgeAt = None                                                          # Only hedge once per attempt
+
+    if error is None:
+      error = TimeoutError( f'{method} request timed out after {self.timeout} s' )
+    raise error
+
+  def request( self, method, *args, name = None ):
+    """
+    Send a request to EDEX
+
+    Arguments:
+      method (str) : Name of the DataAccessLayer method to call;
+        e.g., getGridData
+      *args : Arguments for the method
+
+    Keyword arguments:
+      name (str) : Name for latency statistics of the request; default
+        is the method name
+
+    Returns:
+      Result of the request
+
+    """
+
+    name = name or method
+    hist = self.histogram( name )
+    for attempt in range( self.retries + 1 ):
+      try:
+        return self._attempt( method, args, hist, name )
+      except Exception as err:
+        self.failures += 1
+        EDEX_FAILURES.inc( model = self.model, method = name )
+        if attempt == self.retries:
+          self.log.error( f'{method} request failed after {attempt+1} attempts : {err}' )
+          raise
+        delay = min( self.max_backoff, self.backoff * 2**attempt )
+        delay = random.uniform( 0.5 * delay, delay )                            # Jitter so that retries do not synchronize
+        self.log.warning( f'{method} request failed, retrying in {delay:0.1f} s : {err}' )
+        time.sleep( delay )
+
+  def report( self ):
+    """Log latency summary for all kinds of requests"""
+
+    for name, hist in self.latency.items():
+      info = hist.summary()
+      if info['count'] == 0: continue
+      self.log.info(
+        f"EDEX {name} latency : n={info['count']} mean={info['mean']:0.2f}s "
+        f"p50={info['p50']:0.2f}s p95={info['p95']:0.2f}s p99={info['p99']:0.2f}s"
+      )
+    self.log.info( f'EDEX requests hedged: {self.hedges}; failed attempts: {self.failures}' )
+
+os.register_at_fork( after_in_child = EDEXRequester._resetSlots )               # Never share request slots with threads of a parent
@@ -0,0 +1,351 @@
+import logging
+import os, json, shutil, zipfile
+from datetime import datetime, timedelta
+
+import numpy as np
+from metpy.units import units
+
+from .awips_model_utils import get_init_fcst_times
+
+TIMEFMT = '%Y%m%dT%H%M%S'
+SEP     = '|'                                                                   # Separator for variable name and level in npz keys
+
+class GridCache( object ):
+  """
+  On-disk cache of downloaded model grids
+
+  One compressed numpy file is written for each model forecast time, in a
+  directory for each model cycle. Files are written to a temporary file and
+  then moved into place, so that a crash never leaves a partial grid behind.
+  Grids may be written as they are downloaded, see writer(), so they need
+  not all be kept in memory until the forecast time is complete.
+
+  """
+
+  def __init__(self, cachedir, retain = 2):
+    """
+    Arguments:
+      cachedir (str) : Top-level directory of the cache
+
+    Keyword arguments:
+      retain (int) : Number of model cycles to keep in the cache for each
+        model when prune() is called; zero, or less, keeps none
+
+    """
+
+    self.log      = logging.getLogger(__name__)
+    self.cachedir = cachedir
+    self.retain   = retain
+
+  def filePath( self, model, time ):
+    """
+    Generate full path to the cache file for a given model and forecast time
+
+    Arguments:
+      model (str) : Name of the model
+      time (DataTime) : Forecast time
+
+    Returns:
+      str : Path to the cache file
+
+    """
+
+    if isinstance( time, (list, tuple)): time = time[0]
+    initTime, fcstTime = get_init_fcst_times( time, strfmt = TIMEFMT )
+    return os.path.join( self.cachedir, model, initTime, f'{fcstTime}.npz' )
+
+  def indexPath( self, model ):
+    """
+    Path of the index of forecast times of a model; see TimeIndex
+
+    The index is kept beside, not in, the directory of model cycles, so
+    it is never pruned.
+
+    """
+
+    return os.path.join( self.cachedir, f'{model}.times.pkl' )
+
+  def load( self, model, time ):
+    """
+    Load cached grids for a given model and forecast time
+
+    Arguments:
+      model (str) : Name of the model
+      time (DataTime) : Forecast time
+
+    Returns:
+      dict : Variables, keyed by standard name and level, along with lon
+        and lat values; None if the time is not in the cache
+
+    """
+
+    return self._load( self.filePath( model, time ) )
+
+  def _load( self, path ):
+    """Load grids from a cache file; None if missing or unreadable"""
+
+    if not os.path.isfile( path ): return None
+
+    try:
+      with np.load( path ) as fid:
+        unitDict = json.loads( str( fid['__units__'] ) )
+        data     = {}
+        for key in fid.files:
+          if key == '__units__': continue
+          unit = units( unitDict[key] ) if unitDict.get(key) else None
+          var  = fid[key] if unit is None else fid[key] * unit
+          if SEP in key:
+            varName, varLvl = key.split( SEP )
+            data.setdefault( varName, {} )[varLvl] = var
+          else:
+            data[key] = var
+    except Exception as err:
+      self.log.warning( f'Failed to read cache file, ignoring it : {path}; {err}' )
+      return None
+
+    self.log.debug( f'Loaded grids from cache : {path}' )
+    return data
+
+  def save( self, model, time, data, names ):
+    """
+    Save grids for a given model and forecast time to the cache
+
+    Arguments:
+      model (str) : Name of the model
+      time (DataTime) : Forecast time
+      data (dict) : Data to cache
+      names (iterable) : Standard names of variables in data to cache; the
+        lon and lat values are always cached
+
+    Returns:
+      str : Path to the cache file
+
+    """
+
+    return self._save( self.filePath( model, time ), data, names )
+
+  def writer( self, model, time ):
+    """
+    Open a cache file of a given model and forecast time for writing
+
+    Arguments:
+      model (str) : Name of the model
+      time (DataTime) : Forecast time
+
+    Returns:
+      CacheWriter : Writer of the file; grids are added as they arrive, and
+        the file is moved into place by close()
+
+    """
+
+    return CacheWriter( self.filePath( model, time ) )
+
+  def _save( self, path, data, names ):
+    """Write grids to a cache file atomically"""
+
+    writer = CacheWriter( path )
+    try:
+      writer.addFields( data, names )
+    except:
+      writer.abort()
+      raise
+    return writer.close()
+
+  def statePath( self, model, initTime, fcst, name ):
+    """
+    Generate full path to a state file for a given model and forecast time
+
+    State files hold values derived from the grids, such as running totals,
+    and are kept next to the grids of the same forecast time, so they are
+    pruned along with the model cycle.
+
+    Arguments:
+      model (str) : Name of the model
+      initTime (datetime) : Model initialization time
+      fcst (int) : Forecast time, in seconds since initialization
+      name (str) : Name of the state; e.g., accum
+
+    Returns:
+      str : Path to the state file
+
+    """
+
+    fcstTime = initTime + timedelta( seconds = fcst )
+    return os.path.join( self.cachedir, model, initTime.strftime( TIMEFMT ), 
+                         f'{fcstTime.strftime( TIMEFMT )}.{name}.npz' )
+
+  def loadState( self, model, initTime, fcst, name ):
+    """Load a state file; returns None if it does not exist. See statePath()"""
+
+    return self._load( self.statePath( model, initTime, fcst, name ) )
+
+  def saveState( self, model, initTime, fcst, name, data ):
+    """Save all variables in data to a state file. See statePath()"""
+
+    names = [key for key in data if key not in ('lon', 'lat')]
+    return self._save( self.statePath( model, initTime, fcst, name ), data, names )
+
+  def stateTimes( self, model, initTime, name ):
+    """
+    List forecast times that have a given state file
+
+    Arguments:
+      model (str) : Name of the model
+      initTime (datetime) : Model initialization time
+      name (str) : Name of the state; e.g., accum
+
+    Returns:
+      list : Sorted forecast times, in seconds since initialization
+
+    """
+
+    root   = os.path.join( self.cachedir, model, initTime.strftime( TIMEFMT ) )
+    suffix = f'.{name}.npz'
+    if not os.path.isdir( root ): return []
+    times  = []
+    for fname in os.listdir( root ):
+      if not fname.endswith( suffix ): continue
+      try:
+        fcstTime = datetime.strptime( fname[:-len(suffix)], TIMEFMT )
+      except ValueError:
+        continue
+      times.append( int( (fcstTime - initTime).total_seconds() ) )
+    return sorted( times )
+
+  def cycles( self, model ):
+    """
+    List model cycles in the cache
+
+    Arguments:
+      model (str) : Name of the model
+
+    Returns:
+      list : Initialization datetimes of cached cycles, oldest first
+
+    """
+
+    root   = os.path.join( self.cachedir, model )
+    if not os.path.isdir( root ): return []
+    cycles = []
+    for name in os.listdir( root ):
+      try:
+        cycles.append( datetime.strptime( name, TIMEFMT ) )
+      except ValueError:
+        continue
+    return sorted( cycles )
+
+  def grid( self, model ):
+    """
+    Longitudes and latitudes of the model grid, from the newest cached cycle
+
+    Arguments:
+      model (str) : Name of the model
+
+    Returns:
+      tuple : lon and lat values; None if no grids of the model are cached
+
+    """
+
+    for cycle in reversed( self.cycles( model ) ):
+      root = os.path.join( self.cachedir, model, cycle.strftime( TIMEFMT ) )
+      for fname in sorted( os.listdir( root ) ):
+        if not fname.endswith( '.npz' ) or fname.count( '.' ) != 1: continue   # Grids only; state files have no lon and lat
+        data = self._load( os.path.join( root, fname ) )
+        if data is not None and 'lon' in data:
+          return data['lon'], data['lat']
+    return None
+
+  def prune( self, model ):
+    """Remove all but the most recent model cycles from the cache; all if retain is zero"""
+
+    root = os.path.join( self.cachedir, model )
+    if not os.path.isdir( root ): return
+    cycles = sorted( os.listdir( root ) )
+    if self.retain > 0: cycles = cycles[:-self.retain]                          # Slicing with [:-0] would keep every cycle
+    for cycle in cycles:
+      self.log.info( f'Removing cycle from grid cache : {model} {cycle}' )
+      shutil.rmtree( os.path.join( root, cycle ), ignore_errors = True )
+
+class CacheWriter( object ):
+  """
+  Writer of one cache file, whose grids are added one at a time
+
+  Each grid is compressed into a temporary file as soon as it is added, in
+  the format of np.savez_compressed(), so the caller may drop it right
+  away; close() adds the units of all grids and moves the file into place.
+
+  """
+
+  def __init__(self, path):
+    """
+    Arguments:
+      path (str) : Full path of the cache file
+
+    """
+
+    self.log   = logging.getLogger(__name__)
+    self.path  = path
+    self.tmp   = f'{path}.{os.getpid()}.tmp'
+    self.units = {}                                                             # Unit of each grid written, keyed by npz key
+    os.makedirs( os.path.dirname( path ), exist_ok=True )
+    self._zip  = zipfile.ZipFile( self.tmp, mode = 'w', compression = zipfile.ZIP_DEFLATED,
+                                  allowZip64 = True )
+
+  def _write( self, key, array ):
+    with self._zip.open( f'{key}.npy', 'w', force_zip64 = True ) as fid:
+      np.lib.format.write_array( fid, np.asanyarray( array ), allow_pickle = False )
+
+  def add( self, key, var ):
+    """Write a grid under an npz key, unless already written"""
+
+    if key in self.units: return
+    array, self.units[key] = _split( var )
+    self._write( key, array )
+
+  def addFields( self, data, names ):
+    """
+    Write grids of variables, along with lon and lat values, not yet written
+
+    Arguments:
+      data (dict) : Data; variables are dictionaries of grids keyed by level
+      names (iterable) : Standard names of variables in data to write; the
+        lon and lat values are always written
+
+    """
+
+    for varName in names:
+      if varName not in data: continue
+      for varLvl, var in list( data[varName].items() ):
+        self.add( f'{varName}{SEP}{varLvl}', var )
+    for key in ('lon', 'lat'):
+      if key in data: self.add( key, data[key] )
+
+  def close( self ):
+    """
+    Finish the file and move it into place
+
+    Returns:
+      str : Path to the cache file
+
+    """
+
+    self._write( '__units__', np.array( json.dumps( self.units ) ) )
+    self._zip.close()
+    os.replace( self.tmp, self.path )
+    self.log.debug( f'Saved grids to cache : {self.path}' )
+    return self.path
+
+  def abort( self ):
+    """Discard the file"""
+
+    try:
+      self._zip.close()
+    finally:
+      if os.path.isfile( self.tmp ): os.remove( self.tmp )
+
+def _split( var ):
+  """Split value into magnitude and unit string"""
+
+  if hasattr( var, 'magnitude' ):
+    return np.asarray( var.magnitude ), str( var.units )
+  return np.asarray( var ), ''
@@ -0,0 +1,155 @@
+import logging
+import os, pickle
+from datetime import datetime
+from functools import lru_cache
+
+ISO     = '%Y-%m-%d %H:%M:%S'                                                   # Format of reference time of AWIPS times
+VERSION = 3                                                                     # Version of the index file; older files are ignored
+
+@lru_cache( maxsize = 4096 )
+def parseRefTime( text ):
+  """Parse reference time of an AWIPS time, as returned by str(); cached"""
+
+  return datetime.strptime( text, ISO )
+
+class TimeIndex( object ):
+  """
+  Index of the forecast times of each cycle of a model
+
+  The times of each cycle are kept by forecast time, in seconds since
+  initialization, along with the duration of their valid period, so that
+  forecast times of a cycle are found without parsing, or filtering, the
+  times again. Times of complete cycles are not requested from EDEX
+  again. A cycle is complete once its final forecast time is indexed, if
+  the final forecast time of the model is known; otherwise, once its times
+  were requested while a newer cycle was available and it was at least a
+  settling period old, as EDEX may still be ingesting the late hours of a
+  cycle after the next one starts. Only the times of incomplete cycles are
+  merged when times are requested. The index is saved to a file, so it
+  persists across runs.
+
+  """
+
+  def __init__(self, path = None, final = None, settle = 43200):
+    """
+    Keyword arguments:
+      path (str) : Path of the file to keep the index in; if None, the
+        index is kept in memory only
+      final (int) : Final forecast time of a complete cycle, in seconds
+        since initialization; None if not known
+      settle (float) : Seconds after initialization before a cycle, that
+        has a newer cycle, is complete without its final forecast time
+
+    """
+
+    self.log    = logging.getLogger(__name__)
+    self.path   = path
+    self.final  = final
+    self.settle = settle
+    self.cycles = {}                                                            # Runs keyed by initialization time; see add()
+    self._load()
+
+  def _load( self ):
+    if self.path is None or not os.path.isfile( self.path ): return
+    try:
+      with open( self.path, 'rb' ) as fid:
+        version, cycles = pickle.load( fid )
+    except Exception as err:
+      self.log.warning( f'Ignoring unreadable time index : {self.path}; {err}' )
+      return
+    if version == VERSION:
+      self.cycles = cycles
+      self.log.debug( f'Loaded times of {len(cycles)} cycles from : {self.path}' )
+
+  def save( self ):
+    """Write the index to its file, if any, atomically"""
+
+    if self.path is None: return
+    tmp = f'{self.path}.{os.getpid()}.tmp'
+    try:
+      os.makedirs( os.path.dirname( self.path ), exist_ok=True )
+      with open( tmp, 'wb' ) as fid:
+        pickle.dump( (VERSION, self.cycles), fid, protocol = pickle.HIGHEST_PROTOCOL )
+      os.replace( tmp, self.path )
+    except Exception as err:
+      self.log.warning( f'Failed to write time index : {self.path}; {err}' )
+
+  def sync( self, cycles ):
+    """
+    Remove cycles no longer available on the server from the index
+
+    Arguments:
+      cycles (list) : Initialization datetimes of available cycles
+
+    Returns:
+      bool : True if the index changed
+
+    """
+
+    changed = False
+    cycles  = set( cycles )
+    for init in list( self.cycles ):
+      if init not in cycles:
+        del self.cycles[init]
+        changed = True
+    return changed
+
+  def isComplete( self, cycle ):
+    """Check if all times of a cycle are indexed"""
+
+    return self.cycles.get( cycle, {} ).get( 'complete', False )
+
+  def add( self, times, now = None ):
+    """
+    Add times to the index; times of complete cycles are ignored
+
+    The times must be all available times, of all cycles; cycles with their
+    final forecast time, or older than the newest cycle in the times and
+    settled, are marked complete.
+
+    Arguments:
+      times (list) : AWIPS times, as returned by getAvailableTimes()
+
+    Keyword arguments:
+      now (datetime) : Current UTC time; default is the clock
+
+    """
+
+    now = now or datetime.utcnow()
+
+    runs = {}
+    for time in times:
+      init = parseRefTime( str(time) )
+      if self.isComplete( init ): continue
+      run  = runs.setdefault( init, {} )
+      run.setdefault( time.getFcstTime(), [] ).append(
+        (time.getValidPeriod().duration(), time)
+      )
+    latest = max( runs, default = None )
+    for init, run in runs.items():
+      entry = self.cycles.setdefault( init, {'complete' : False, 'run' : {}} )
+      entry['run']      = dict( sorted( run.items() ) )
+      entry['complete'] = self._isFinished( init, entry['run'], latest, now )
+
+  def _isFinished( self, init, run, latest, now ):
+    """Check if a cycle has all its times; see add()"""
+
+    if self.final is not None:
+      return self.final in run
+    return init < latest and (now - init).total_seconds() >= self.settle        # A newer cycle alone does not mean the late hours are ingested
+
+  def run( self, cycle ):
+    """
+    Forecast times of a cycle
+
+    Arguments:
+      cycle (datetime) : Initialization time of the cycle
+
+    Returns:
+      dict : Lists of (valid period duration, AWIPS time) keyed by forecast
+        time, in seconds, in order; None if the cycle is not indexed
+
+    """
+
+    entry = self.cycles.get( cycle, None )
+    return None if entry is None else entry['run']
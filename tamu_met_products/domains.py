@@ -0,0 +1,248 @@
+import logging
+import os, json
+
+import numpy as np
+import cartopy.crs as ccrs
+
+from .data_backends.awips_model_utils import AWIPSData
+from .plotting.plot_utils import xy_transform, getMapExtentScale
+
+dir = os.path.dirname( __file__ )
+with open( os.path.join(dir, 'plot_opts.json'), 'r' ) as fid:
+  OPTS = json.load(fid)
+
+PRIMARY   = next( iter( OPTS['domains'] ) )                                     # Images of the first domain are written to the top-level product directories
+LONLAT    = ccrs.PlateCarree()
+MARGIN    = 1.1                                                                 # Keep grid points this far beyond the map, relative to its half-width, so contours reach the edges
+
+class DomainGrid( object ):
+  """
+  Projected coordinates, and subset, of a model grid for a domain
+
+  Computed once per model grid, and reused for every forecast hour and
+  product drawn for the domain.
+
+  """
+
+  def __init__(self, domain, xx, yy, subset, bounds):
+    """
+    Arguments:
+      domain (Domain) : Domain the grid was prepared for
+      xx (ndarray) : Projected x-values of the subset grid
+      yy (ndarray) : Projected y-values of the subset grid
+      subset (tuple) : Slices of the rows and columns of the model grid
+        within the domain
+      bounds (tuple) : Projected x- and y-values that the map must cover;
+        used to determine map extent and scale
+
+    """
+
+    self.domain = domain
+    self.xx     = xx
+    self.yy     = yy
+    self.subset = subset
+    self.bounds = bounds
+
+  def extentScale( self, ax, **kwargs ):
+    """
+    Map extent and scale of the domain on an axis
+
+    Arguments:
+      ax (GeoAxes) : Axis the map is drawn on
+
+    Keyword arguments:
+      Passed to getMapExtentScale()
+
+    Returns:
+      tuple : (map-extent, scale)
+
+    """
+
+    if self.domain.scale is not None:
+      kwargs['scale'] = self.domain.scale
+      return getMapExtentScale( ax, **kwargs )
+    return getMapExtentScale( ax, *self.bounds, **kwargs )
+
+class Domain( object ):
+  """
+  Map domain that products are drawn for
+
+  A domain has its own projection, and, optionally, the longitudes and
+  latitudes, or scale, the map must cover. Domains share the data of a
+  forecast hour; each gets a view of the data subset to the grid points it
+  needs, with coordinates already projected.
+
+  """
+
+  def __init__(self, name, projection = None, extent = None, scale = None):
+    """
+    Arguments:
+      name (str) : Name of the domain; also the name of its output directory
+
+    Keyword arguments:
+      projection (dict) : Name and keywords of the cartopy projection; the
+        center of the projection is the center of the map. Default is the
+        'projection' entry of plot_opts.json
+      extent (list) : West, east, south, and north bounds, in degrees, that
+        the map must cover. If None, the map covers the model grid
+      scale (float) : Fixed map scale; meters in projection per cm on page.
+        Overrides extent for the map; extent is then only used to subset
+
+    """
+
+    self.log    = logging.getLogger(__name__)
+    self.name   = name
+    projOpts    = (projection or OPTS['projection']).copy()
+    self.projection = getattr( ccrs, projOpts.pop('name') )( **projOpts )
+    self.extent = extent
+    self.scale  = scale
+    self._grids = {}
+
+  def __repr__( self ):
+    return f'Domain({self.name!r})'
+
+  @property
+  def primary( self ):
+    return self.name == PRIMARY
+
+  def grid( self, lon, lat ):
+    """
+    Prepare a model grid for the domain; cached by grid
+
+    Arguments:
+      lon (ndarray) : Longitudes of the model grid
+      lat (ndarray) : Latitudes of the model grid
+
+    Returns:
+      DomainGrid
+
+    """
+
+    lon = getattr( lon, 'magnitude', lon )
+    lat = getattr( lat, 'magnitude', lat )
+    key = (lon.shape, float(lon[0,0]), float(lon[-1,-1]), float(lat[0,0]), float(lat[-1,-1]))
+    if key not in self._grids:
+      self._grids[key] = self._prepare( lon, lat )
+    return self._grids[key]
+
+  def _prepare( self, lon, lat ):
+    """Project grid and find subset covering the domain"""
+
+    xx, yy = xy_transform( self.projection, LONLAT, lon, lat )
+    bounds = self._bounds()
+    if bounds is None:
+      self.log.debug( f'Domain {self.name} uses full grid' )
+      return DomainGrid( self, xx, yy, (slice(None), slice(None)), (xx, yy) )
+
+    dx, dy = bounds
+    inside = (np.abs(xx) <= dx * MARGIN) & (np.abs(yy) <= dy * MARGIN)
+    rows   = np.flatnonzero( inside.any( axis = 1 ) )
+    cols   = np.flatnonzero( inside.any( axis = 0 ) )
+    if rows.size == 0 or cols.size == 0:
+      raise Exception( f'Domain {self.name} does not overlap model grid' )
+    subset = (slice( max(rows[0]-1, 0), rows[-1]+2 ), slice( max(cols[0]-1, 0), cols[-1]+2 ))
+    self.log.debug( f'Domain {self.name} uses grid rows {subset[0]}, columns {subset[1]}' )
+    return DomainGrid( self, xx[subset], yy[subset], subset,
+                       (np.array([-dx, dx]), np.array([-dy, dy])) )
+
+  def _bounds( self ):
+    """
+    Half-width and half-height, in projected coordinates, the map can cover
+
+    Returns:
+      tuple : Half-width and half-height; None if the domain covers the
+        model grid
+
+    """
+
+    if self.scale is not None:                                                  # Largest map is the full figure
+      width, height = np.array( OPTS['figure_opts']['figsize'] ) * 2.54 * self.scale / 2.0
+      return width, height
+    if self.extent is None: return None
+
+    west, east, south, north = self.extent
+    lon = np.concatenate( [np.linspace( west, east, 50 ), np.full( 50, east ),
+                           np.linspace( east, west, 50 ), np.full( 50, west )] )
+    lat = np.concatenate( [np.full( 50, south ), np.linspace( south, north, 50 ),
+                           np.full( 50, north ), np.linspace( north, south, 50 )] )
+    xyz = self.projection.transform_points( LONLAT, lon, lat )                  # Boundary of extent; edges are curved in projection
+    return np.abs( xyz[:,0] ).max(), np.abs( xyz[:,1] ).max()                   # Symmetric about projection center, as maps are
+
+  def view( self, data ):
+    """
+    View of the data of a forecast hour for the domain
+
+    The view shares the data; fields are sliced, not copied, to the grid
+    points of the domain, and 'lon' and 'lat' are replaced by the projected
+    coordinates of the domain.
+
+    Arguments:
+      data (AWIPSData) : Data for a forecast hour
+
+    Returns:
+      AWIPSData : Data for the domain; the DomainGrid is under 'domain'
+
+    """
+
+    grid  = self.grid( data['lon'], data['lat'] )
+    shape = np.shape( data['lon'] )
+    view  = AWIPSData( data )
+    if grid.subset != (slice(None), slice(None)):
+      for name, levels in data.items():
+        if not isinstance( levels, dict ): continue
+        view[name] = {level : var[(Ellipsis,) + grid.subset]
+                                if np.ndim(var) >= 2 and np.shape(var)[-2:] == shape else var
+                        for level, var in levels.items()}
+    view['lon'], view['lat'] = grid.xx, grid.yy
+    view['domain'] = grid
+    return view
+
+def decimate( data, step ):
+  """
+  Decimated view of the data of a forecast hour
+
+  Only every step-th grid point, along both axes, of the fields, and of
+  'lon' and 'lat', is kept; fields are sliced, not copied.
+
+  Arguments:
+    data (AWIPSData) : Data for a forecast hour, or a view of the data for
+      a domain; see Domain.view()
+    step (int) : Keep every step-th grid point
+
+  Returns:
+    AWIPSData : Decimated data; the input data if step is less than 2
+
+  """
+
+  if step < 2: return data
+  shape = np.shape( data['lon'] )
+  keep  = (Ellipsis, slice( None, None, step ), slice( None, None, step ))
+  view  = AWIPSData( data )
+  for name, levels in data.items():
+    if not isinstance( levels, dict ): continue
+    view[name] = {level : var[keep] if np.ndim(var) >= 2 and np.shape(var)[-2:] == shape else var
+                    for level, var in levels.items()}
+  view['lon'], view['lat'] = data['lon'][keep], data['lat'][keep]
+  return view
+
+def select( names = None ):
+  """
+  Select domains by name
+
+  Arguments:
+    names (list) : Names of domains defined in the 'domains' entry of
+      plot_opts.json. If None, or empty, only the primary, i.e., first,
+      domain is selected
+
+  Returns:
+    list : Domain objects
+
+  """
+
+  names   = names or [PRIMARY]
+  domains = []
+  for name in names:
+    if name not in OPTS['domains']:
+      raise Exception( f'No domain defined for: {name}' )
+    domains.append( Domain( name, **OPTS['domains'][name] ) )
+  return domains
@@ -0,0 +1,118 @@
+import logging
+import os, resource, tracemalloc
+
+PAGESIZE = os.sysconf( 'SC_PAGE_SIZE' ) if hasattr( os, 'sysconf' ) else 4096
+
+def getRSS():
+  """
+  Get resident set size of the current process
+
+  Reads /proc/self/statm where available; otherwise falls back to the peak
+  resident set size reported by getrusage.
+
+  Returns:
+    int : Resident set size in bytes
+
+  """
+
+  try:
+    with open( '/proc/self/statm', 'r' ) as fid:
+      return int( fid.read().split()[1] ) * PAGESIZE
+  except:
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss * 1024          # ru_maxrss is kilobytes on Linux
+
+class MemoryMonitor( object ):
+  """
+  Track memory growth of a long running process
+
+  The resident set size is sampled whenever sample() is called, typically
+  once per forecast hour. If tracing is enabled, a tracemalloc snapshot is
+  also taken so that the allocation sites that grew the most since the
+  first sample can be reported.
+
+  """
+
+  def __init__(self, trace = False, frames = 1, top = 10):
+    """
+    Keyword arguments:
+      trace (bool) : If set, use tracemalloc to track allocation sites; this
+        slows down allocations so is best used for diagnosing growth
+      frames (int) : Number of stack frames tracemalloc keeps per allocation
+      top (int) : Number of allocation sites to report
+
+    """
+
+    self.log     = logging.getLogger(__name__)
+    self.trace   = trace
+    self.top     = top
+    self.samples = []
+    self._first  = None
+    self._last   = None
+    if trace and not tracemalloc.is_tracing():
+      tracemalloc.start( frames )
+
+  def sample( self, label ):
+    """
+    Sample memory usage
+
+    Arguments:
+      label (str) : Label for the sample; e.g., forecast hour
+
+    Returns:
+      int : Resident set size in bytes
+
+    """
+
+    rss = getRSS()
+    self.samples.append( (label, rss) )
+    growth = rss - self.samples[0][1]
+    self.log.info( f'RSS at {label} : {rss/2**20:0.1f} MiB ({growth/2**20:+0.1f} MiB since first sample)' )
+
+    if self.trace:
+      snapshot = tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter( False, tracemalloc.__file__ ),)
+      )
+      if self._first is None:
+        self._first = snapshot
+      self._last = snapshot
+    return rss
+
+  def topGrowth( self ):
+    """
+    Allocation sites that grew the most between first and last samples
+
+    Returns:
+      list : tracemalloc.StatisticDiff objects; empty if not tracing
+
+    """
+
+    if self._first is None or self._last is self._first: return []
+    return self._last.compare_to( self._first, 'lineno' )[:self.top]
+
+  def report( self ):
+    """
+    Log and return report of memory growth
+
+    Returns:
+      str : Report text
+
+    """
+
+    if len(self.samples) == 0: return ''
+    lines = [ f'RSS first/peak/last : '
+              f'{self.samples[0][1]/2**20:0.1f}/'
+              f'{max(rss for _, rss in self.samples)/2**20:0.1f}/'
+              f'{self.samples[-1][1]/2**20:0.1f} MiB over {len(self.samples)} samples' ]
+    for stat in self.topGrowth():
+      lines.append( f'  {stat.size_diff/2**10:+10.1f} KiB {stat.count_diff:+8d} blocks : {stat.traceback}' )
+
+    report = os.linesep.join( lines )
+    self.log.info( 'Memory report' + os.linesep + report )
+    return report
+
+  def reset( self ):
+    """Clear samples and snapshots"""
+
+    self.samples = []
+    self._first  = None
+    self._last   = None
@@ -0,0 +1,240 @@
+import logging
+import os, bisect
+from threading import Lock, Thread
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape( value ):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labelText( names, values, extra = None ):
+  pairs = list( zip( names, values ) )
+  if extra is not None: pairs.append( extra )
+  if len(pairs) == 0: return ''
+  return '{' + ','.join( f'{name}="{_escape(value)}"' for name, value in pairs ) + '}'
+
+def _number( value ):
+  if value == float('inf'): return '+Inf'
+  return repr( float(value) ) if isinstance( value, float ) else str(value)
+
+class _Metric( object ):
+  """
+  Base class of metrics; keeps one value per combination of label values
+
+  Updates only take a lock and touch a dictionary, so metrics can be
+  updated from the render path, and the download thread, without any
+  measurable cost; the text format is only built when scraped.
+
+  """
+
+  TYPE = 'untyped'
+
+  def __init__(self, name, help, labels = ()):
+    self.name    = name
+    self.help    = help
+    self.labels  = tuple( labels )
+    self._lock   = Lock()
+    self._values = {}
+
+  def _key( self, labels ):
+    if len(labels) != len(self.labels):
+      raise ValueError( f'{self.name} requires labels {self.labels}, got {tuple(labels)}' )
+    return tuple( labels[name] for name in self.labels )
+
+  def _samples( self ):
+    with self._lock:
+      return [ (self.name, key, None, value) for key, value in self._values.items() ]
+
+  def render( self ):
+    """Lines of the Prometheus text format for the metric"""
+
+    lines = [ f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.TYPE}' ]
+    for name, key, extra, value in self._samples():
+      lines.append( f'{name}{_labelText( self.labels, key, extra )} {_number(value)}' )
+    return lines
+
+class Counter( _Metric ):
+  """Value that only increases; e.g., number of products rendered"""
+
+  TYPE = 'counter'
+
+  def inc( self, amount = 1, **labels ):
+    key = self._key( labels )
+    with self._lock:
+      self._values[key] = self._values.get( key, 0 ) + amount
+
+class Gauge( _Metric ):
+  """Value that can go up and down; e.g., queue depth"""
+
+  TYPE = 'gauge'
+
+  def set( self, value, **labels ):
+    key = self._key( labels )
+    with self._lock:
+      self._values[key] = value
+
+class Histogram( _Metric ):
+  """Distribution of observed values, in cumulative buckets"""
+
+  TYPE    = 'histogram'
+  BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, float('inf'))
+
+  def __init__(self, name, help, labels = (), buckets = None):
+    super().__init__( name, help, labels )
+    buckets = sorted( buckets or self.BUCKETS )
+    if buckets[-1] != float('inf'): buckets.append( float('inf') )
+    self.buckets = tuple( buckets )
+
+  def observe( self, value, **labels ):
+    key = self._key( labels )
+    with self._lock:
+      if key not in self._values:
+        self._values[key] = [ [0] * len(self.buckets), 0, 0.0 ]                 # Bucket counts, count, sum
+      counts, _, _ = entry = self._values[key]
+      counts[ bisect.bisect_left( self.buckets, value ) ] += 1
+      entry[1] += 1
+      entry[2] += value
+
+  def _samples( self ):
+    samples = []
+    with self._lock:
+      for key, (counts, count, total) in self._values.items():
+        cumulative = 0
+        for bound, n in zip( self.buckets, counts ):
+          cumulative += n
+          samples.append( (f'{self.name}_bucket', key, ('le', _number(bound)), cumulative) )
+        samples.append( (f'{self.name}_count', key, None, count) )
+        samples.append( (f'{self.name}_sum',   key, None, total) )
+    return samples
+
+class MetricsRegistry( object ):
+  """
+  Collection of metrics that can be exposed to Prometheus
+
+  Metrics are exposed either by writing a textfile for the node-exporter
+  textfile collector, or from a small HTTP server run in a daemon thread.
+
+  """
+
+  def __init__(self):
+    self.log      = logging.getLogger(__name__)
+    self._metrics = {}
+    self._server  = None
+
+  def _add( self, cls, name, *args, **kwargs ):
+    if name not in self._metrics:
+      self._metrics[name] = cls( name, *args, **kwargs )
+    return self._metrics[name]
+
+  def counter( self, name, help, labels = () ):
+    return self._add( Counter, name, help, labels )
+
+  def gauge( self, name, help, labels = () ):
+    return self._add( Gauge, name, help, labels )
+
+  def histogram( self, name, help, labels = (), buckets = None ):
+    return self._add( Histogram, name, help, labels, buckets = buckets )
+
+  def render( self ):
+    """
+    Render all metrics in the Prometheus text exposition format
+
+    Returns:
+      str : Text of all metrics
+
+    """
+
+    lines = []
+    for metric in self._metrics.values():
+      lines.extend( metric.render() )
+    return '\n'.join( lines ) + '\n'
+
+  def writeTextfile( self, path ):
+    """
+    Write metrics to a file for the node-exporter textfile collector
+
+    The file is written atomically, as the collector may read it at any
+    time.
+
+    Arguments:
+      path (str) : Path to the file; should end in .prom
+
+    """
+
+    root = os.path.dirname( os.path.abspath( path ) )
+    os.makedirs( root, exist_ok=True )
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+      with open( tmp, 'w' ) as fid:
+        fid.write( self.render() )
+      os.replace( tmp, path )
+    except Exception as err:
+      self.log.warning( f'Failed to write metrics textfile : {err}' )
+
+  def serve( self, port, addr = '127.0.0.1' ):
+    """
+    Serve metrics over HTTP, at any path, from a daemon thread
+
+    Arguments:
+      port (int) : Port to listen on
+
+    Keyword arguments:
+      addr (str) : Address to listen on; default is local connections only
+
+    Returns:
+      ThreadingHTTPServer : The server; already running
+
+    """
+
+    if self._server is not None: return self._server
+    registry = self
+
+    class Handler( BaseHTTPRequestHandler ):
+      def do_GET( self ):
+        body = registry.render().encode()
+        self.send_response( 200 )
+        self.send_header( 'Content-Type',   CONTENT_TYPE )
+        self.send_header( 'Content-Length', str( len(body) ) )
+        self.end_headers()
+        self.wfile.write( body )
+
+      def log_message( self, *args ):                                           # Do not write every scrape to stderr
+        pass
+
+    self._server = ThreadingHTTPServer( (addr, port), Handler )
+    self._server.daemon_threads = True
+    Thread( target = self._server.serve_forever, daemon = True ).start()
+    self.log.info( f'Serving metrics on http://{addr}:{port}/metrics' )
+    return self._server
+
+REGISTRY = MetricsRegistry()
+
+GRIDS_DOWNLOADED  = REGISTRY.counter( 'hdwx_grids_downloaded_total',
+  'Grids downloaded from EDEX', ('model',) )
+GRID_BYTES        = REGISTRY.counter( 'hdwx_grid_bytes_total',
+  'Bytes of grid data downloaded from EDEX', ('model',) )
+GRID_CACHE_HITS   = REGISTRY.counter( 'hdwx_grid_cache_hits_total',
+  'Forecast times loaded from the local grid cache', ('model',) )
+DOWNLOAD_SECONDS  = REGISTRY.histogram( 'hdwx_download_seconds',
+  'Seconds to get all grids for one forecast time', ('model',) )
+EDEX_SECONDS      = REGISTRY.histogram( 'hdwx_edex_request_seconds',
+  'Seconds for each attempt of an EDEX request, successful or not', ('model', 'method'),
+  buckets = [0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0] )
+EDEX_HEDGES       = REGISTRY.counter( 'hdwx_edex_hedged_total',
+  'Duplicate EDEX requests sent because an attempt was slow', ('model', 'method') )
+EDEX_FAILURES     = REGISTRY.counter( 'hdwx_edex_failed_attempts_total',
+  'EDEX request attempts that failed or timed out', ('model', 'method') )
+PRODUCTS_RENDERED = REGISTRY.counter( 'hdwx_products_rendered_total',
+  'Product images rendered', ('model', 'product') )
+PRODUCTS_SKIPPED  = REGISTRY.counter( 'hdwx_products_skipped_total',
+  'Products skipped because they are already complete', ('model', 'product') )
+RENDER_SECONDS    = REGISTRY.histogram( 'hdwx_render_seconds',
+  'Seconds to draw and write one product', ('model', 'product') )
+QUEUE_DEPTH       = REGISTRY.gauge( 'hdwx_queue_depth',
+  'Products waiting to be rendered', ('model',) )
+BACKFILL_CYCLES   = REGISTRY.counter( 'hdwx_backfill_cycles_total',
+  'Past model runs processed in backfill mode', ('model',) )
+DATA_AGE          = REGISTRY.histogram( 'hdwx_data_age_seconds',
+  'Seconds from model initialization to product publication', ('model', 'product'),
+  buckets = [3600 * hours for hours in (1, 2, 3, 4, 5, 6, 8, 10, 12, 18, 24)] )
@@ -1,24 +1,32 @@
 import logging
-import os, uuid, json
+import os, gc, uuid, json, socket
+from time import sleep, monotonic
 from datetime import datetime
+from functools import partial
 
 from awips.dataaccess import DataAccessLayer as DAL
 import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-
-from .data_backends.awips_model_utils import get_init_fcst_times, AWIPSModelDownloader, ISO
-from .data_backends.awips_models import NAM40, GFS
-
-from .plotting.plot_utils       import initFigure, xy_transform, getMapExtentScale
-from .plotting.model_plots      import (
-  plot_rh_mslp_thick,
-  plot_precip_mslp_temps, 
-  plot_srfc_temp_barbs,
-  plot_1000hPa_theta_e_barbs,
-  plot_850hPa_temp_hght_barbs,
-  plot_500hPa_vort_hght_barbs,
-  plot_250hPa_isotach_hght_barbs
-)
+
+from .data_backends.awips_model_utils import get_init_fcst_times, AWIPSModelDownloader, AWIPSData, ISO
+from .data_backends.awips_models import NAM40, GFS, MODELS
+from .data_backends.grid_cache import GridCache
+from .data_backends.accumulator import Accumulator, FIELDS as ACCUMULATED
+from .run_journal import RunJournal
+from .scheduling import rulePriority, ruleCadence, schedule, batches
+from .profiling import ProductProfiler
+from .memory import MemoryMonitor
+from .metrics import ( REGISTRY, PRODUCTS_RENDERED, PRODUCTS_SKIPPED, 
+  RENDER_SECONDS, QUEUE_DEPTH, DATA_AGE, BACKFILL_CYCLES )
+from .products import REGISTRY as PRODUCTS, select as selectProducts, modelVars, releasePlan, styles as productStyles, fields as productFields
+from .domains import select as selectDomains, decimate
+from .stamps import InputStamps, INPUTS_KEY, STAMP_KEY, PREVIEW_KEY, readStamp, isPreview
+from .styles import StyleRecord, styleDigests
+
+from .plotting.plot_utils       import initFigure
+from .plotting.image_utils      import renderFigure, resizeImage, saveImage, loadImage, tileImages
+from .plotting.animation        import LoopWriter, checkFormat as checkLoopFormat
+from .plotting.contour_cache    import CACHE_KEY as CONTOUR_CACHE
+from .plotting.render_profile   import setProfile as setRenderProfile, getProfile as getRenderProfile, PROFILES as RENDER_PROFILES
 
 dir = os.path.dirname( os.path.realpath(__file__) )
 with open( os.path.join( dir, 'plot_opts.json' ), 'r' ) as fid:
@@ -31,22 +39,176 @@ class ModelPlotter( object ):
 
   TIMEFMT   = '%Y%m%dT%H%M%S'
 
-  def __init__(self, outdir = None, **kwargs):
+  def __init__(self, outdir = None, products = None, variants = None, loop = None, priority = None, 
+                     profile = None, profileEvery = 1, memtrace = False,
+                     recycleRenders = None, recycleRSS = None, 
+                     metricsFile = None, metricsPort = None, composite = None, 
+                     renderProfile = None, domains = None, progressive = None, 
+                     cadence = None, preview = False, **kwargs):
+    """
+    Keyword arguments:
+      outdir (str) : Top-level output directory for images
+      products (list) : Names, or shell-style patterns, of products to
+        create; e.g., ['precip']. Only the data required by the selected
+        products is downloaded. If None, all registered products are created
+      variants (list) : Names of image variants, as defined in the
+        'image_variants' entry of plot_opts.json, to create in addition
+        to the full size images; e.g., ['mobile', 'thumbnail']
+      loop (str) : Format of the animated loop to build for each product
+        and model cycle as frames are created; one of 'mp4', 'gif', or
+        'webp'. If None, no loops are created
+      priority (list, function) : Priority for rendering products. Either a
+        function that takes forecast hour and product name and returns a
+        priority, lower values are rendered first, or a list of priority 
+        rules; see scheduling.parseRule(). If None, the rules in the 
+        'priority' entry of plot_opts.json are used
+      profile (list) : Names, or shell-style patterns, of products to
+        profile with cProfile; include 'download' to profile downloads.
+        An empty list profiles everything. If None, nothing is profiled
+      profileEvery (int) : Profile only one in every this many renders of
+        each product; set larger to reduce cost of leaving profiling on
+      memtrace (bool) : If set, trace allocations with tracemalloc and
+        report the allocation sites that grew the most during each run
+      recycleRenders (int) : Rebuild the figure after this many renders;
+        zero disables. Default from the 'memory' entry of plot_opts.json
+      recycleRSS (float) : Rebuild the figure when the resident set size
+        exceeds this many MiB; zero disables. Default from the 'memory'
+        entry of plot_opts.json
+      metricsFile (str) : Path of a node-exporter textfile to write metrics
+        to, in Prometheus format, after every forecast hour
+      metricsPort (int) : If set, serve metrics, in Prometheus format, over
+        HTTP on this port of localhost
+      composite (bool) : If set, multi-panel products, e.g., 4-panel, are
+        assembled from the images of their single-panel products rather
+        than drawn again. Default from the 'composite' entry of 
+        plot_opts.json
+      renderProfile (str) : Name of the render profile, as defined in the
+        'render_profiles' entry of plot_opts.json; e.g., 'fast' to trade
+        some fidelity for render speed. Default from the 'render_profile'
+        entry of plot_opts.json
+      domains (list) : Names of map domains, as defined in the 'domains'
+        entry of plot_opts.json, to create products for; e.g., ['conus',
+        'texas']. All domains are drawn from the same data. Images of the
+        first domain in plot_opts.json are written to the product
+        directories, those of others to a directory named for the domain.
+        If None, only the first domain is drawn
+      progressive (bool) : If set, each product of a forecast hour is drawn
+        as soon as the fields it uses are downloaded, rather than once all
+        fields of the hour are. Default from the 'progressive' entry of
+        plot_opts.json
+      cadence (dict, list) : Cadence rules, which set the forecast hours
+        each product is created for, keyed by model name; see
+        scheduling.ruleCadence(). A list of rules applies to all models.
+        Only forecast hours that some product is created for are
+        downloaded. Default from the 'cadence' entry of plot_opts.json;
+        products of models with no rules are created for every hour
+      preview (bool) : If set, low resolution previews of the missing
+        images of all products planned for a forecast time are published
+        as soon as its data arrive, from the same data, before any are
+        rendered in full; see previewProducts()
+
+    """
+
     self.log = logging.getLogger(__name__)                                            # Set up function for logger
 
-    self._model = '' 
-    self._dirs  = {}
+    self._model       = '' 
+    self._dirs        = {}
+    self._variantDirs = {}
 
-    self.outdir = outdir 
+    self.outdir   = outdir 
+    self.products = selectProducts( products )                                  # Selected products, in standard order
+    self.domains  = selectDomains( domains )
+    self._domain  = self.domains[0]
+    self.variants = {}
+    for variant in (variants or []):
+      if variant not in opts['image_variants']:
+        raise Exception( f'No image variant defined for: {variant}' )
+      self.variants[variant] = opts['image_variants'][variant]
+
+    if loop: checkLoopFormat( loop, opts['loop_opts'].get( 'ffmpeg', None ) )  # Fail now, rather than in the middle of a run
+    self.loop       = loop
+    self._loops     = {}
+    self._loopTimes = []
+    self._pending   = set()                                                     # Files of products still to be rendered in this run
+    self._settled   = None                                                      # If a set, files written, or confirmed unchanged, are added to it
+
+    if priority is None: priority = opts['priority']
+    self.priority   = priority if callable(priority) else rulePriority( priority )
+
+    if cadence is None: cadence = opts['cadence']
+    if not isinstance( cadence, dict ): cadence = {name : cadence for name in MODELS} # Same rules for all models
+    self.cadence    = {name : rules if callable(rules) else ruleCadence( rules )
+                         for name, rules in cadence.items()}
+
+    self.journal    = None
+
+    self._plotters  = {key : partial( self.plotProduct, key ) for key in PRODUCTS} # Function that creates each product
+    self.profiler   = None
+    if profile is not None:
+      self.profiler = ProductProfiler( os.path.join( self._outdir, '.profile' ), 
+                                       products = profile, every = profileEvery )
+      for key, func in self._plotters.items():
+        self._plotters[key] = self.profiler.wrap( func, key, self._profileLabel( key ) ) # Replace plot function with profiled version
       
 
-    mapOpts        = opts['projection'].copy()
-    mapProj        = getattr( ccrs, mapOpts.pop('name') )
-    self.mapProj   = mapProj( **mapOpts ) 
-    self.transform = ccrs.PlateCarree()
+    self.memory         = MemoryMonitor( trace = memtrace )
+    self.recycleRenders = opts['memory']['recycle_renders'] if recycleRenders is None else recycleRenders
+    self.recycleRSS     = opts['memory']['recycle_rss_mb']  if recycleRSS     is None else recycleRSS
+    self._nRenders      = 0                                                     # Renders since figure was last rebuilt
+
+    self.metricsFile = metricsFile
+
+    self.composite = opts['composite'] if composite is None else composite
+    self.progressive = opts['progressive'] if progressive is None else progressive
+    self.preview   = preview
+    self._buffers  = {}                                                         # Images rendered for the current forecast hour; used for composites
+    self._nSaved   = 0
+    if metricsPort: REGISTRY.serve( metricsPort )
+
+    self.renderProfile = setRenderProfile( renderProfile or opts['render_profile'] )
+
+    self.fig       = None
+    self._newFigure()
+
+  def _newFigure( self ):
+    """Create the figure that all products are drawn on"""
 
     self.fig       = plt.figure( **opts['figure_opts'] )
-    plt.subplots_adjust( **opts['subplot_adjust'] )                              # Set up subplot margins
+    self.fig.subplots_adjust( **opts['subplot_adjust'] )                        # Set up subplot margins
+    self._nRenders = 0
+
+  def _recycleFigure( self ):
+    """
+    Tear down and rebuild the figure
+
+    Long running processes slowly accumulate memory from repeatedly
+    clearing and redrawing the same figure; closing the figure, and
+    collecting the objects it referenced, returns that memory.
+
+    """
+
+    self.log.info( f'Recycling figure after {self._nRenders} renders' )
+    plt.close( self.fig )
+    self.fig = None
+    gc.collect()
+    self._newFigure()
+
+  def _checkMemory( self, data ):
+    """
+    Sample memory use for a forecast hour and recycle figure if needed
+
+    Arguments:
+      data (AWIPSData) : Data for the forecast hour just rendered
+
+    """
+
+    label = '{} {}'.format( data['model'], data['fcstTime'].strftime( self.TIMEFMT ) )
+    rss   = self.memory.sample( label )
+    if self.recycleRenders and self._nRenders >= self.recycleRenders:
+      self._recycleFigure()
+    elif self.recycleRSS and rss > self.recycleRSS * 2**20 and self._nRenders > 0:
+      self.log.info( f'RSS above {self.recycleRSS} MiB' )
+      self._recycleFigure()
 
   @property
   def outdir(self):
@@ -64,39 +226,221 @@ class ModelPlotter( object ):
   @model.setter
   def model(self, val):
     self._model  = val
-    self._dirs = {'4-panel'  : os.path.join( self.outdir, '4-panel'  ),
-                  'mslp'     : os.path.join( self.outdir, 'mslp'     ),
-                  'surface'  : os.path.join( self.outdir, 'surface'  ),
-                  '1000-hPa' : os.path.join( self.outdir, '1000-hPa' ),
-                  '850-hPa'  : os.path.join( self.outdir, '850-hPa'  ),
-                  '500-hPa'  : os.path.join( self.outdir, '500-hPa'  ),
-                  '250-hPa'  : os.path.join( self.outdir, '250-hPa'  ),
-                  'precip'   : os.path.join( self.outdir, 'precip'   )}
+    self._setDirs()
+
+  @property
+  def domain(self):
+    return self._domain
+  @domain.setter
+  def domain(self, val):
+    self._domain = val
+    self._setDirs()
+
+  def _setDirs(self):
+    """Set output directories for the current model and domain"""
+
+    root = self.outdir if self.domain.primary else os.path.join( self.outdir, self.domain.name )
+    self._dirs   = {key : os.path.join( root, key ) for key in PRODUCTS}
+    self._variantDirs = {
+      variant : {product : os.path.join( root, variant, product )
+                   for product in self._dirs}
+      for variant in self.variants
+    }                                                                           # Parallel directory trees for downscaled images
+
+  def _eachDomain(self):
+    """Make each domain the current domain in turn"""
+
+    current = self.domain
+    try:
+      for domain in self.domains:
+        self.domain = domain
+        yield domain
+    finally:
+      self.domain = current
 
   @property
   def dirs(self):
     return self._dirs
 
-  def checkFile(self, date, product, update=False, makedirs=True):
+  @property
+  def variantDirs(self):
+    return self._variantDirs
+
+  def checkFile(self, date, product, update=False, makedirs=True, stamp=None, force=False):
+    """
+    Check if a product must be created, and get the path of its image
+
+    Arguments:
+      date (DataTime) : Date for the forecast
+      product (str) : Name of product
+
+    An existing image is kept if it has the same stamp; if it was drawn
+    from other inputs, e.g., grids that were re-ingested, it is created
+    again. Images without stamps are kept unless update is set.
+
+    Keyword arguments:
+      update (bool) : If set, create the product even if it exists, unless
+        the existing image has the same stamp
+      makedirs (bool) : If set, create the directory of the image
+      stamp (str) : Stamp of the inputs of the product; see InputStamps
+      force (bool) : If set, create the product in any case
+
+    Returns:
+      str : Path of the image; None if the product is skipped
+
+    """
+
     sfile = self.filePath( date, product )
 
-    if not update and os.path.isfile( sfile  ):
-      self.log.info( f'File exists, skipping: {sfile}' )
+    reason = None
+    old    = readStamp( sfile ) if stamp is not None and not force else None    # Stamp of the existing image, if any
+    if force:
+      pass
+    elif old is not None and old == stamp:
+      reason = 'Inputs unchanged'
+    elif not update and self._isComplete( date, product, sfile ):
+      if old is None:
+        reason = 'File exists'
+      else:
+        self.log.info( f'Inputs changed, re-creating: {sfile}' )
+    if reason is not None:
+      self.log.info( f'{reason}, skipping: {sfile}' )
+      if self._settled is not None: self._settled.add( sfile )
+      PRODUCTS_SKIPPED.inc( model = self.model, product = product )
+      if self.journal is not None:
+        self.journal.done( self.workItem( date, product ) )
       return None
     if makedirs:
       root = os.path.dirname( sfile )
       if not os.path.isdir( root ): os.makedirs( root )
+    if self.journal is not None:
+      self.journal.start( self.workItem( date, product ) )
     return sfile
 
+  def _isComplete(self, date, product, sfile):
+    """
+    Check if a product has been created
+
+    If there is a run journal, items completed in the journal are trusted
+    without checking the file system, and items that were started but never
+    completed are always re-done. Otherwise, checks if the file exists, and
+    is not a preview.
+
+    """
+
+    if self.journal is not None:
+      item = self.workItem( date, product )
+      if self.journal.isDone( item ):
+        return True
+      elif self.journal.isStarted( item ):
+        return False
+    return os.path.isfile( sfile ) and not isPreview( sfile )
+
+  def onCadence(self, date, product):
+    """Check if a product is created for a forecast date of the current model; see ruleCadence()"""
+
+    if isinstance( date, (list, tuple)): date = date[0]
+    cadence = self.cadence.get( self.model, None )
+    return cadence is None or cadence( date.getFcstTime() // 3600, product )
+
   def filterTimes(self, dates):
-    toDownload = []                                                             # List of times to download
-    for date in dates:                                                          # Iterate over all dates
-      files = self.filePaths( date )                                            # Get list of files for given date
-      if not all( map( os.path.isfile, files.values() ) ):                      # If NOT all of the files exist
-        toDownload.append( date )                                               # Append date toDownload list
-    return toDownload 
+    work = self.planWork( dates )                                               # Products still to create for any domain
+    return [date for date in dates if any( time is date for time, _ in work )] # Times with any work to do
+
+  def planWork(self, dates, update = False):
+    """
+    List all work items that must be done for the given forecast dates
+
+    Arguments:
+      dates (list) : Forecast dates
+
+    Keyword arguments:
+      update (bool) : If set, all products are planned, even if complete
+
+    Returns:
+      list : Tuples of (forecast date, product name); a product is planned
+        if the date is on its cadence, see onCadence(), and it is
+        incomplete for any domain
+
+    """
+
+    incomplete = set()
+    for _ in self._eachDomain():
+      for i, date in enumerate( dates ):
+        for product in self.products:
+          if not self.onCadence( date, product ): continue
+          if update or not self._isComplete( date, product, self.filePath( date, product ) ):
+            incomplete.add( (i, product) )
+    return [(date, product) for i, date in enumerate( dates ) 
+                            for product in self.products if (i, product) in incomplete]
+
+  def domainPaths(self, date, product):
+    """Full paths of the images of a product for all domains"""
+
+    return [self.filePath( date, product ) for _ in self._eachDomain()]
+
+  def workItem(self, date, product):
+    """Generate run journal key for given forecast date and product in current domain"""
+
+    if isinstance( date, (list, tuple)): date = date[0]
+    _, fcstTime = get_init_fcst_times( date, strfmt = self.TIMEFMT )
+    if self.domain.primary:
+      return f'{fcstTime}/{product}'
+    return f'{fcstTime}/{self.domain.name}/{product}'
+
+  def _openJournal(self, dates):
+    """
+    Open the run journal for the model cycle and plan all work items
+
+    Arguments:
+      dates (list) : All forecast dates of the model cycle
+
+    """
+
+    self._closeJournal()
+    if len(dates) == 0: return
+
+    initTime, _  = get_init_fcst_times( dates[0][0], strfmt = self.TIMEFMT )
+    self.journal = RunJournal( os.path.join( self.outdir, '.journal', f'{initTime}.jsonl' ) )
+    self.journal.plan( 
+      [self.workItem( date, product ) for _ in self._eachDomain()
+                                      for date in dates for product in self.products
+                                      if self.onCadence( date, product )]
+    )
+
+  def _closeJournal(self):
+    if self.journal is not None:
+      self.journal.close()
+      self.journal = None
 
-  def filePath( self, date, product, root=None ):
+  def _pruneJournals(self, cycles):
+    """
+    Remove run journals of model cycles older than those given
+
+    Arguments:
+      cycles (list) : Initialization datetimes of cycles still in the grid
+        cache; journals of older cycles are removed. Nothing is removed if
+        empty; all journals are removed if None
+
+    """
+
+    if cycles is not None and len(cycles) == 0: return
+    oldest = None if cycles is None else min( cycles )
+    root   = os.path.join( self.outdir, '.journal' )
+    if not os.path.isdir( root ): return
+    for fname in os.listdir( root ):
+      try:
+        initTime = datetime.strptime( fname, f'{self.TIMEFMT}.jsonl' )
+      except ValueError:
+        continue
+      if oldest is None or initTime < oldest:
+        self.log.info( f'Removing run journal : {fname}' )
+        try:
+          os.remove( os.path.join( root, fname ) )
+        except OSError as err:
+          self.log.warning( f'Failed to remove run journal : {fname}; {err}' )
+
+  def filePath( self, date, product, root=None, variant=None ):
     """
     Generate full path to given product image
 
@@ -107,11 +451,17 @@ class ModelPlotter( object ):
     Keyword arguments:
       root (str) : Root directory to place images in. If None provided
         self.dirs[ product ] is used.
+      variant (str) : Name of image variant; if set, and root is None,
+        self.variantDirs[ variant ][ product ] is used
 
     """
 
     if isinstance( date, (list, tuple)): date = date[0]
-    if root is None: root = self.dirs.get(product)
+    if root is None:
+      if variant is None:
+        root = self.dirs.get(product)
+      else:
+        root = self.variantDirs[variant].get(product)
 
     initTime, fcstTime = get_init_fcst_times( date, strfmt = self.TIMEFMT )
 
@@ -120,14 +470,197 @@ class ModelPlotter( object ):
 
   def filePaths( self, date ):
     files = {}
-    for product, root in self.dirs.items():
+    for product in self.products:
       try:
-        files[product] = self.filePath( date, product, root )
+        files[product] = self.filePath( date, product )
       except Exception as err:
         self.log.debug( f'Hit weird time index exception : {err}' )
         pass
     return files
 
+  def _saveFig( self, sfile, date, product, dpi = None, stamp = None, **kwargs ):
+    """
+    Rasterize the current figure and write all image sizes
+
+    The figure is rasterized only once, at the full output resolution; the
+    full size image is written from the buffer, and all image variants are
+    derived by downsampling the same buffer.
+
+    Arguments:
+      sfile (str) : Full path of the full size image
+      date (DataTime) : Date for the forecast
+      product (str) : Name of product being created
+
+    Keyword arguments:
+      dpi (int) : Dots-per-inch for the full size image
+      stamp (str) : Stamp of the inputs of the product; see _saveImage()
+
+    Returns:
+      ndarray : The full resolution RGBA buffer
+
+    """
+
+    img = renderFigure( self.fig, dpi = dpi )
+    self._nRenders += 1
+    return self._saveImage( img, sfile, date, product, stamp = stamp )
+
+  def _saveImage( self, img, sfile, date, product, stamp = None ):
+    """
+    Write a rendered image, and all its variants, and record it as done
+
+    Arguments:
+      img (ndarray) : Full resolution RGBA image
+      sfile (str) : Full path of the full size image
+      date (DataTime) : Date for the forecast
+      product (str) : Name of product being created
+
+    Keyword arguments:
+      stamp (str) : Stamp of the inputs of the product; written to the
+        full size image so that unchanged products are skipped on update
+
+    Returns:
+      ndarray : The input image
+
+    """
+
+    saveImage( img, sfile, text = {STAMP_KEY : stamp} if stamp else None )
+    self._nSaved += 1
+    if self._settled is not None: self._settled.add( sfile )
+    if self.composite: self._buffers[product] = img
+    self._appendFrame( date, product, img )
+    for variant, variantOpts in self.variants.items():
+      vfile = self.filePath( date, product, variant = variant )
+      self.log.debug( f'Writing {variant} image: {vfile}' )
+      saveImage( resizeImage( img, **variantOpts ), vfile )
+    if self.journal is not None:
+      self.journal.done( self.workItem( date, product ) )                       # Only mark done once all images are written
+
+    initTime, _ = get_init_fcst_times( date[0] if isinstance( date, (list, tuple) ) else date )
+    PRODUCTS_RENDERED.inc( model = self.model, product = product )
+    DATA_AGE.observe( (datetime.utcnow() - initTime).total_seconds(), 
+                      model = self.model, product = product )
+    return img
+
+  def loopPath( self, date, product ):
+    """
+    Generate full path to the animated loop for a given product and cycle
+
+    Arguments:
+      date (DataTime) : Any forecast date in the model cycle
+      product (str) : Name of the product
+
+    Returns:
+      str : Path to the loop file
+
+    """
+
+    if isinstance( date, (list, tuple)): date = date[0]
+    initTime, _ = get_init_fcst_times( date, strfmt = self.TIMEFMT )
+    return os.path.join( self.dirs[product], initTime, f'{self.model}_loop.{self.loop}' )
+
+  def _appendFrame( self, date, product, img ):
+    """
+    Append a rendered image to the animated loop of its product
+
+    Loop frames are streamed to the loop writer in forecast order as they
+    are produced. Frames that were not rendered in this run (i.e., the
+    images already existed), or that were rendered ahead of an earlier
+    frame, are read back from disk when it is their turn, so that the loop
+    is always complete. The loop is finished as soon as its last frame is
+    appended.
+
+    Arguments:
+      date (DataTime) : Date for the forecast
+      product (str) : Name of the product
+      img (ndarray) : RGBA image of the frame
+
+    Returns:
+      None.
+
+    """
+
+    frame = self.filePath( date, product )
+    self._pending.discard( frame )
+    if not self.loop: return
+
+    sfile = self.loopPath( date, product )
+    if sfile not in self._loops:
+      self._loops[sfile] = {
+        'writer' : LoopWriter( sfile, **opts['loop_opts'] ),
+        'frames' : [self.filePath( time, product ) for time in self._loopTimes
+                                                   if self.onCadence( time, product )],
+        'next'   : 0
+      }
+    try:
+      finished = self._advanceLoop( self._loops[sfile], frame, img )
+    except OSError as err:
+      self.log.error( f'Loop writer failed, dropping loop : {sfile}; {err}' )
+      self._loops[sfile]['writer'].abort()
+      finished = True
+    if finished:
+      del self._loops[sfile]
+
+  def _advanceLoop( self, loop, current = None, img = None ):
+    """
+    Append all available frames, in order, to a loop
+
+    Arguments:
+      loop (dict) : Loop writer, with frames and index of next frame
+
+    Keyword arguments:
+      current (str) : Path of the frame just rendered
+      img (ndarray) : RGBA image of the frame just rendered
+
+    Returns:
+      bool : True if the loop was finished
+
+    """
+
+    frames = loop['frames']
+    while loop['next'] < len(frames):
+      frame = frames[ loop['next'] ]
+      if frame in self._pending: break                                          # Frame still to be rendered
+      if frame == current:
+        loop['writer'].append( img )
+      elif os.path.isfile( frame ) and not isPreview( frame ):                  # Previews are left out of loops
+        loop['writer'].append( loadImage( frame ) )
+      loop['next'] += 1
+
+    if loop['next'] == len(frames):
+      loop['writer'].close()
+      return True
+    return False
+
+  def _closeLoops( self, abort = False ):
+    """
+    Finish all open loops, filling in remaining frames from disk
+
+    Keyword arguments:
+      abort (bool) : If set, stop the loops and remove them instead; e.g.,
+        when the run failed
+
+    """
+
+    self._pending = set()                                                       # Anything not rendered by now never will be
+    for sfile, loop in self._loops.items():
+      try:
+        if abort:
+          loop['writer'].abort()
+        else:
+          self._advanceLoop( loop )
+      except OSError as err:
+        self.log.error( f'Loop writer failed, dropping loop : {sfile}; {err}' )
+        loop['writer'].abort()
+    self._loops = {}
+
+  def _publishMetrics( self, queueDepth = None ):
+    """Update queue depth and write metrics textfile, if any"""
+
+    if queueDepth is not None:
+      QUEUE_DEPTH.set( queueDepth, model = self.model )
+    if self.metricsFile:
+      REGISTRY.writeTextfile( self.metricsFile )
+
   def _clearFig( self ):
     """Clear current figure plot"""
 
@@ -145,23 +678,12 @@ class ModelPlotter( object ):
     Keyword arguments:
       outdir (str) : Diretory to seave images to
       dpi (int) : Dots-per-inch for output plots
-      interval (int) : Interval, in seconds, for forecast plot creation.
-                   Default is 6 hourly (21600 s)
       EDEX   : URL for EDEX host to use
   
     """
 
-    self.model = NAM40['model_name']
- 
-    downloader = AWIPSModelDownloader( NAM40['model_name'], **kwargs )
-    times      = downloader.fcst_times()
-    if not kwargs.get('update', False):
-      times      = self.filterTimes( times )
-    
-    for data in downloader.getData( times, NAM40['model_vars'], NAM40['mdl2stnd'] ):
-      self.standardProducts(data, **kwargs )
+    self._modelProducts( NAM40, **kwargs )
 
-  
   def GFS_Products( self, **kwargs ):
     """
     Get data from GFS model to create HDWX products
@@ -172,23 +694,693 @@ class ModelPlotter( object ):
     Keyword arguments:
       outdir (str) : Diretory to seave images to
       dpi (int) : Dots-per-inch for output plots
-      interval (int) : Interval, in seconds, for forecast plot creation.
-                   Default is 6 hourly (21600 s)
       EDEX   : URL for EDEX host to use
   
     """
-    self.model = GFS['model_name']
+
+    self._modelProducts( GFS, **kwargs )
+
+  def gridCache( self ):
+    """Cache of downloaded grids, under the top-level output directory"""
+
+    return GridCache( os.path.join( self._outdir, '.grids' ), **opts['grid_cache'] )
+
+  def _downloader( self, model, products = None, prune = True, **kwargs ):
+    """
+    Set the current model and create a downloader for it
+
+    Arguments:
+      model (dict) : Model definition from awips_models; e.g., NAM40
+
+    Keyword arguments:
+      products (list) : Products the data are downloaded for; if any use
+        accumulated fields, the downloader accumulates forecast hours.
+        Default is the selected products
+      prune (bool) : If set, remove old cycles from the grid cache, along
+        with their run journals
+      Others passed to the downloader
+
+    Returns:
+      AWIPSModelDownloader
+
+    """
+
+    self.model = model['model_name']
+
+    cache      = self.gridCache()
+    if prune:
+      cache.prune( self.model )                                                 # Remove old cycles from grid cache
+      self._pruneJournals( cache.cycles( self.model ) if cache.retain > 0 else None ) # and the run journals of those cycles
  
-    downloader = AWIPSModelDownloader( GFS['model_name'], **kwargs )
-    times      = downloader.fcst_times()
-    if not kwargs.get('update', False):
-      times      = self.filterTimes( times )
+    requestOpts = opts['edex_requests'].copy()
+    for key in ('timeout', 'retries', 'hedge_percentile', 'max_concurrent'):
+      if kwargs.get(key, None) is not None: requestOpts[key] = kwargs[key]
+
+    indexOpts = {'settle' : opts['time_index']['settle_hours'] * 3600.0}        # Cycles with a newer one are complete after settling
+    if model.get('final_hour', None) is not None:
+      indexOpts['final'] = model['final_hour'] * 3600                           # or once their final forecast hour is available
+
+    accumulator = None
+    if any( PRODUCTS[key].accumulated for key in (products or self.products) ):
+      accumulator = Accumulator( model['model_name'], cache = cache )
+
+    downloader = AWIPSModelDownloader( model['model_name'], cache = cache, 
+                                       requestOpts = requestOpts, 
+                                       indexOpts   = indexOpts,
+                                       accumulator = accumulator, **kwargs )
+    if self.profiler is not None:
+      downloader._download = self.profiler.wrap( 
+        downloader._download, 'download', self._profileLabel( 'download' )
+      )
+    return downloader
+
+  def _modelVars( self, model, products, downloader ):
+    """
+    Model variables to download for products
+
+    If the downloader accumulates forecast hours, the variables of all
+    accumulated products are downloaded for every hour, no matter which
+    products are rendered for it. Hours that end a precipitation period are
+    downloaded even when cadence rules create no products for them, see
+    _modelProducts(), so the running totals are complete.
+
+    """
+
+    if downloader.accumulator is not None:
+      products = list(products) + [key for key in PRODUCTS 
+                                     if PRODUCTS[key].accumulated and key not in products]
+    return modelVars( model, products )
+
+  def _profileLabel( self, product ):
+    """
+    Build function that names profile stats files for product
+
+    Stats files are named for the model, cycle, product, and forecast time; 
+    e.g., GFS20/20200101T000000/4-panel_20200101T060000
+
+    """
+
+    def label( data, *args, **kwargs ):
+      if product == 'download':
+        initTime, fcstTime = get_init_fcst_times( data[0], strfmt = self.TIMEFMT )
+      else:
+        initTime = data['initTime'].strftime( self.TIMEFMT )
+        fcstTime = data['fcstTime'].strftime( self.TIMEFMT )
+      return os.path.join( self.model, initTime, f'{product}_{fcstTime}' )
+
+    return label
+
+  def enqueueProducts( self, model, queue, cycle = None, prune = True, **kwargs ):
+    """
+    Add work items for a run of a model to a shared work queue
+
+    Work items are added in priority order and are rendered by any number
+    of workers running processQueue(), on this or other hosts.
+
+    Arguments:
+      model (dict) : Model definition from awips_models; e.g., NAM40
+      queue (WorkQueue) : Queue to add work items to
+
+    Keyword arguments:
+      cycle (datetime) : Initialization time of the run; default is the
+        latest run
+      prune (bool) : If set, remove old cycles from the grid cache, along
+        with their run journals
+      update (bool) : If set, enqueue all products, even if they exist;
+        workers skip those whose inputs are unchanged
+      force (bool) : If set, enqueue all products
+      Others passed to the downloader
+
+    Returns:
+      int : Number of work items added
+
+    """
+
+    downloader = self._downloader( model, prune = prune, **kwargs )
+    times      = [time for time in downloader.fcst_times( cycle = cycle ) if time]
+    update     = kwargs.get('update', False) or kwargs.get('force', False)
+    work       = schedule( self.planWork( times, update = update ), 
+                           self.priority, self.products )
+    items      = []
+    for time, product in work:
+      initTime, _ = get_init_fcst_times( time[0], strfmt = self.TIMEFMT )
+      items.append( (self.model, initTime, time[0].getFcstTime(), product) )
+    StyleRecord( os.path.join( self.outdir, '.styles.json' ) ).update(
+      productStyles( self.products ), replace = False )
+    return queue.enqueue( items )
+
+  def processQueue( self, queue, worker = None, poll = 30.0, wait = False, **kwargs ):
+    """
+    Render work items leased from a shared work queue
+
+    Items are leased one forecast time at a time, so the data for all
+    products of that time are downloaded only once. The lease is renewed
+    while the products are rendered, and each product is acknowledged once
+    its image is written, or confirmed to match its inputs, for every
+    domain by this worker; otherwise it fails, and is retried. Run journals
+    and animated loops are not used by workers, as the work for a cycle is
+    spread over many processes. Workers never prune the grid cache, as
+    other workers may be rendering older cycles; the process that queues
+    the work does.
+
+    Arguments:
+      queue (WorkQueue) : Queue to lease work items from
+
+    Keyword arguments:
+      worker (str) : Unique name of this worker; default is host:pid
+      poll (float) : Seconds to wait before checking for new work items
+      wait (bool) : If set, keep waiting for new work when the queue is
+        empty; otherwise return once no work is queued or leased
+      Others passed to the downloader and standardProducts()
+
+    Returns:
+      int : Number of products rendered
+
+    """
+
+    worker      = worker or f'{socket.gethostname()}:{os.getpid()}'
+    downloaders = {}
+    loop        = self.loop
+    self.loop   = None                                                          # No loops in worker mode
+    kwargs.pop( 'update', None )
+    nDone       = 0
+    while True:
+      items = queue.lease( worker )
+      if len(items) == 0:
+        if not wait and queue.outstanding() == 0: break
+        sleep( poll )
+        continue
+
+      modelName, cycle, fcstTime = items[0][:3]
+      model    = MODELS[modelName]
+      products = [item[3] for item in items]
+      if modelName not in downloaders:
+        downloaders[modelName] = self._downloader( model, products = products, prune = False, **kwargs )
+      self.model = modelName
+
+      downloader = downloaders[modelName]
+      if downloader.accumulator is None and any( PRODUCTS[key].accumulated for key in products ):
+        downloader.accumulator = Accumulator( modelName, cache = downloader.cache ) # Start accumulating once accumulated products are queued
+      self.log.info( f'Worker {worker} rendering {modelName} {cycle} +{fcstTime} s : {products}' )
+      self._settled = set()                                                     # Images written, or unchanged, for these items
+      with queue.heartbeat( worker, items ):
+        try:
+          date  = downloader.findTime( datetime.strptime( cycle, self.TIMEFMT ), fcstTime )
+          self.renderTime( downloader, model, date, products, update = True, **kwargs )
+        except Exception as err:
+          self.log.error( f'Failed to render work items : {err}' )
+          date = None
+
+      settled, self._settled = self._settled, None
+      for item in items:
+        if date is not None and all( path in settled and self._isComplete( date, item[3], path )
+                                     for path in self.domainPaths( date, item[3] ) ):
+          queue.ack( worker, item )
+          nDone += 1
+        else:
+          queue.fail( worker, item )
+      self._publishMetrics( queue.outstanding() )
+
+    self.loop = loop
+    self.log.info( f'Worker {worker} finished; rendered {nDone} products' )
+    if self.profiler is not None: self.profiler.report()
+    self.memory.report()
+    return nDone
+
+  def backfill( self, model, start, end = None, queue = None, **kwargs ):
+    """
+    Create products for every run of a model initialized in a date range
+
+    Runs are found from the cycles available on the EDEX server, and are
+    processed oldest first. Without a queue, each run is downloaded and
+    rendered in this process, the same as the latest run; with a queue,
+    the work items of every run are added for workers running
+    processQueue() to render in parallel. Old cycles are not pruned from
+    the grid cache, so cached forecast hours are read instead of being
+    downloaded again.
+
+    Arguments:
+      model (dict) : Model definition from awips_models; e.g., NAM40
+      start (datetime) : Earliest initialization time to create products for
+
+    Keyword arguments:
+      end (datetime) : Latest initialization time to create products for;
+        default is the latest available run
+      queue (WorkQueue) : If set, add work items to the queue instead of
+        rendering them
+      Others passed to _modelProducts() or enqueueProducts()
+
+    Returns:
+      int : Number of runs processed
+
+    """
+
+    downloader = self._downloader( model, prune = False, **kwargs )
+    cycles     = downloader.cycles( start, end )
+    if len(cycles) == 0:
+      self.log.warning( f'No {self.model} runs available between {start} and {end}' )
+      return 0
+
+    self.log.info( f'Backfilling {len(cycles)} {self.model} runs : {cycles[0]} to {cycles[-1]}' )
+    t0 = monotonic()
+    for i, cycle in enumerate( cycles, 1 ):
+      self.log.info( f'Backfilling {self.model} run {cycle}' )
+      if queue is None:
+        self._modelProducts( model, cycle = cycle, prune = False, **kwargs )
+      else:
+        self.enqueueProducts( model, queue, cycle = cycle, prune = False, **kwargs )
+      BACKFILL_CYCLES.inc( model = self.model )
+      hours = (monotonic() - t0) / 3600.0
+      self.log.info( f'Backfilled {i} of {len(cycles)} {self.model} runs in {hours:0.2f} h; '
+                     f'{i / max(hours, 1.0e-6):0.1f} cycles per hour' )
+      self._publishMetrics()
+    return len(cycles)
+
+  def renderTime( self, downloader, model, date, products, **kwargs ):
+    """
+    Download data for, and create products of, one forecast time
+
+    If the downloader accumulates forecast hours, earlier hours of the cycle
+    that were not accumulated yet, e.g., because other workers have not
+    rendered them, are downloaded, and accumulated, first, so that the
+    accumulated fields of the forecast time are complete; see
+    _withUnaccumulated().
+
+    Arguments:
+      downloader (AWIPSModelDownloader) : Downloader for the model
+      model (dict) : Model definition from awips_models; e.g., NAM40
+      date (list) : Forecast time; see AWIPSModelDownloader.findTime()
+      products (list) : Names of products to create, in order
+
+    Keyword arguments:
+      Passed to standardProducts()
+
+    Returns:
+      None.
+
+    """
+
+    self.model = model['model_name']
+    times      = [date]
+    if downloader.accumulator is not None:
+      initTime, _ = get_init_fcst_times( date[0] )
+      times = self._withUnaccumulated( downloader.accumulator, times, downloader.cycleTimes( initTime ) )
+    stream     = downloader.getData( times, self._modelVars( model, products, downloader ), model['mdl2stnd'],
+                                     progressive = self.progressive )
+    try:
+      for data in stream:
+        if data['time'].getFcstTime() != date[0].getFcstTime(): continue        # Hours only accumulated
+        self._renderHour( data, products, scale = model.get('map_scale', None), **kwargs )
+    finally:
+      stream.close()                                                            # Stop the download if rendering failed
+
+  def restyle( self, model, queue = None, **kwargs ):
+    """
+    Create products again where their style inputs have changed
+
+    The style inputs of each selected product, see Product, are compared
+    with those recorded when its images were drawn for the model. Products
+    whose inputs changed are drawn again, for all domains, for every cycle
+    retained in the grid cache; no other product is drawn, and images
+    already drawn with the current style are skipped, as their stamps
+    match. With a queue, the new style is only recorded if work items were
+    queued; otherwise, the next restyle tries again.
+
+    Arguments:
+      model (dict) : Model definition from awips_models; e.g., NAM40
+
+    Keyword arguments:
+      queue (WorkQueue) : If set, add work items to the queue instead of
+        rendering them
+      Others passed to _modelProducts() or enqueueProducts()
+
+    Returns:
+      list : Names of products affected by style changes
+
+    """
+
+    self.model = model['model_name']
+    record     = StyleRecord( os.path.join( self.outdir, '.styles.json' ) )
+    changed    = record.changed( productStyles( self.products ) )
+    if len(changed) == 0:
+      self.log.info( f'No style changes for {self.model} products' )
+      return []
+    for key, names in changed.items():
+      self.log.info( f'Style of {key} changed : {names}' )
+
+    cache    = self.gridCache()
+    cycles   = cache.cycles( self.model )
+    kwargs   = {**kwargs, 'update' : True}                                      # Stamps of unaffected images still match
+    products = self.products
+    self.products = [key for key in products if key in changed]
+    nQueued  = 0
+    try:
+      for cycle in cycles:
+        self.log.info( f'Restyling {self.model} run {cycle} : {self.products}' )
+        if queue is None:
+          self._modelProducts( model, cycle = cycle, prune = False, **kwargs )
+        else:
+          nQueued += self.enqueueProducts( model, queue, cycle = cycle, prune = False, **kwargs )
+    finally:
+      self.products = products
+    if queue is not None and nQueued == 0 and len(cycles) > 0:
+      self.log.warning( f'No {self.model} work items queued to restyle; style changes not recorded' )
+      return list( changed )
+    record.update( productStyles( changed ) )                                   # Queued items are rendered with the current style, so it is recorded now
+    return list( changed )
+
+  def _modelProducts( self, model, cycle = None, prune = True, **kwargs ):
+    """
+    Download data for, and create products from, a run of a model
+
+    Work is rendered in batches, in priority order; see schedule(). Each
+    forecast time is downloaded, and accumulated, only once; when priority
+    rules split the products of a time into several batches, only the
+    fields its later batches use that are not in the grid cache, i.e., the
+    accumulated fields, are kept in memory, and its grids are read from the
+    cache again for each later batch. Without a cache, all fields the later
+    batches use are kept; see _holdFields(). In preview mode, previews of all products planned
+    for a forecast time are published as soon as its data arrive, before
+    any of its products are rendered in full; see previewProducts(). If the
+    downloader accumulates forecast hours, every available hour is
+    downloaded, and accumulated, in order, even if no products are rendered
+    for it; see _withUnaccumulated().
+
+    Arguments:
+      model (dict) : Model definition from awips_models; e.g., NAM40
+
+    Keyword arguments:
+      cycle (datetime) : Initialization time of the run; default is the
+        latest run
+      prune (bool) : If set, remove old cycles from the grid cache, along
+        with their run journals
+      Others passed to the downloader and standardProducts()
+
+    Returns:
+      None.
+
+    """
+
+    downloader = self._downloader( model, prune = prune, **kwargs )
+    times      = downloader.fcst_times( cycle = cycle )
+    self._loopTimes = [time for time in times if time]                          # All forecast times in the cycle; used to build complete loops
+    self._openJournal( self._loopTimes )                                        # Open journal; replays state from any previous run of the cycle
+
+    update = kwargs.get('update', False) or kwargs.get('force', False)
+    work = self.planWork( self._loopTimes, update = update )
+    work = batches( schedule( work, self.priority, self.products ) )            # Order work by priority, grouped by forecast time
+    self._pending = {path for time, products in work for product in products
+                          for path in self.domainPaths( time, product )}
     
-    for data in downloader.getData( times, GFS['model_vars'], GFS['mdl2stnd'] ):
-      self.standardProducts(data, scale = GFS['map_scale'], **kwargs )
+    modelVariables = self._modelVars( model, self.products, downloader )        # Only download what selected products need
 
-  
-  def standardProducts(self, data, dpi = 120, interval = 21600, scale = None, **kwargs ):
+    completed = False
+    stream    = None
+    try:
+      times   = []                                                              # Forecast times in order of their first batch
+      pending = {}                                                              # Batches of each forecast time still to render, keyed by id of its date
+      for time, products in work:
+        if id( time[0] ) not in pending: times.append( time )
+        pending.setdefault( id( time[0] ), [] ).append( products )
+      if downloader.accumulator is not None:
+        times = self._withUnaccumulated( downloader.accumulator, times, self._loopTimes )
+      order   = {id( time[0] ) : i for i, time in enumerate( times )}
+
+      stream  = downloader.getData( times, modelVariables, model['mdl2stnd'],
+                                    progressive = self.progressive )            # Each forecast time is downloaded, and accumulated, once
+      held    = {}                                                              # Data of forecast times pulled, but not yet rendered, from the download
+      kept    = {}                                                              # Fields kept for later batches of forecast times; see _holdFields()
+      started = set()                                                           # Forecast times whose first batch was reached
+      pulled  = -1                                                              # Order of the last forecast time pulled from the download
+      nQueued = sum( len(products) for _, products in work )
+      for time, products in work:
+        key = id( time[0] )
+        if order[key] > pulled:
+          for data in stream:
+            pulled = order[ id( data['time'] ) ]
+            if id( data['time'] ) in pending:                                   # Hours only accumulated are not held
+              held[ id( data['time'] ) ] = data
+            if pulled >= order[key]: break
+          else:
+            pulled = len(times)                                                 # Download finished
+        first    = key not in started
+        started.add( key )
+        planned  = [product for batch in pending[key] for product in batch]     # Products of this and later batches of the time
+        pending[key].pop(0)
+        nQueued -= len(products)
+        data     = held.pop( key, None )
+        if data is None and key in kept:
+          data = self._restoreFields( downloader, time, kept.pop( key ), modelVariables, model['mdl2stnd'] )
+        if data is None: continue                                               # Forecast time failed to download
+        if self.preview and first:
+          self._previewArrived( data, planned, scale = model.get('map_scale', None) )
+        deferred = [product for batch in pending[key] for product in batch]     # Products of later batches of the time
+        keep     = self._heldFields( downloader, deferred )
+        self._renderHour( data, products, scale = model.get('map_scale', None),
+                          keep = keep, **kwargs )
+        if len(deferred) > 0:
+          kept[key] = self._holdFields( data, keep, coords = downloader.cache is None )
+        data = None
+        self._publishMetrics( nQueued )
+      for _ in stream: pass                                                     # Let the download finish
+      completed = True
+    finally:
+      if stream is not None: stream.close()                                     # Stop the download if rendering failed
+      self._closeLoops( abort = not completed )                                 # Never leave encoders, or partial loops, behind
+      self._closeJournal()
+
+    StyleRecord( os.path.join( self.outdir, '.styles.json' ) ).update(
+      productStyles( self.products ), replace = False )                        # Record style of products not yet recorded; changes are only recorded by restyle()
+    self._publishMetrics( 0 )
+    if self.profiler is not None: self.profiler.report()
+    self.memory.report()
+
+  def _heldFields( self, downloader, products ):
+    """
+    Fields of a forecast time to keep in memory for products of later batches
+
+    Fields in the grid cache are read again when the later batches are
+    rendered, so only the accumulated fields are kept, unless there is no
+    cache.
+
+    Arguments:
+      downloader (AWIPSModelDownloader) : Downloader of the model
+      products (list) : Names of products of the later batches
+
+    Returns:
+      set : Tuples of (name, level) of the fields
+
+    """
+
+    fields = productFields( products )
+    if downloader.cache is None: return fields
+    return {(name, level) for name, level in fields if name in ACCUMULATED}
+
+  def _holdFields( self, data, fields, coords = True ):
+    """
+    Copy of the data of a forecast time with only the given fields
+
+    Arguments:
+      data (AWIPSData) : Data of the forecast time
+      fields (iterable) : Tuples of (name, level) of the fields to keep
+
+    Keyword arguments:
+      coords (bool) : If set, keep the lon and lat values too
+
+    Returns:
+      AWIPSData : Times, and kept fields, of the data
+
+    """
+
+    with data.lock:
+      held = AWIPSData( {key : val for key, val in data.items()
+                           if not isinstance( val, dict ) and (coords or key not in ('lon', 'lat'))} )
+      for name, level in fields:
+        if level in data.get( name, {} ):
+          held.setdefault( name, {} )[level] = data[name][level]
+    return held
+
+  def _restoreFields( self, downloader, time, held, modelVariables, mdl2stnd ):
+    """
+    Data of a forecast time for a later batch; see _holdFields()
+
+    Returns:
+      AWIPSData : Grids read again from the cache, if any, along with the
+        kept fields; None if the grids are not cached
+
+    """
+
+    if downloader.cache is None: return held
+    data = downloader.reload( time, modelVariables, mdl2stnd )
+    if data is None:
+      self.log.error( f'Grids for {held["fcstTime"]} are not in the grid cache; skipping its later batches' )
+      return None
+    data.update( {key : val for key, val in held.items() if isinstance( val, dict )} )
+    return data
+
+  def _withUnaccumulated( self, accumulator, times, available ):
+    """
+    Add the forecast times the accumulator has not seen to the times to download
+
+    The accumulator must see every period end to compute precipitation
+    totals, and every forecast time to find the extremes of temperature,
+    but cadence rules may create no products for some of them, and hours
+    may be rendered out of order. Available forecast times before the last
+    forecast time to download, that were not accumulated yet, are added;
+    each is placed before the first later forecast time, so it is
+    accumulated before the hours that follow it.
+
+    Arguments:
+      accumulator (Accumulator) : Accumulator of the downloader
+      times (list) : Forecast times to download, in download order
+      available (list) : All forecast times of the cycle; see fcst_times()
+
+    Returns:
+      list : Forecast times to download, in download order
+
+    """
+
+    if len(times) == 0: return times
+    initTime, _ = get_init_fcst_times( times[0][0] )
+    last   = max( time[0].getFcstTime() for time in times )
+    byFcst = {time[0].getFcstTime() : time for time in available if time}
+    listed = {time[0].getFcstTime() for time in times}
+    unseen = accumulator.unseen( initTime, [fcst for fcst in byFcst if fcst < last and fcst not in listed] )
+
+    times = list( times )
+    for fcst in sorted( unseen, reverse = True ):                               # Latest first, so earlier hours go before later ones
+      index = next( i for i, time in enumerate( times ) if time[0].getFcstTime() > fcst )
+      times.insert( index, byFcst[fcst] )
+      self.log.debug( f'Downloading forecast hour {fcst//3600} to accumulate it' )
+    return times
+
+  def _previewArrived( self, data, products, scale = None ):
+    """
+    Preview the products of a forecast time once all of its data arrived
+
+    Products whose fields failed to download are not previewed.
+
+    Arguments:
+      data (AWIPSData) : Data for the forecast hour; possibly still being
+        published
+      products (list) : Names of products to preview
+
+    Keyword arguments:
+      scale (float) : Scaling for maps; meters in projection per cm on page
+
+    """
+
+    version = 0
+    while not data.complete:
+      version, _ = data.waitUpdate( version )
+    if 'lon' not in data: return
+    products = [key for key in products if data.hasFields( PRODUCTS[key].uses )]
+    if len(products) > 0:
+      self.previewProducts( data, products, scale = scale )
+
+  def previewProducts( self, data, products, scale = None ):
+    """
+    Publish previews of the missing images of products for a forecast hour
+
+    Previews are drawn at the resolution, on the decimated grid, and with
+    the render profile, of the 'preview' entry of plot_opts.json; the
+    render profile simplifies the basemap. They are written to the paths of
+    the full images, and their variants, marked as previews, so they can be
+    browsed right away; the full renders replace them, atomically, and
+    previews are never taken for complete products, or loop frames.
+    Existing images, full or preview, are left alone. Multi-panel products
+    are drawn directly, even in composite mode.
+
+    Arguments:
+      data (AWIPSData) : Data for the forecast hour
+      products (list) : Names of products to preview
+
+    Keyword arguments:
+      scale (float) : Scaling for maps; meters in projection per cm on page
+
+    Returns:
+      int : Number of previews published
+
+    """
+
+    previewOpts = opts['preview']
+    profile     = getRenderProfile()
+    setRenderProfile( previewOpts['render_profile'] )
+    try:
+      nPreviews = self._previewProducts( data, products, dpi = previewOpts['dpi'],
+                                         step = previewOpts['decimate'], scale = scale )
+    finally:
+      setRenderProfile( profile )
+    self._checkMemory( data )
+    return nPreviews
+
+  def _previewProducts( self, data, products, dpi = None, step = 1, scale = None ):
+    """Draw and write previews under the active render profile; see previewProducts()"""
+
+    text      = {PREVIEW_KEY : True}
+    nPreviews = 0
+    for domain in self._eachDomain():
+      view = decimate( domain.view( data ), step )
+      for key in products:
+        sfile = self.filePath( data['time'], key )
+        if os.path.isfile( sfile ): continue
+        self.log.info( 'Previewing {} image for: {}'.format(key, data['fcstTime']) )
+        self._drawProduct( key, view, scale = scale )
+        img = renderFigure( self.fig, dpi = dpi )
+        self._nRenders += 1
+        saveImage( img, sfile, text = text )
+        for variant, variantOpts in self.variants.items():
+          vfile = self.filePath( data['time'], key, variant = variant )
+          if not os.path.isfile( vfile ):
+            saveImage( resizeImage( img, **variantOpts ), vfile, text = text )
+        nPreviews += 1
+    return nPreviews
+
+  def _renderHour( self, data, products, **kwargs ):
+    """
+    Create products for a forecast hour, as its fields arrive
+
+    If the data are published progressively, every product whose fields
+    are all present is drawn from a snapshot of the data, while the rest
+    are still downloading; remaining products are drawn once the data are
+    complete. Once products are drawn from a snapshot, the fields that no
+    remaining product uses, and that the downloader no longer needs, are
+    released from the data too, so they are not held until the data are
+    complete. If the download failed, products missing fields are skipped.
+
+    Arguments:
+      data (AWIPSData) : Data for the forecast hour
+      products (list) : Names of products to create, in order
+
+    Keyword arguments:
+      Passed to standardProducts()
+
+    Returns:
+      None.
+
+    """
+
+    remaining = list( products )
+    version   = 0
+    while not data.complete:
+      version, complete = data.waitUpdate( version )
+      if complete or 'lon' not in data: continue
+      ready = [key for key in remaining if data.hasFields( PRODUCTS[key].uses )]
+      if len(ready) == 0: continue
+      self.log.debug( f'Fields ready for : {ready}' )
+      self.standardProducts( data.snapshot(), products = ready, **kwargs )
+      remaining = [key for key in remaining if key not in ready]
+      self._releaseDone( data, remaining, kwargs.get('keep', ()) )
+
+    if data.error is not None:
+      skipped   = [key for key in remaining if not data.hasFields( PRODUCTS[key].uses )]
+      remaining = [key for key in remaining if key not in skipped]
+      if len(skipped) > 0:
+        self.log.error( f'Download failed; skipping {skipped} for {data["fcstTime"]}' )
+    if len(remaining) > 0 and 'lon' in data:
+      self.standardProducts( data, products = remaining, **kwargs )
+
+  def standardProducts(self, data, products = None, dpi = 120, scale = None, keep = (), **kwargs ):
     """
     Generate 'standard' model products for the HDWX page
   
@@ -196,148 +1388,218 @@ class ModelPlotter( object ):
       data (AWIPSData) : Data downlaoded from EDEX server for plotting
   
     Keyword arguments:
+      products (list) : Names of products to create, in order. Default is
+        all products in the standard order
       dpi (int) : Dots per inch of the output images
-      interval (int) : Interval, in seconds, for forecast plot creation.
-        Default is 6 hourly (21600 s)
       scale (float) : Scaling for maps; meters in projection per cm on page
+      keep (iterable) : Tuples of (name, level) of fields never to release;
+        e.g., those used by products still to be drawn from the data
   
     Returns:
       None.
   
     """
   
-    data['lon'], data['lat'] = xy_transform(
-       self.mapProj, self.transform, data['lon'], data['lat']
-    )                                                                        # Transform the data; saves some time
-
-    self.plot_4Panel(  data, **kwargs )
-    self.plot_MSLP(    data, **kwargs )
-    self.plot_precip(  data, **kwargs )
-    self.plot_surface( data, **kwargs )
-    self.plot_1000hPa( data, **kwargs )
-    self.plot_850hPa(  data, **kwargs )
-    self.plot_500hPa(  data, **kwargs )
-    self.plot_250hPa(  data, **kwargs )
-
-  def plot_4Panel( self, data, update=False, **kwargs ): 
-    """Create 4-panel forecast product"""
-
-    key   = '4-panel'
-    sfile = self.checkFile( data['time'], key, update=update)
-    if sfile:
-      self._clearFig()
-      self.log.info( 'Creating {} image for: {}'.format(key, data['fcstTime']) )
-      os.makedirs( os.path.dirname( sfile ), exist_ok=True )
-      ax = [ self.fig.add_subplot(221, projection = self.mapProj, label = uuid.uuid4()),
-             self.fig.add_subplot(222, projection = self.mapProj, label = uuid.uuid4()),
-             self.fig.add_subplot(223, projection = self.mapProj, label = uuid.uuid4()),
-             self.fig.add_subplot(224, projection = self.mapProj, label = uuid.uuid4())]
-  
-      extent, scale = getMapExtentScale( ax[0], data['lon'], data['lat'], **kwargs )
-      plot_500hPa_vort_hght_barbs(    ax[0], data, extent=extent, scale=scale )
-      plot_250hPa_isotach_hght_barbs( ax[1], data, extent=extent, scale=scale )
-      plot_850hPa_temp_hght_barbs(    ax[2], data, extent=extent, scale=scale )
-      plot_rh_mslp_thick(             ax[3], data, extent=extent, scale=scale )
-  
-      self.fig.savefig( sfile, dpi = kwargs.get('dpi', None) )
+    products = products or self.products
+    if self.composite:
+      products = sorted( products, key = lambda key: PRODUCTS[key].composite is not None ) # Composites after their panels
 
-  def plot_MSLP(self, data, update=False, **kwargs): 
-    """Create plot with mean sea-level pressure"""
+    fields = [(name, level) for name, levels in data.items() if isinstance( levels, dict )
+                            for level in levels if (name, level) not in keep]
+    plan   = releasePlan( products, fields )                                    # Fields to release once their last product is drawn
+    inputs = InputStamps( data )                                                # Field digests are shared by all domains
 
-    key   = 'mslp'
-    sfile = self.checkFile( data['time'], key, update=update)
-    if sfile:
-      self._clearFig()
-      self.log.info( 'Creating {} image for: {}'.format(key, data['fcstTime']) )
-      ax = self.fig.add_subplot(111, projection = self.mapProj, label = uuid.uuid4())
-      extent, scale = getMapExtentScale( ax, data['lon'], data['lat'], **kwargs )
-  
-      plot_rh_mslp_thick( ax, data, extent = extent )
-      self.fig.savefig( sfile, dpi = kwargs.get('dpi', None) )
+    for domain in self._eachDomain():
+      view = domain.view( data )                                                # Projected, subset data for domain; shares fields with data
+      view[INPUTS_KEY] = inputs
+      last = domain is self.domains[-1]                                         # Fields are only released while drawing the last domain
+      if last: self._releaseFields( plan[0], data, view )
 
-  def plot_precip(self, data, update=False, **kwargs):
-    """Create precipitation forecast product"""
+      self._buffers = {}
+      for i, product in enumerate( products ):
+        start  = monotonic()
+        nSaved = self._nSaved
+        self._plotters[product]( view, dpi = dpi, scale = scale, **kwargs )
+        if self._nSaved > nSaved:                                               # Only time products that were rendered, not skipped
+          RENDER_SECONDS.observe( monotonic() - start, model = self.model, product = product )
+        if last: self._releaseFields( plan[i+1], data, view )
+      self._buffers = {}
 
-    key   = 'precip'
-    sfile = self.checkFile( data['time'], key, update=update)
-    if sfile:
-      self._clearFig()
-      self.log.info( 'Creating {} image for: {}'.format(key, data['fcstTime']) )
-      ax = self.fig.add_subplot(111, projection = self.mapProj, label = uuid.uuid4())
-      extent, scale = getMapExtentScale( ax, data['lon'], data['lat'], **kwargs )
-  
-      plot_precip_mslp_temps( ax, data, extent = extent )
-      self.fig.savefig( sfile, dpi = kwargs.get('dpi', None) )
+      contours = view.pop( CONTOUR_CACHE, None )                                # Contour lines are only reused within a forecast hour and domain
+      if contours is not None:
+        self.log.debug( f'Contour cache {domain.name} : {contours.hits} hits, {contours.misses} traced, '
+                        f'{contours.labelHits} label placements reused' )
 
-  def plot_surface(self, data, update=False, **kwargs):
-    """Create surface forecast product"""
+    self._checkMemory( data )
 
-    key   = 'surface'
-    sfile = self.checkFile( data['time'], key, update=update)
-    if sfile:
-      self._clearFig()
-      self.log.info( 'Creating {} image for: {}'.format(key, data['fcstTime']) )
-      ax = self.fig.add_subplot(111, projection = self.mapProj, label = uuid.uuid4())
-      extent, scale = getMapExtentScale( ax, data['lon'], data['lat'], **kwargs )
-  
-      plot_srfc_temp_barbs( ax, data, extent = extent )
-      self.fig.savefig( sfile, dpi = kwargs.get('dpi', None) )
+  def _releaseDone( self, data, products, keep = () ):
+    """
+    Release fields of data still downloading that no remaining product uses
 
-  def plot_1000hPa(self, data, update=False, **kwargs):
-    """Create 1000hPa forecast product"""
+    Arguments:
+      data (AWIPSData) : Data published progressively
+      products (list) : Names of products still to be drawn from the data
 
-    key   = '1000-hPa'
-    sfile = self.checkFile( data['time'], key, update=update)
-    if sfile:
-      self._clearFig()
-      self.log.info( 'Creating {} image for: {}'.format(key, data['fcstTime']) )
-      ax = self.fig.add_subplot(111, projection = self.mapProj, label = uuid.uuid4())
-      extent, scale = getMapExtentScale( ax, data['lon'], data['lat'], **kwargs )
-  
-      plot_1000hPa_theta_e_barbs( ax, data, extent = extent )
-      self.fig.savefig( sfile, dpi = kwargs.get('dpi', None) )
+    Keyword arguments:
+      keep (iterable) : Tuples of (name, level) of fields never to release
 
-  def plot_850hPa( self, data, update=False, **kwargs):
-    """Create 850hPa forecast product"""
+    """
 
-    key   = '850-hPa'
-    sfile = self.checkFile( data['time'], key, update=update)
-    if sfile:
-      self._clearFig()
+    used = productFields( products ) | set( keep )
+    with data.lock:
+      used  |= data.pinned
+      fields = [(name, level) for name, levels in data.items() if isinstance( levels, dict )
+                              for level in levels if (name, level) not in used]
+      self._releaseFields( fields, data )
 
-      self.log.info( 'Creating {} image for: {}'.format(key, data['fcstTime']) )
-      ax = self.fig.add_subplot(111, projection = self.mapProj, label = uuid.uuid4())
-      extent, scale = getMapExtentScale( ax, data['lon'], data['lat'], **kwargs )
-  
-      plot_850hPa_temp_hght_barbs( ax, data, extent = extent )
-      self.fig.savefig( sfile, dpi = kwargs.get('dpi', None) )
- 
+  def _releaseFields( self, fields, *datasets ):
+    """
+    Release fields of a forecast hour that no remaining product uses
+
+    Arguments:
+      fields (list) : Tuples of (name, level) of fields to release
+      *datasets (AWIPSData) : Data, and views of the data, to remove the
+        fields from
 
-  def plot_500hPa(self, data, update=False, **kwargs):
-    """Create 500hPa forecast product"""
+    """
 
-    key   = '500-hPa'
-    sfile = self.checkFile( data['time'], key, update=update)
-    if sfile:
-      self._clearFig()
-      self.log.info( 'Creating {} image for: {}'.format(key, data['fcstTime']) )
-      ax = self.fig.add_subplot(111, projection = self.mapProj, label = uuid.uuid4())
-      extent, scale = getMapExtentScale( ax, data['lon'], data['lat'], **kwargs )
-  
-      plot_500hPa_vort_hght_barbs( ax, data, extent = extent )
-      self.fig.savefig( sfile, dpi = kwargs.get('dpi', None) )
-  
+    if len(fields) == 0: return
+    nbytes = 0
+    for data in datasets:
+      for name, level in fields:
+        var = data.get( name, {} ).pop( level, None )
+        if var is not None and data is datasets[0]:
+          nbytes += getattr( getattr( var, 'magnitude', var ), 'nbytes', 0 )
+    self.log.debug( f'Released {len(fields)} fields; {nbytes / 2**20:0.1f} MiB' )
+
+  def inputStamp( self, key, data, dpi = None, scale = None, **kwargs ):
+    """
+    Stamp of the inputs of a product in the current domain
+
+    Arguments:
+      key (str) : Name of the product
+      data (AWIPSData) : Data for the current domain; see Domain.view()
+
+    Keyword arguments:
+      dpi (int) : Dots-per-inch of the image
+      scale (float) : Scaling for maps
+      Others ignored
+
+    Returns:
+      str : Stamp; None if the data have no InputStamps
+
+    """
+
+    inputs = data.get( INPUTS_KEY, None )
+    if inputs is None: return None
+    domain  = data['domain'].domain
+    profile = getRenderProfile()
+    return inputs.stamp( key, PRODUCTS[key].uses,
+      domain    = [domain.name, domain.projection.proj4_init, domain.extent, domain.scale],
+      style     = styleDigests( PRODUCTS[key].style ),
+      profile   = [profile, RENDER_PROFILES[profile]],
+      composite = bool( self.composite and PRODUCTS[key].composite ),
+      dpi       = dpi,
+      scale     = scale )
+
+  def plotProduct( self, key, data, update=False, force=False, **kwargs ):
+    """
+    Create a product, as declared in the product registry
+
+    Arguments:
+      key (str) : Name of the product
+      data (AWIPSData) : Data for the current domain; see Domain.view()
+
+    Keyword arguments:
+      update (bool) : If set, create product even if it exists, unless its
+        inputs are unchanged
+      force (bool) : If set, create product even if its inputs are unchanged
+      Others passed to getMapExtentScale()
+
+    Returns:
+      None.
+
+    """
 
-  def plot_250hPa( self, data, update=False, **kwargs):
-    """Create 250hPa forecast product"""
+    product = PRODUCTS[key]
+    if self.composite and product.composite:
+      return self.plotComposite( key, data, update = update, force = force, **kwargs )
 
-    key   = '250-hPa'
-    sfile = self.checkFile( data['time'], key, update=update)
+    stamp   = self.inputStamp( key, data, **kwargs )
+    sfile   = self.checkFile( data['time'], key, update=update, stamp=stamp, force=force )
     if sfile:
-      self._clearFig()
       self.log.info( 'Creating {} image for: {}'.format(key, data['fcstTime']) )
-      ax = self.fig.add_subplot(111, projection = self.mapProj, label = uuid.uuid4())
-      extent, scale = getMapExtentScale( ax, data['lon'], data['lat'], **kwargs )
-  
-      plot_250hPa_isotach_hght_barbs( ax, data, extent = extent )
-      self.fig.savefig( sfile, dpi = kwargs.get('dpi', None) )
+      self._drawProduct( key, data, **kwargs )
+      self._saveFig( sfile, data['time'], key, dpi = kwargs.get('dpi', None), stamp = stamp )
+
+  def _drawProduct( self, key, data, **kwargs ):
+    """
+    Draw the panels of a product on the cleared figure
+
+    Arguments:
+      key (str) : Name of the product
+      data (AWIPSData) : Data for the current domain; see Domain.view()
+
+    Keyword arguments:
+      Passed to getMapExtentScale()
+
+    """
+
+    product = PRODUCTS[key]
+    grid    = data['domain']
+    self._clearFig()
+    ax = [ self.fig.add_subplot(subplot, projection = grid.domain.projection, label = uuid.uuid4())
+             for subplot, _ in product.panels ]
+
+    extent, scale = grid.extentScale( ax[0], **kwargs )
+    panelOpts     = {'extent' : extent}
+    if product.panelScale: panelOpts['scale'] = scale
+    for axes, (_, func) in zip( ax, product.panels ):
+      func( axes, data, **panelOpts )
+
+  def plotComposite( self, key, data, update=False, force=False, **kwargs ):
+    """
+    Create a multi-panel product from the images of its single-panel products
+
+    Each panel is drawn only once, as its own single-panel product, and the
+    images are downsampled and tiled into the multi-panel image; the labels
+    and colorbars of each panel come with its image. Panel images rendered
+    for the current forecast hour are used directly, existing images are
+    read from disk, and any others are rendered first.
+
+    Arguments:
+      key (str) : Name of the product
+      data (AWIPSData) : Data downlaoded from EDEX server for plotting
+
+    Keyword arguments:
+      update (bool) : If set, create product even if it exists, unless its
+        inputs are unchanged
+      force (bool) : If set, create product even if its inputs are unchanged
+      Others passed to the single-panel products
+
+    Returns:
+      None.
+
+    """
+
+    product = PRODUCTS[key]
+    stamp   = self.inputStamp( key, data, **kwargs )
+    sfile   = self.checkFile( data['time'], key, update=update, stamp=stamp, force=force )
+    if not sfile: return
+
+    self.log.info( 'Compositing {} image for: {}'.format(key, data['fcstTime']) )
+    images = []
+    for panel in product.composite:
+      if panel not in self._buffers:
+        self._plotters[panel]( data, update = False, **kwargs )                 # Render the panel, unless it already exists
+      img = self._buffers.get( panel, None )
+      if img is None:
+        path = self.filePath( data['time'], panel )
+        if not os.path.isfile( path ):
+          self.log.error( f'No {panel} image for {key} composite; skipping' )
+          return
+        img = loadImage( path )
+      images.append( img )
+
+    ncols = product.panels[0][0] // 10 % 10                                     # Columns from subplot specification; e.g., 221
+    self._saveImage( tileImages( images, ncols ), sfile, data['time'], key, stamp = stamp )
@@ -0,0 +1,134 @@
+import logging
+import os, shutil, subprocess
+
+from .image_utils import resizeImage
+
+FORMATS = {
+  'mp4'  : ['-f', 'mp4',  '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+            '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-movflags', '+faststart'],
+  'gif'  : ['-f', 'gif',  '-loop', '0'],
+  'webp' : ['-f', 'webp', '-c:v', 'libwebp', '-loop', '0', '-quality', '80']
+}
+
+def checkFormat( fmt, ffmpeg = None ):
+  """
+  Check that loops of a format can be written
+
+  Arguments:
+    fmt (str) : Format of the loop; one of mp4, gif, or webp
+
+  Keyword arguments:
+    ffmpeg (str) : Path to the ffmpeg executable; if None, then ffmpeg is
+      searched for on the PATH
+
+  Returns:
+    str : Path to the ffmpeg executable
+
+  """
+
+  if fmt not in FORMATS:
+    raise Exception( f'Unsupported loop format: {fmt}' )
+  ffmpeg = ffmpeg or shutil.which( 'ffmpeg' )
+  if ffmpeg is None:
+    raise Exception( 'Could not find ffmpeg executable for loop writing' )
+  return ffmpeg
+
+class LoopWriter( object ):
+  """
+  Incrementally encode frames into an animated loop
+
+  Raw RGBA frames are piped to an ffmpeg process as they are produced, so
+  that only the frame currently being written is held in memory. The loop
+  is written to a temporary file and moved into place when the writer is
+  closed, so a partial loop is never published.
+
+  """
+
+  def __init__(self, sfile, fps = 2, ffmpeg = None):
+    """
+    Arguments:
+      sfile (str) : Full path of the loop file; the extension determines the
+        format, which must be one of mp4, gif, or webp
+
+    Keyword arguments:
+      fps (float) : Frames per second of the loop
+      ffmpeg (str) : Path to the ffmpeg executable; if None, then ffmpeg is
+        searched for on the PATH
+
+    """
+
+    self.log    = logging.getLogger(__name__)
+    self.sfile  = sfile
+    self.fps    = fps
+    self.fmt    = os.path.splitext( sfile )[1].lstrip('.').lower()
+    self.ffmpeg = checkFormat( self.fmt, ffmpeg )
+
+    self.nFrames = 0
+    self._size   = None
+    self._proc   = None
+    self._tmp    = f'{sfile}.part'
+
+  def _start( self, img ):
+    """Start the ffmpeg process using size of first frame"""
+
+    h, w = img.shape[:2]
+    self._size = (w, h)
+    cmd = [self.ffmpeg, '-y', '-loglevel', 'error',
+           '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{w}x{h}',
+           '-r', str(self.fps), '-i', '-'] + FORMATS[self.fmt] + [self._tmp]
+
+    os.makedirs( os.path.dirname( self.sfile ), exist_ok=True )
+    self.log.debug( f'Starting loop writer : {self.sfile}' )
+    self._proc = subprocess.Popen( cmd, stdin = subprocess.PIPE )
+
+  def append( self, img ):
+    """
+    Append a frame to the loop
+
+    Arguments:
+      img (ndarray) : RGBA image; if the size differs from the first frame,
+        then the image is resized to match
+
+    Returns:
+      None.
+
+    Raises:
+      OSError : If ffmpeg is no longer reading frames, e.g., it died; the
+        loop should then be aborted
+
+    """
+
+    if self._proc is None:
+      self._start( img )
+    elif img.shape[1::-1] != self._size:
+      img = resizeImage( img, width = self._size[0], height = self._size[1] )
+
+    self._proc.stdin.write( img.tobytes() )
+    self.nFrames += 1
+
+  def close( self ):
+    """Finish encoding and move the loop into place"""
+
+    if self._proc is None: return
+    try:
+      self._proc.stdin.close()
+    except OSError as err:
+      self.log.error( f'Failed to finish loop : {self.sfile}; {err}' )
+    status     = self._proc.wait()
+    self._proc = None
+    if status == 0:
+      os.replace( self._tmp, self.sfile )
+      self.log.info( f'Finished loop with {self.nFrames} frames : {self.sfile}' )
+    else:
+      self.log.error( f'ffmpeg failed writing loop : {self.sfile}' )
+      if os.path.isfile( self._tmp ): os.remove( self._tmp )
+
+  def abort( self ):
+    """Stop encoding and remove the partial loop; the loop is not published"""
+
+    if self._proc is not None:
+      self._proc.kill()
+      self._proc.wait()
+      self._proc = None
+    if os.path.isfile( self._tmp ): os.remove( self._tmp )
+    self.log.warning( f'Aborted loop : {self.sfile}' )
@@ -0,0 +1,203 @@
+import logging
+
+import numpy as np
+import contourpy
+from matplotlib.contour import ContourSet
+from matplotlib.path import Path
+
+from .render_profile import clabelOpts, labelEvery, labelCache, getProfile
+
+CACHE_KEY = 'contour cache'                                                     # Key of the cache in the data dictionary
+
+class ContourCache( object ):
+  """
+  Cache of contour line geometry for one forecast hour
+
+  Contour lines are traced once, with contourpy, for each field and set of
+  levels, and every axis that draws the same field and levels builds its
+  artists from the cached lines. The cache is stored in the data of the
+  forecast hour, so it is dropped along with the data.
+
+  If the render profile enables the label cache, the placement of contour
+  labels, and the lines broken around them, are also kept, keyed by the
+  size and view limits of the axis, so that identical panels only place
+  their labels once.
+
+  """
+
+  def __init__(self):
+    self.log        = logging.getLogger(__name__)
+    self._lines     = {}
+    self._labels    = {}
+    self.hits       = 0
+    self.misses     = 0
+    self.labelHits  = 0
+
+  def lines( self, key, x, y, z, levels ):
+    """
+    Get contour lines of a field; traced on first use
+
+    Arguments:
+      key (hashable) : Identifies the field; e.g., variable name, level
+        and unit
+      x (ndarray) : x-values of the grid
+      y (ndarray) : y-values of the grid
+      z (ndarray) : Values of the field
+      levels (iterable) : Values to contour
+
+    Returns:
+      tuple : List of segments, and list of path codes, for each level; in
+        the form expected by matplotlib ContourSet
+
+    """
+
+    levels = tuple( float(level) for level in np.atleast_1d( levels ) )
+    key    = (key, levels)
+    entry  = self._lines.get( key, None )
+    if entry is not None and entry[0] is x:                                     # Same field, levels, and grid
+      self.hits += 1
+      return entry[1]
+
+    self.misses += 1
+    gen      = contourpy.contour_generator( x, y, np.ma.masked_invalid( z ),
+                                            line_type = contourpy.LineType.SeparateCode )
+    allsegs  = []
+    allkinds = []
+    for level in levels:
+      segs, kinds = gen.lines( level )
+      allsegs.append( segs )
+      allkinds.append( kinds )
+    self._lines[key] = (x, (allsegs, allkinds))
+    return allsegs, allkinds
+
+  def getLabels( self, key, x ):
+    """
+    Get cached label placement
+
+    Arguments:
+      key (hashable) : Identifies the field, levels, and axis
+      x (ndarray) : x-values of the grid
+
+    Returns:
+      tuple : List of (vertices, codes) of the labeled line for each level,
+        and list of (x, y, rotation, value) of each label; None if not
+        cached
+
+    """
+
+    entry = self._labels.get( key, None )
+    if entry is None or entry[0] is not x: return None
+    self.labelHits += 1
+    return entry[1]
+
+  def putLabels( self, key, x, cs ):
+    """
+    Cache the label placement of labeled contour lines
+
+    Arguments:
+      key (hashable) : Identifies the field, levels, and axis
+      x (ndarray) : x-values of the grid
+      cs (ContourSet) : Contour lines labeled with clabel()
+
+    """
+
+    paths  = [(path.vertices, _codes( path )) for path in cs.get_paths()]
+    labels = [(xy[0], xy[1], text.get_rotation(), cvalue)
+                for xy, text, cvalue in zip( cs.labelXYs, cs.labelTexts, cs.labelCValues )]
+    self._labels[key] = (x, (paths, labels))
+
+def _codes( path ):
+  """Path codes; filled in when matplotlib leaves them implicit"""
+
+  if path.codes is not None or len(path.vertices) == 0: return path.codes
+  codes    = np.full( len(path.vertices), Path.LINETO, dtype = Path.code_type )
+  codes[0] = Path.MOVETO
+  return codes
+
+def _noLines( ax, data, z, levels, **kwargs ):
+  """
+  Contour set of a field that no level crosses
+
+  ContourSet cannot be built from empty segments, so the contours are left
+  to ax.contour(), which only warns that no contours were found, and the
+  lines are not labeled.
+
+  """
+
+  return ax.contour( data['xx'], data['yy'], z, levels = levels, **kwargs )
+
+def _labelKey( ax, key, levels ):
+  """Key of label placement; labels are only reused on identical axes"""
+
+  return (key, tuple( float(level) for level in levels ), getProfile(),
+          tuple( ax.bbox.bounds ), tuple( ax.viewLim.bounds ))
+
+def getCache( data ):
+  """Get the contour cache of a forecast hour, creating it if needed"""
+
+  if CACHE_KEY not in data:
+    data[CACHE_KEY] = ContourCache()
+  return data[CACHE_KEY]
+
+def cachedContour( ax, data, key, z, levels, labels = False, **kwargs ):
+  """
+  Draw contour lines, using cached geometry if available
+
+  A drop-in replacement for ax.contour( data['xx'], data['yy'], z, ... )
+  where the lines of the same field and levels may already have been traced
+  for another axis.
+
+  Arguments:
+    ax (GeoAxes) : Axis to draw the contours on
+    data (AWIPSData) : Dictionary containing data to plot; must contain the
+      transformed xx and yy values
+    key (hashable) : Identifies the field; e.g., variable name, level and
+      unit
+    z (ndarray) : Values of the field
+    levels (iterable) : Values to contour; use [0] rather than 0 for the
+      zero line. If None, levels are chosen by matplotlib and nothing
+      is cached
+
+  Keyword arguments:
+    labels (bool) : If set, label the contours, with the clabel options
+      of the active render profile
+    **kwargs : Passed to ContourSet; colors, linewidths, etc.
+
+  Returns:
+    ContourSet : The contour lines; if no level crosses the field, the
+      empty contour set of ax.contour(), without labels
+
+  """
+
+  if levels is None:
+    cs = ax.contour( data['xx'], data['yy'], z, **kwargs )                      # Automatic levels depend on the axis; cannot cache
+    if labels:
+      ax.clabel( cs, cs.levels[::labelEvery()], **clabelOpts() )
+    return cs
+
+  levels = np.atleast_1d( levels )
+  cache  = getCache( data )
+  lkey   = _labelKey( ax, key, levels ) if labels and labelCache() else None
+  placed = None if lkey is None else cache.getLabels( lkey, data['xx'] )
+  if placed is not None and all( len(verts) == 0 for verts, _ in placed[0] ):
+    return _noLines( ax, data, z, levels, **kwargs )
+  if placed is not None:                                                        # Lines already broken around labels placed on an identical axis
+    paths, placed = placed
+    cs = ContourSet( ax, levels,
+                     [[verts] if len(verts) > 0 else [] for verts, _ in paths],
+                     [[codes] if len(verts) > 0 else [] for verts, codes in paths],
+                     **kwargs )
+    cs.clabel( [], **clabelOpts() )                                             # Set label format without placing any labels
+    for x, y, rotation, value in placed:
+      cs.add_label( x, y, rotation, value, value )
+    return cs
+
+  allsegs, kinds = cache.lines( key, data['xx'], data['yy'], z, levels )
+  if all( len(segs) == 0 for segs in allsegs ):
+    return _noLines( ax, data, z, levels, **kwargs )
+  cs = ContourSet( ax, levels, allsegs, kinds, **kwargs )
+  if labels:
+    ax.clabel( cs, levels[::labelEvery()], **clabelOpts() )
+    if lkey is not None:
+      cache.putLabels( lkey, data['xx'], cs )
+  return cs
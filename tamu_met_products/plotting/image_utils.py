@@ -0,0 +1,189 @@
+import logging
+import os
+import numpy as np
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+################################################################################
+def renderFigure( fig, dpi = None ):
+  """
+  Rasterize a figure into an RGBA buffer
+
+  The figure is drawn once by the Agg canvas and the pixel buffer is copied
+  out so that it can be written to disk and resampled into other image sizes
+  without having to redraw any of the contours, barbs, or basemaps.
+
+  Arguments:
+    fig (Figure) : Matplotlib figure to rasterize
+
+  Keyword arguments:
+    dpi (int) : Dots-per-inch to rasterize the figure at. If None, the
+      dpi of the figure is used
+
+  Returns:
+    ndarray : RGBA image with shape (height, width, 4)
+
+  """
+
+  log    = logging.getLogger(__name__)
+  oldDPI = fig.get_dpi()
+  if dpi is not None:
+    fig.set_dpi( dpi )                                                          # Temporarily change figure dpi; same as savefig does
+  try:
+    log.debug( f'Rasterizing figure at {fig.get_dpi()} dpi' )
+    fig.canvas.draw()                                                           # Draw the figure ONCE
+    img = np.array( fig.canvas.buffer_rgba() )                                  # Copy the buffer, it is reused by the canvas on next draw
+  finally:
+    fig.set_dpi( oldDPI )                                                       # Reset dpi of the figure
+  return img
+
+################################################################################
+def resizeImage( img, scale = None, width = None, height = None ):
+  """
+  Resample an RGBA buffer to a smaller size
+
+  The scale keyword takes precedence over width and height. If only one of
+  width or height is set, the aspect ratio of the image is preserved.
+
+  Arguments:
+    img (ndarray) : RGBA image to resize
+
+  Keyword arguments:
+    scale (float) : Scaling factor for the image; 0.5 is half size
+    width (int) : Width, in pixels, of the output image
+    height (int) : Height, in pixels, of the output image
+
+  Returns:
+    ndarray : Resized RGBA image
+
+  """
+
+  h, w = img.shape[:2]
+  if scale is not None:
+    size = ( round(w * scale), round(h * scale) )
+  elif (width is not None) and (height is not None):
+    size = ( int(width), int(height) )
+  elif width is not None:
+    size = ( int(width), round(h * width / w) )
+  elif height is not None:
+    size = ( round(w * height / h), int(height) )
+  else:
+    return img
+
+  size = ( max(size[0], 1), max(size[1], 1) )
+  if size == (w, h): return img
+
+  out = Image.fromarray( img ).resize( size, Image.LANCZOS )                    # Lanczos filter for downsampling
+  return np.asarray( out )
+
+################################################################################
+def saveImage( img, sfile, makedirs = True, text = None ):
+  """
+  Write an RGBA buffer to a PNG file
+
+  The image is written to a temporary file that is then moved into place, so
+  that a partially written image is never left at the output path.
+
+  Arguments:
+    img (ndarray) : RGBA image to write
+    sfile (str) : Full path of the file to write
+
+  Keyword arguments:
+    makedirs (bool) : If set, create the directory of the file if it
+      does not exist
+    text (dict) : Text chunks, keyed by name, to write to the PNG file;
+      see imageText()
+
+  Returns:
+    str : Path to the file written
+
+  """
+
+  if makedirs:
+    os.makedirs( os.path.dirname( sfile ), exist_ok=True )
+  info = None
+  if text:
+    info = PngInfo()
+    for key, val in text.items():
+      info.add_text( key, str(val) )
+  tmp = f'{sfile}.{os.getpid()}.tmp'
+  Image.fromarray( img ).save( tmp, format = 'PNG', pnginfo = info )
+  os.replace( tmp, sfile )                                                      # Atomic on POSIX
+  return sfile
+
+################################################################################
+def imageText( sfile ):
+  """
+  Read the text chunks of a PNG file
+
+  Only the header of the file is read; the image is not decoded.
+
+  Arguments:
+    sfile (str) : Full path of the file to read
+
+  Returns:
+    dict : Text chunks keyed by name; empty if the file is missing, or
+      unreadable
+
+  """
+
+  if not os.path.isfile( sfile ): return {}
+  try:
+    with Image.open( sfile ) as img:
+      return dict( getattr( img, 'text', {} ) )
+  except Exception as err:
+    logging.getLogger(__name__).warning( f'Failed to read image text : {sfile}; {err}' )
+    return {}
+
+################################################################################
+def loadImage( sfile ):
+  """
+  Read a PNG file into an RGBA buffer
+
+  Arguments:
+    sfile (str) : Full path of the file to read
+
+  Returns:
+    ndarray : RGBA image
+
+  """
+
+  with Image.open( sfile ) as img:
+    return np.asarray( img.convert('RGBA') )
+
+################################################################################
+def tileImages( images, ncols, width = None, height = None ):
+  """
+  Composite RGBA buffers into a grid of tiles
+
+  Each image is resampled to the size of one tile, so that images rendered
+  at full page size can be assembled into a multi-panel page of the same
+  size.
+
+  Arguments:
+    images (list) : RGBA images, in row-major order of the tiles
+    ncols (int) : Number of tiles in each row
+
+  Keyword arguments:
+    width (int) : Width, in pixels, of the output image. Default is the
+      width of the first image
+    height (int) : Height, in pixels, of the output image. Default is the
+      height of the first image
+
+  Returns:
+    ndarray : Composite RGBA image; white where there are no tiles
+
+  """
+
+  nrows  = -(-len(images) // ncols)                                             # Ceiling division
+  height = height or images[0].shape[0]
+  width  = width  or images[0].shape[1]
+  tileH  = height // nrows
+  tileW  = width  // ncols
+
+  out = np.full( (height, width, 4), 255, dtype = np.uint8 )
+  for i, img in enumerate( images ):
+    row, col = divmod( i, ncols )
+    out[row*tileH:(row+1)*tileH, col*tileW:(col+1)*tileW] = \
+      resizeImage( img, width = tileW, height = tileH )
+  return out
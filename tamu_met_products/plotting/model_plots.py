@@ -4,6 +4,7 @@ from metpy.units import units
 
 from .plotters import *
 from .plot_utils import add_colorbar, plot_basemap, baseLabel, parseArgs 
+from .contour_cache import cachedContour
 
 from . import color_maps
 from . import contour_levels
@@ -47,11 +48,10 @@ def plot_rh_mslp_thick( ax, data, **kwargs ):
     log.error( err )
   else:
     log.debug('Plotting mean sea level pressure')
-    c = ax.contour(data['xx'], data['yy'], var.to('hPa').m, 
-         levels = contour_levels.mslp, 
+    c = cachedContour(ax, data, ('mslp', '0.0MSL', 'hPa'), var.to('hPa').m, 
+         contour_levels.mslp, labels = True,
          **OPTS['contour_Opts']
         )
-    ax.clabel(c, **OPTS['clabel_Opts'])
 
   txt = baseLabel( data['model'], data['initTime'], data['fcstTime'] )         # Get base string for label
   txt.append(f'{height.magnitude:d}-hPa RH, MSLP, {thick1.magnitude:d}--{thick2.magnitude:d}-hPa THICK')                          # Update label
@@ -113,10 +113,10 @@ def plot_precip_mslp_temps( ax, data, **kwargs ):
     log.error( err )
   else:
     log.debug( f'Plotting {varName} at {height}')
-    c1   = ax.contour(data['xx'], data['yy'], var, 
-           levels = 0, colors = (1,0,0), linewidths = 4);                       # Contour for 0 degree C line
-    c2   = ax.contour(data['xx'], data['yy'], var, 
-           levels = 0, colors = (1,1,1), linewidths = 2);                       # Contour for 0 degree C line
+    c1   = cachedContour(ax, data, (varName, str(height), 'degC'), var, 
+           [0], colors = [(1,0,0)], linewidths = 4);                            # Contour for 0 degree C line
+    c2   = cachedContour(ax, data, (varName, str(height), 'degC'), var, 
+           [0], colors = [(1,1,1)], linewidths = 2);                            # Contour for 0 degree C line; traced once for both
 
   height = units.Quantity(2, 'meter')
   try:
@@ -125,8 +125,8 @@ def plot_precip_mslp_temps( ax, data, **kwargs ):
     log.error( err )
   else:
     log.debug( f'Plotting {varName} at {height}')
-    c3 = ax.contour(data['xx'], data['yy'], var, 
-         levels = 0, colors = (1,0,0), linewidths = 4);                       # Contour for 0 degree C line
+    c3 = cachedContour(ax, data, (varName, str(height), 'degC'), var, 
+         [0], colors = [(1,0,0)], linewidths = 4);                              # Contour for 0 degree C line
 
   # MSLP
   try:
@@ -135,11 +135,10 @@ def plot_precip_mslp_temps( ax, data, **kwargs ):
     log.error( err )
   else:
     log.debug('Plotting mean sea level pressure')
-    c4 = ax.contour(data['xx'], data['yy'], var, 
-         levels = contour_levels.mslp, 
+    c4 = cachedContour(ax, data, ('mslp', '0.0MSL', 'hPa'), var, 
+         contour_levels.mslp, labels = True,
          **OPTS['contour_Opts']
         )
-    ax.clabel(c4, **OPTS['clabel_Opts'])
 
   txt = baseLabel( data['model'], data['initTime'], data['fcstTime'] );         # Get base string for label
   txt.append('MSLP, SFC AND 850-hPa 0 DEG, 6-HR PRECIP');                       # Update label
@@ -266,8 +265,8 @@ def plot_850hPa_temp_hght_barbs( ax, data, **kwargs ):
   ax = plot_basemap(ax, **kwargs);                                              # Set up the basemap, get updated axis and map scale
 
   var, cf, cbar = contourf_temperature( ax, data, height, **kwargs )
-  c1            = ax.contour(data['xx'], data['yy'], var,
-                    levels = 0, colors = (0,0,1), linewidths = 2)               # Contour for 0 degree C line
+  c1            = cachedContour(ax, data, ('temperature', str(height), 'degC'), var,
+                    [0], colors = [(0,0,1)], linewidths = 2)                    # Contour for 0 degree C line
   var, c2       = contour_height(       ax, data, height, **kwargs )  
   _             = plot_wind_barbs(      ax, data, height, **kwargs ) 
 
@@ -365,3 +364,112 @@ def plot_250hPa_isotach_hght_barbs( ax, data, **kwargs ):
                  transform           = ax.transAxes);                           # Add label to axes
 
   return cf, c, cbar
+
+################################################################################
+def plot_accum_precip_mslp( ax, data, **kwargs ):
+  """
+  Plot precipitation accumulated over many forecast hours and MSLP
+
+  Arguments:
+    ax (GeoAxes) : Axis to plot data on
+    data (AWIPSData) :  Dictionary with all data plot
+
+  Keyword arguments:
+    hours (int) : Length, in hours, of the accumulation period; if None,
+      total precipitation since model initialization is plotted
+    All keywords accecpted by plotting methods. 
+
+  Returns:
+    tuple : Filled contour, contour, and colorbar objects
+
+  """
+
+  log = logging.getLogger(__name__)
+  log.info('Creating accumulated precip plot')
+
+  hours   = kwargs.pop( 'hours', None )
+  varName = 'precip total' if hours is None else f'precip {hours:d}hr'
+
+  try:
+    parseArgs( ax, data, kwargs )
+  except Exception as err:
+    log.error( err )
+    return None, None, None
+
+  ax = plot_basemap(ax, **kwargs)                                               # Set up the basemap, get updated axis and map scale
+
+  cf = c = cbar = None
+  try:
+    var = data.getVar( varName, '0.0SFC' ).to('inch').magnitude
+  except Exception as err:
+    log.error( err )
+  else:
+    log.debug( f'Plotting {varName}' )
+    cf, cbar = contourf(ax, data['xx'], data['yy'], var, **color_maps.precip, **kwargs)
+
+  try:
+    var = data.getVar( 'mslp', '0.0MSL' ).to('hPa').magnitude
+  except Exception as err:
+    log.error( err )
+  else:
+    log.debug('Plotting mean sea level pressure')
+    c = cachedContour(ax, data, ('mslp', '0.0MSL', 'hPa'), var, 
+         contour_levels.mslp, labels = True,
+         **OPTS['contour_Opts']
+        )
+
+  txt = baseLabel( data['model'], data['initTime'], data['fcstTime'] )          # Get base string for label
+  if hours is None:
+    txt.append( 'MSLP, TOTAL ACCUMULATED PRECIP (IN)' )
+  else:
+    txt.append( f'MSLP, {hours:d}-HR ACCUMULATED PRECIP (IN)' )
+  t = ax.text(0.5, 0, os.linesep.join( txt ),
+                 verticalalignment   = 'top', 
+                 horizontalalignment = 'center',
+                 transform           = ax.transAxes)                            # Add label to axes
+
+  return cf, c, cbar
+
+################################################################################
+def plot_srfc_temp_extreme( ax, data, **kwargs ):
+  """
+  Plot maximum, or minimum, 2 meter temperature over forecast hours
+
+  Arguments:
+    ax (GeoAxes) : Axis to plot data on
+    data (AWIPSData) :  Dictionary with all data plot
+
+  Keyword arguments:
+    extreme (str) : Either 'max' or 'min'
+    All keywords accecpted by plotting methods. 
+
+  Returns:
+    tuple : Filled contour, contour, and colorbar objects
+
+  """
+
+  log = logging.getLogger(__name__)
+  log.info('Creating surface temperature extreme plot')
+
+  extreme   = kwargs.pop( 'extreme', 'max' )
+  height_2m = units.Quantity( 2, 'meter')
+
+  try:
+    parseArgs( ax, data, kwargs )
+  except Exception as err:
+    log.error( err )
+    return None, None, None
+
+  ax = plot_basemap(ax, **kwargs)                                               # Set up the basemap, get updated axis and map scale
+
+  var, cf, cbar = contourf_temperature( ax, data, height_2m, 
+                    varname = f'temperature {extreme}', unit = 'degF', **kwargs )
+
+  txt = baseLabel( data['model'], data['initTime'], data['fcstTime'] )          # Get base string for label
+  txt.append( f'{extreme.upper()}IMUM {height_2m.magnitude:d}-M TEMP (F) SINCE INITIALIZATION' ) # Update label
+  t = ax.text(0.5, 0, os.linesep.join( txt ),
+                 verticalalignment   = 'top', 
+                 horizontalalignment = 'center',
+                 transform           = ax.transAxes)                            # Add label to axes
+
+  return cf, None, cbar
@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 
+from .render_profile import basemapOpts
+
 dir = os.path.dirname( os.path.dirname(__file__) )
 with open( os.path.join( dir, 'plot_opts.json' ), 'r' ) as fid:
   opts = json.load(fid)
@@ -154,7 +156,8 @@ def plot_basemap(ax, **kwargs):
     ax    : Axis to plot on
 
   Keyword arguments:
-    Arguments for set_extent, and cartopy cfeatures
+    Arguments for set_extent, and cartopy cfeatures. Defaults for the
+    active render profile are used for any not given; see basemapOpts()
 
   Returns:
     Axis object
@@ -162,6 +165,7 @@ def plot_basemap(ax, **kwargs):
   """  
 
   log        = logging.getLogger(__name__)
+  kwargs     = {**basemapOpts(), **kwargs}
   resloution = kwargs.pop( 'resolution', '50m' )
   linewidth  = kwargs.pop( 'linewidth',  0.5 )
 
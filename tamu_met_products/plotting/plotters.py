@@ -4,6 +4,8 @@ from metpy.calc import wind_speed
 from metpy.units import units
 
 from .plot_utils import add_colorbar, plot_barbs
+from .contour_cache import cachedContour
+from .render_profile import contourfOpts
 
 from . import color_maps
 from . import contour_levels
@@ -34,7 +36,7 @@ def contourf( ax, x, y, z, **kwargs ):
 
   """
 
-  cf   = ax.contourf( x, y, z, **kwargs, **OPTS['contourf_Opts'] )              # Draw filled contours
+  cf   = ax.contourf( x, y, z, **kwargs, **contourfOpts() )                     # Draw filled contours; options of active render profile
   cbar = add_colorbar( ax, cf, None, **kwargs )                                 # Add a color bar
 
   return cf, cbar                                                               # Return the filled contour reference and colorbar reference
@@ -298,11 +300,10 @@ def contour_height(ax, data, height, fill=False, **kwargs):
     return None, None
 
   log.debug( f'Plotting {varName}' )
-  c = ax.contour(data['xx'], data['yy'], var, 
-         levels = contour_levels.heights.get(height, None),
+  c = cachedContour(ax, data, (varName, height, unit), var, 
+         contour_levels.heights.get(height, None), labels = True,
          **OPTS['contour_Opts']
-     )                                                                        # Contour the geopotential height
-  ax.clabel(c, **OPTS['clabel_Opts'])                                         # Change contour label settings
+     )                                                                        # Contour and label the geopotential height
 
   return var, c
 
@@ -342,7 +343,7 @@ def contour_thickness(ax, data, height1, height2, fill=False, **kwargs):
   
   log.debug( f'Plotting {varName}' )
 
-  c = ax.contour(data['xx'], data['yy'], var, **contour_levels.thickness)       # Draw red/blue dashed lines
-  ax.clabel(c, **OPTS['clabel_Opts'])                                        # Update labels
+  c = cachedContour(ax, data, (varName, height1, height2, unit), var, 
+                    labels = True, **contour_levels.thickness)                  # Draw and label red/blue dashed lines
 
   return var, c
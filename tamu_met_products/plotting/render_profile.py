@@ -0,0 +1,87 @@
+import logging
+import os, json
+
+import matplotlib
+
+dir = os.path.dirname( os.path.dirname(__file__) )
+with open( os.path.join(dir, 'plot_opts.json'), 'r' ) as fid:
+  OPTS = json.load(fid)
+
+PROFILES = OPTS['render_profiles']
+
+_active = {'name' : 'default'}                                                  # Settings of the active profile
+_saved  = {}                                                                    # rcParams values changed by the active profile
+
+def setProfile( name ):
+  """
+  Activate a named render profile from the 'render_profiles' entry of
+  plot_opts.json
+
+  A profile may set:
+    rcParams (dict) : Matplotlib rcParams; e.g., path.simplify and
+      agg.path.chunksize
+    contourf (dict) : Options for filled contours, added to contourf_Opts;
+      e.g., rasterized and antialiased
+    clabel (dict) : Options for contour labels, added to clabel_Opts
+    label_every (int) : Label only every N-th contour level
+    label_cache (bool) : Reuse label positions for the same contour lines
+      on axes of the same size; see contour_cache.labelContours()
+    basemap (dict) : Keywords for plot_utils.plot_basemap(); e.g., the
+      resolution of coastlines
+
+  The rcParams changed by the previous profile are restored first, so
+  profiles can be switched at any time.
+
+  Arguments:
+    name (str) : Name of the profile
+
+  Returns:
+    dict : Settings of the profile
+
+  """
+
+  if name not in PROFILES:
+    raise Exception( f'No render profile defined for: {name}' )
+
+  matplotlib.rcParams.update( _saved )
+  _saved.clear()
+  profile = PROFILES[name]
+  for key, val in profile.get( 'rcParams', {} ).items():
+    _saved[key] = matplotlib.rcParams[key]
+    matplotlib.rcParams[key] = val
+
+  _active.clear()
+  _active.update( profile )
+  _active['name'] = name
+  logging.getLogger(__name__).info( f'Using render profile : {name}' )
+  return profile
+
+def getProfile():
+  """Name of the active render profile"""
+
+  return _active['name']
+
+def contourfOpts():
+  """Options for filled contours under the active profile"""
+
+  return {**OPTS['contourf_Opts'], **_active.get( 'contourf', {} )}
+
+def clabelOpts():
+  """Options for contour labels under the active profile"""
+
+  return {**OPTS['clabel_Opts'], **_active.get( 'clabel', {} )}
+
+def labelEvery():
+  """Label every N-th contour level under the active profile"""
+
+  return max( int( _active.get( 'label_every', 1 ) ), 1 )
+
+def basemapOpts():
+  """Keywords for basemaps under the active profile"""
+
+  return dict( _active.get( 'basemap', {} ) )
+
+def labelCache():
+  """Whether label positions are reused under the active profile"""
+
+  return bool( _active.get( 'label_cache', False ) )
@@ -0,0 +1,298 @@
+import logging
+from fnmatch import fnmatch
+from functools import partial
+
+from .data_backends.accumulator import TOTAL, DAILY, TMAX, TMIN
+from .plotting.model_plots import (
+  plot_rh_mslp_thick,
+  plot_precip_mslp_temps,
+  plot_srfc_temp_barbs,
+  plot_1000hPa_theta_e_barbs,
+  plot_850hPa_temp_hght_barbs,
+  plot_500hPa_vort_hght_barbs,
+  plot_250hPa_isotach_hght_barbs,
+  plot_accum_precip_mslp,
+  plot_srfc_temp_extreme
+)
+
+class Product( object ):
+  """
+  Declaration of a model product
+
+  A product declares everything needed to create it: the layout of panels
+  on the figure, the plotting function of each panel, the variables, in
+  standard names, and levels that must be downloaded for it, the fields
+  it reads while drawing, and the style inputs it is drawn with.
+
+  """
+
+  def __init__(self, key, panels, requires, panelScale = False, 
+                     accumulated = False, default = True, composite = None,
+                     uses = None, style = ()):
+    """
+    Arguments:
+      key (str) : Name of the product; also the name of its output directory
+      panels (list) : Tuples of (subplot, function) for each panel, where
+        subplot is a three digit subplot specification, e.g., 221, and
+        function is called with the axes and data to draw the panel
+      requires (dict) : Levels of each variable, keyed by standard name,
+        required by the product
+
+    Keyword arguments:
+      panelScale (bool) : If set, the map scale for the figure is passed to
+        the panel functions; used where panels are smaller than the page
+      accumulated (bool) : If set, the product uses fields accumulated over
+        forecast hours; see data_backends.accumulator
+      default (bool) : If set, the product is created when no products are
+        selected explicitly
+      composite (list) : Keys of single-panel products that draw the same
+        panels, in panel order; in composite mode, the product is assembled
+        from their images instead of being drawn again
+      uses (dict) : Levels of each field, keyed by name, read while drawing
+        the product; includes derived fields, e.g., abs_vort. Fields no
+        longer used by any remaining product of a forecast hour are
+        released. Default is the required variables
+      style (iterable) : Names of the style inputs, other than those common
+        to all products, the product is drawn with; e.g., 'barb_Opts' or
+        'color_maps.precip'. See styles.styleValue()
+
+    """
+
+    self.key         = key
+    self.panels      = panels
+    self.requires    = {name : tuple(levels) for name, levels in requires.items()}
+    self.panelScale  = panelScale
+    self.accumulated = accumulated
+    self.default     = default
+    self.composite   = composite
+    self.uses        = {name : tuple(levels) for name, levels in (uses or requires).items()}
+    self.style       = tuple( sorted( set( STYLE ).union( style ) ) )
+
+  def __repr__( self ):
+    return f'Product({self.key!r})'
+
+STYLE    = ('figure_opts', 'subplot_adjust', 'contourf_Opts', 'colorbar')       # Style inputs of all products
+REGISTRY = {}                                                                   # Registered products in standard order
+
+def register( product ):
+  """
+  Add product to the registry
+
+  Products are rendered in the order they are registered.
+
+  Arguments:
+    product (Product) : Product to register
+
+  Returns:
+    Product : The product
+
+  """
+
+  if product.key in REGISTRY:
+    raise Exception( f'Product already registered : {product.key}' )
+  REGISTRY[product.key] = product
+  return product
+
+def select( patterns = None ):
+  """
+  Select products by name
+
+  Arguments:
+    patterns (list) : Names, or shell-style patterns, of products to
+      select; e.g., ['precip', '*-hPa']. If None, or empty, all default
+      products are selected
+
+  Returns:
+    list : Keys of the selected products, in standard order
+
+  """
+
+  if not patterns: return [key for key, product in REGISTRY.items() if product.default]
+
+  keys = [key for key in REGISTRY if any( fnmatch( key, pattern ) for pattern in patterns )]
+  for pattern in patterns:
+    if not any( fnmatch( key, pattern ) for key in REGISTRY ):
+      raise Exception( f'No products match : {pattern}' )
+  return keys
+
+def fields( keys ):
+  """
+  Fields read while drawing products
+
+  Arguments:
+    keys (list) : Keys of products
+
+  Returns:
+    set : Tuples of (name, level) of the fields
+
+  """
+
+  return {(name, level) for key in keys for name, levels in REGISTRY[key].uses.items()
+                                         for level in levels}
+
+def requirements( keys ):
+  """
+  Merge the variables and levels required by products
+
+  Arguments:
+    keys (list) : Keys of products
+
+  Returns:
+    dict : Set of levels for each variable, keyed by standard name
+
+  """
+
+  required = {}
+  for key in keys:
+    for name, levels in REGISTRY[key].requires.items():
+      required.setdefault( name, set() ).update( levels )
+  return required
+
+def modelVars( model, keys ):
+  """
+  Reduce the variables of a model to those required by products
+
+  Parameters, and levels, that no selected product uses are removed, so
+  they are never downloaded. Variable groups are ordered by the first
+  product that requires them, so that, when data are rendered as they
+  arrive, the first product can start as soon as possible.
+
+  Arguments:
+    model (dict) : Model definition from awips_models; e.g., NAM40
+    keys (list) : Keys of products
+
+  Returns:
+    dict : Model variables, and levels, in the same format as the
+      'model_vars' entry of the model definition
+
+  """
+
+  required   = requirements( keys )
+  mdl2stnd   = model['mdl2stnd']
+  model_vars = {}
+  for group, info in model['model_vars'].items():
+    params = [param for param in info['parameters'] if mdl2stnd[param] in required]
+    if len(params) == 0: continue
+    levels = set().union( *[required[ mdl2stnd[param] ] for param in params] )
+    levels = [level for level in info['levels'] if level in levels]
+    if len(levels) == 0: continue
+    model_vars[group] = {'parameters' : params, 'levels' : levels}
+
+  def first( group ):                                                           # Index of first product requiring group
+    info = model_vars[group]
+    for i, key in enumerate( keys ):
+      req = REGISTRY[key].requires
+      if any( level in req.get( mdl2stnd[param], () ) for param in info['parameters']
+                                                      for level in info['levels'] ):
+        return i
+    return len(keys)
+
+  model_vars = {group : model_vars[group] for group in sorted( model_vars, key = first )}
+  logging.getLogger(__name__).debug( f'Variables required for {keys} : {model_vars}' )
+  return model_vars
+
+def styles( keys ):
+  """
+  Style inputs of products
+
+  Arguments:
+    keys (list) : Keys of products
+
+  Returns:
+    dict : Names of the style inputs of each product, keyed by product
+
+  """
+
+  return {key : REGISTRY[key].style for key in keys}
+
+def releasePlan( keys, fields ):
+  """
+  Plan when the fields of a forecast hour can be released
+
+  Each field is released right after the last product that uses it; fields
+  that no product uses are released before the first product.
+
+  Arguments:
+    keys (list) : Keys of products, in the order they are created
+    fields (iterable) : Tuples of (name, level) of the fields in the data
+
+  Returns:
+    list : Tuples of (name, level) to release before the first product,
+      followed by those to release after each product
+
+  """
+
+  last = {}
+  for i, key in enumerate( keys ):
+    for name, levels in REGISTRY[key].uses.items():
+      for level in levels:
+        last[ (name, level) ] = i
+  plan = [ [] for _ in range( len(keys) + 1 ) ]
+  for field in fields:
+    plan[ last.get( field, -1 ) + 1 ].append( field )
+  return plan
+
+def _merge( *requires ):
+  """Union of requirement dictionaries"""
+
+  out = {}
+  for req in requires:
+    for name, levels in req.items():
+      out[name] = tuple( sorted( set( out.get( name, () ) ).union( levels ) ) )
+  return out
+
+WIND = ('u wind', 'v wind')
+
+MSLP_REQ  = {'rh' : ('700.0MB',), 'geopotential height' : ('1000.0MB', '500.0MB'),
+             'mslp' : ('0.0MSL',)}
+H850_REQ  = {'temperature' : ('850.0MB',), 'geopotential height' : ('850.0MB',),
+             **{name : ('850.0MB',) for name in WIND}}
+H500_REQ  = {'geopotential height' : ('500.0MB',), **{name : ('500.0MB',) for name in WIND}}
+H250_REQ  = {'geopotential height' : ('250.0MB',), **{name : ('250.0MB',) for name in WIND}}
+H500_USE  = {**H500_REQ, 'abs_vort' : ('500.0MB',)}                            # Vorticity is derived from the winds when downloaded
+H1000_USE = {'theta_e' : ('1000.0MB',), **{name : ('1000.0MB',) for name in WIND}}
+PRECIP_REQ = {'precip' : ('0.0SFC',), 'mslp' : ('0.0MSL',)}
+
+CONTOURS    = ('contour_Opts', 'clabel_Opts')                                   # Labeled contour lines
+MSLP_STYLE  = CONTOURS + ('color_maps.surface', 'contour_levels.thickness', 'contour_levels.mslp')
+H850_STYLE  = CONTOURS + ('barb_Opts', 'color_maps.temperature[850.0MB]', 'contour_levels.heights[850.0MB]')
+H500_STYLE  = CONTOURS + ('barb_Opts', 'color_maps.vorticity[500.0MB]',   'contour_levels.heights[500.0MB]')
+H250_STYLE  = CONTOURS + ('barb_Opts', 'color_maps.winds[250.0MB]',       'contour_levels.heights[250.0MB]')
+PRECIP_STYLE = CONTOURS + ('color_maps.precip', 'contour_levels.mslp')
+
+register( Product( '4-panel',
+  [(221, plot_500hPa_vort_hght_barbs),
+   (222, plot_250hPa_isotach_hght_barbs),
+   (223, plot_850hPa_temp_hght_barbs),
+   (224, plot_rh_mslp_thick)],
+  _merge( H500_REQ, H250_REQ, H850_REQ, MSLP_REQ ),
+  panelScale = True, composite = ['500-hPa', '250-hPa', '850-hPa', 'mslp'],
+  uses = _merge( H500_USE, H250_REQ, H850_REQ, MSLP_REQ ),
+  style = H500_STYLE + H250_STYLE + H850_STYLE + MSLP_STYLE ) )
+register( Product( 'mslp', [(111, plot_rh_mslp_thick)], MSLP_REQ, style = MSLP_STYLE ) )
+register( Product( 'precip', [(111, plot_precip_mslp_temps)],
+  {'precip' : ('0.0SFC',), 'temperature' : ('850.0MB', '2.0FHAG'), 'mslp' : ('0.0MSL',)},
+  style = PRECIP_STYLE ) )
+register( Product( 'surface', [(111, plot_srfc_temp_barbs)],
+  {'temperature' : ('2.0FHAG',), **{name : ('10.0FHAG',) for name in WIND}},
+  style = ('barb_Opts', 'color_maps.temperature[2.0FHAG]') ) )
+register( Product( '1000-hPa', [(111, plot_1000hPa_theta_e_barbs)],
+  {'temperature' : ('1000.0MB',), 'dewpoint' : ('1000.0MB',),
+   **{name : ('1000.0MB',) for name in WIND}}, uses = H1000_USE,
+  style = ('barb_Opts', 'color_maps.theta_e[1000.0MB]') ) )
+register( Product( '850-hPa', [(111, plot_850hPa_temp_hght_barbs)], H850_REQ, style = H850_STYLE ) )
+register( Product( '500-hPa', [(111, plot_500hPa_vort_hght_barbs)], H500_REQ, uses = H500_USE,
+  style = H500_STYLE ) )
+register( Product( '250-hPa', [(111, plot_250hPa_isotach_hght_barbs)], H250_REQ, style = H250_STYLE ) )
+register( Product( 'precip-total', [(111, plot_accum_precip_mslp)],
+  PRECIP_REQ, accumulated = True, default = False,
+  uses = {TOTAL : ('0.0SFC',), 'mslp' : ('0.0MSL',)}, style = PRECIP_STYLE ) )
+register( Product( 'precip-24hr', [(111, partial( plot_accum_precip_mslp, hours = 24 ))],
+  PRECIP_REQ, accumulated = True, default = False,
+  uses = {DAILY : ('0.0SFC',), 'mslp' : ('0.0MSL',)}, style = PRECIP_STYLE ) )
+register( Product( 'surface-max', [(111, partial( plot_srfc_temp_extreme, extreme = 'max' ))],
+  {'temperature' : ('2.0FHAG',)}, accumulated = True, default = False,
+  uses = {TMAX : ('2.0FHAG',)}, style = ('color_maps.temperature[2.0FHAG]',) ) )
+register( Product( 'surface-min', [(111, partial( plot_srfc_temp_extreme, extreme = 'min' ))],
+  {'temperature' : ('2.0FHAG',)}, accumulated = True, default = False,
+  uses = {TMIN : ('2.0FHAG',)}, style = ('color_maps.temperature[2.0FHAG]',) ) )
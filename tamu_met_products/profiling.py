@@ -0,0 +1,135 @@
+import logging
+import os, io, cProfile, pstats
+from fnmatch import fnmatch
+from functools import wraps
+from threading import Lock
+
+class ProductProfiler( object ):
+  """
+  Profile selected product renders and downloads with cProfile
+
+  Wrapped functions are profiled on every N-th call, per function name, and
+  the stats of each call are dumped to their own pstats file, which can be
+  opened with pstats, snakeviz, gprof2dot, etc. Only one call is profiled at
+  a time, as the interpreter only allows one active profiler; calls made
+  while another call is being profiled simply run unprofiled. As cProfile
+  is not used for the calls that are not sampled, an external sampling
+  profiler such as py-spy can be attached to the process at any time.
+
+  """
+
+  def __init__(self, outdir, products = None, every = 1, top = 30):
+    """
+    Arguments:
+      outdir (str) : Directory to write stats files and reports to
+
+    Keyword arguments:
+      products (list) : Names, or shell-style patterns, of products to
+        profile; 'download' selects the data download. If None, everything
+        is profiled
+      every (int) : Profile only one in every this many calls of each
+        wrapped function
+      top (int) : Number of functions to list in the aggregated report
+
+    """
+
+    self.log      = logging.getLogger(__name__)
+    self.outdir   = outdir
+    self.products = products
+    self.every    = max( int(every), 1 )
+    self.top      = top
+    self.files    = []
+    self._calls   = {}
+    self._count   = Lock()
+    self._lock    = Lock()                                                      # Held while a call is profiled
+
+  def selected( self, name ):
+    """Check if given product, or 'download', is to be profiled"""
+
+    if not self.products: return True
+    return any( fnmatch( name, pattern ) for pattern in self.products )
+
+  def _sample( self, name ):
+    """Check if this call of name should be profiled"""
+
+    with self._count:
+      count = self._calls.get( name, 0 )
+      self._calls[name] = count + 1
+    return (count % self.every) == 0
+
+  def wrap( self, func, name, label ):
+    """
+    Wrap a function so that it is profiled
+
+    Arguments:
+      func (callable) : Function to profile
+      name (str) : Name of the product, or 'download'
+      label (callable) : Called with the arguments of func, returns the path,
+        relative to outdir and without extension, of the stats file
+
+    Returns:
+      callable : Wrapped function; func itself if name is not selected
+
+    """
+
+    if not self.selected( name ): return func
+
+    @wraps( func )
+    def wrapper( *args, **kwargs ):
+      if not self._sample( name ) or not self._lock.acquire( blocking = False ):
+        return func( *args, **kwargs )
+      try:
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+          return func( *args, **kwargs )
+        finally:
+          prof.disable()
+          self._dump( prof, label( *args, **kwargs ) )
+      finally:
+        self._lock.release()
+
+    return wrapper
+
+  def _dump( self, prof, label ):
+    """Write stats of a profiled call to file"""
+
+    path = os.path.join( self.outdir, f'{label}.prof' )
+    try:
+      os.makedirs( os.path.dirname( path ), exist_ok=True )
+      prof.dump_stats( path )
+    except Exception as err:
+      self.log.warning( f'Failed to write profile stats : {err}' )
+    else:
+      self.log.debug( f'Wrote profile stats : {path}' )
+      self.files.append( path )
+
+  def report( self, sfile = None ):
+    """
+    Write report of the top functions aggregated over all profiled calls
+
+    Arguments:
+      None.
+
+    Keyword arguments:
+      sfile (str) : Path of the report; default is report.txt in outdir
+
+    Returns:
+      str : Path to the report; None if nothing was profiled
+
+    """
+
+    if len(self.files) == 0: return None
+    sfile  = sfile or os.path.join( self.outdir, 'report.txt' )
+    stream = io.StringIO()
+    stats  = pstats.Stats( *self.files, stream = stream )
+    stream.write( f'Aggregated profile of {len(self.files)} calls{os.linesep}' )
+    for sortBy in ('cumulative', 'tottime'):
+      stats.sort_stats( sortBy ).print_stats( self.top )
+
+    os.makedirs( os.path.dirname( sfile ), exist_ok=True )
+    with open( sfile, 'w' ) as fid:
+      fid.write( stream.getvalue() )
+    self.log.info( f'Wrote profile report : {sfile}' )
+    self.files = []
+    return sfile
@@ -0,0 +1,63 @@
+"""
+Client of the render server; kept apart from the server so that submitting
+a job does not import the plotting packages
+"""
+import socket, json
+from datetime import datetime
+
+TIMEFMT = '%Y%m%dT%H%M%S'                                                      # Format of model cycles in jobs; same as ModelPlotter.TIMEFMT
+
+def send( conn, message ):
+  """Send one message, as a line of JSON"""
+
+  conn.sendall( (json.dumps( message ) + '\n').encode() )
+
+def receive( fid ):
+  """Read one message, as a line of JSON, from a file object of a socket"""
+
+  line = fid.readline()
+  if not line:
+    raise Exception( 'Connection closed before message was received' )
+  return json.loads( line )
+
+def submit( path, model, cycle, hour, products = None, timeout = None, **kwargs ):
+  """
+  Send a render job to a RenderServer, and wait for it to finish
+
+  Arguments:
+    path (str) : Path of the Unix socket of the server
+    model (str) : Name of the model; e.g., NAM40
+    cycle (datetime, str) : Initialization time of the model run; strings
+      in TIMEFMT format
+    hour (float) : Forecast hour
+
+  Keyword arguments:
+    products (list) : Names, or patterns, of products to render; default
+      is the products of the server
+    timeout (float) : Seconds to wait for the job to finish
+    update (bool) : If set, the default, render products even if they
+      exist, unless their inputs are unchanged
+    force (bool) : If set, render products even if their inputs are
+      unchanged
+
+  Returns:
+    dict : Result of the job; 'ok' is set if all images were written,
+      'files' lists the images, and 'seconds' is the time from submission
+      to completion. 'started' is the time from submission until the
+      worker started rendering
+
+  """
+
+  if isinstance( cycle, datetime ): cycle = cycle.strftime( TIMEFMT )
+  job = {'model' : model, 'cycle' : cycle, 'hour' : hour, 'products' : products, **kwargs}
+  with socket.socket( socket.AF_UNIX, socket.SOCK_STREAM ) as sock:
+    sock.settimeout( timeout )
+    sock.connect( path )
+    send( sock, job )
+    with sock.makefile( 'r' ) as fid:
+      result = receive( fid )
+      if result.get( 'started', False ):
+        started = result['seconds']
+        result  = receive( fid )
+        result['started'] = started
+  return result
@@ -0,0 +1,231 @@
+import logging
+import os, signal, socket
+from collections import deque
+from time import monotonic
+from datetime import datetime
+
+from .model_products import ModelPlotter
+from .data_backends.awips_models import MODELS
+from .data_backends.accumulator import Accumulator
+from .data_backends.diagnostics import forGrid
+from .products import REGISTRY as PRODUCTS, select as selectProducts
+from .plotting.plot_utils import plot_basemap
+from .plotting.image_utils import renderFigure
+from .render_client import send as _send, receive as _receive
+
+BACKLOG = 64                                                                    # Connections waiting to be accepted
+POLL    = 1.0                                                                   # Seconds between checks for finished workers while idle
+BUSY    = 0.05                                                                  # Seconds between checks for finished workers while jobs wait
+
+def _terminate( signum, frame ):
+  """Exit the server cleanly on SIGTERM"""
+
+  raise SystemExit( 0 )
+
+class RenderServer( object ):
+  """
+  Server that forks warm workers to render jobs on demand
+
+  Importing the plotting, projection, and data packages, building color
+  maps, projecting basemap features, and preparing the grids of each
+  domain take seconds; the server pays for these once, then forks a
+  worker for each job, which inherits all of it and starts drawing right
+  away. Jobs are sent over a local socket, as one line of JSON, and each
+  renders the products of one forecast time; see render_client.submit().
+
+  The server itself never waits on a job: each worker reads its job and
+  looks up its forecast time, and jobs that arrive while all workers are
+  busy wait in a queue until one finishes, while new connections are still
+  accepted. Workers keep the forecast times of each cycle in the time
+  index of the grid cache, so later jobs of a complete cycle do not wait
+  on EDEX for them. The server makes no EDEX requests after warming up;
+  requests of a worker never share locks with threads of the server.
+
+  """
+
+  def __init__(self, path, workers = None, plotterOpts = None, **kwargs):
+    """
+    Arguments:
+      path (str) : Path of the Unix socket to listen on
+
+    Keyword arguments:
+      workers (int) : Most jobs rendered at once; default is number of CPUs
+      plotterOpts (dict) : Keywords for ModelPlotter
+      Others passed to the downloader and standardProducts()
+
+    """
+
+    self.log         = logging.getLogger(__name__)
+    self.path        = path
+    self.workers     = workers or os.cpu_count() or 1
+    self.kwargs      = kwargs
+    self.plotter     = ModelPlotter( **(plotterOpts or {}) )
+    self.downloaders = {}
+    self.children    = {}                                                       # Time the job of each running worker was accepted, keyed by process id
+    self.pending     = deque()                                                  # Connections, and times accepted, of jobs waiting for a worker
+    self.sock        = None
+
+  def warm( self ):
+    """
+    Prepare everything that workers would otherwise each prepare
+
+    Grids of the newest cached cycle of each model are projected for every
+    domain, along with their diagnostics, and the basemap of every domain
+    is drawn once, so the projected coastlines, states, and borders are
+    cached. A downloader is created for every model, without requesting
+    anything from EDEX, so workers inherit them.
+
+    """
+
+    start = monotonic()
+    cache = self.plotter.gridCache()
+    found = None
+    for name in MODELS:
+      lonlat = cache.grid( name )
+      if lonlat is None: continue
+      found = lonlat
+      forGrid( *lonlat )
+      for domain in self.plotter.domains:
+        domain.grid( *lonlat )
+      self.log.debug( f'Prepared {name} grid' )
+
+    fig = self.plotter.fig
+    for domain in self.plotter.domains:
+      fig.clf()
+      ax   = fig.add_subplot( 111, projection = domain.projection )
+      opts = {}
+      if found is not None:
+        opts['extent'], _ = domain.grid( *found ).extentScale( ax )
+      plot_basemap( ax, **opts )
+      renderFigure( fig )
+    fig.clf()
+    for name in MODELS:
+      self._downloader( name )
+    self.log.info( f'Server warmed in {monotonic() - start:0.1f} s' )
+
+  def _downloader( self, modelName ):
+    """Downloader for a model; created once, by warm(), and inherited by all workers"""
+
+    if modelName not in self.downloaders:
+      if modelName not in MODELS:
+        raise Exception( f'Unknown model : {modelName}' )
+      self.downloaders[modelName] = self.plotter._downloader( MODELS[modelName], prune = False,
+                                                              **self.kwargs )
+    return self.downloaders[modelName]
+
+  def _reap( self ):
+    """Collect finished workers, without waiting"""
+
+    while self.children:
+      try:
+        pid, status = os.waitpid( -1, os.WNOHANG )
+      except ChildProcessError:
+        self.children.clear()
+        return
+      if pid == 0: return
+      start = self.children.pop( pid, None )
+      if start is not None:
+        self.log.debug( f'Worker {pid} finished in {monotonic() - start:0.1f} s with status {status}' )
+
+  def _dispatch( self ):
+    """Fork workers for waiting jobs while there are free workers"""
+
+    while self.pending and len(self.children) < self.workers:
+      conn, start = self.pending.popleft()
+      try:
+        self._handle( conn, start )
+      except Exception as err:
+        self.log.error( f'Failed to start job : {err}' )
+        try:
+          _send( conn, {'ok' : False, 'error' : str(err)} )
+        except OSError:
+          pass
+      conn.close()
+
+  def serve( self ):
+    """
+    Accept jobs, and fork a worker for each, until interrupted
+
+    The socket file is removed on exit; running workers finish their jobs.
+
+    """
+
+    if os.path.exists( self.path ):
+      self.log.warning( f'Removing existing socket : {self.path}' )
+      os.remove( self.path )
+
+    self.sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+    self.sock.bind( self.path )
+    self.sock.listen( BACKLOG )
+    self.sock.settimeout( POLL )
+    signal.signal( signal.SIGTERM, _terminate )
+    self.log.info( f'Serving render jobs on : {self.path}' )
+    try:
+      while True:
+        self._reap()
+        self._dispatch()
+        self.sock.settimeout( BUSY if self.pending else POLL )
+        try:
+          conn, _ = self.sock.accept()
+        except socket.timeout:
+          continue
+        conn.settimeout( None )
+        self.pending.append( (conn, monotonic()) )
+        if len(self.children) >= self.workers:
+          self.log.debug( f'All workers busy; {len(self.pending)} jobs waiting' )
+    finally:
+      self.sock.close()
+      for conn, _ in self.pending:
+        conn.close()
+      self.pending.clear()
+      if os.path.exists( self.path ): os.remove( self.path )
+
+  def _handle( self, conn, start ):
+    """Fork a worker to read a job and render it"""
+
+    pid = os.fork()
+    if pid == 0:
+      self._render( conn, start )
+    self.children[pid] = start
+    self.log.debug( f'Worker {pid} started; {len(self.children)} of {self.workers} busy' )
+
+  def _render( self, conn, start ):
+    """Read a job, find its forecast time, and render it in a forked worker; never returns"""
+
+    status = 1
+    try:
+      self.sock.close()
+      for other, _ in self.pending:
+        other.close()
+      signal.signal( signal.SIGTERM, signal.SIG_DFL )
+
+      with conn.makefile( 'r' ) as fid:
+        job = _receive( fid )
+      self.log.info( f'Worker {os.getpid()} rendering {job["model"]} {job["cycle"]} +{job["hour"]} h' )
+
+      downloader = self._downloader( job['model'] )
+      downloader.afterFork()                                                    # Never wait on locks held by threads of the server
+      model      = MODELS[ job['model'] ]
+      cycle      = datetime.strptime( job['cycle'], ModelPlotter.TIMEFMT )
+      date       = downloader.findTime( cycle, int( float( job['hour'] ) * 3600 ) )
+      products   = selectProducts( job.get('products', None) ) if job.get('products', None) else self.plotter.products
+      _send( conn, {'started' : True, 'pid' : os.getpid(), 'seconds' : monotonic() - start} )
+
+      if downloader.accumulator is None and any( PRODUCTS[key].accumulated for key in products ):
+        downloader.accumulator = Accumulator( model['model_name'], cache = downloader.cache )
+      self.plotter.renderTime( downloader, model, date, products,
+                               update = job.get('update', True),
+                               force  = job.get('force',  False), **self.kwargs )
+
+      files   = [path for key in products for path in self.plotter.domainPaths( date, key )]
+      missing = [path for path in files if not os.path.isfile( path )]
+      _send( conn, {'ok' : len(missing) == 0, 'files' : files, 'missing' : missing,
+                    'seconds' : monotonic() - start} )
+      status = 0 if len(missing) == 0 else 1
+    except BaseException as err:
+      try:
+        _send( conn, {'ok' : False, 'error' : str(err), 'seconds' : monotonic() - start} )
+      except OSError:
+        pass
+    finally:
+      os._exit( status )
@@ -0,0 +1,112 @@
+import logging
+import os, json
+
+PLANNED = 'planned'
+STARTED = 'started'
+DONE    = 'done'
+
+class RunJournal( object ):
+  """
+  Append-only journal of the work items for one model cycle
+
+  Every state change of a work item (planned, started, done) is written as
+  one JSON line and flushed to disk immediately, so that the journal
+  survives a crash of the process. When a journal is re-opened the lines
+  are replayed to recover the state of each item; a truncated last line,
+  from a crash in the middle of a write, is ignored.
+
+  """
+
+  def __init__(self, path):
+    """
+    Arguments:
+      path (str) : Full path of the journal file
+
+    """
+
+    self.log   = logging.getLogger(__name__)
+    self.path  = path
+    self.state = {}
+
+    os.makedirs( os.path.dirname( path ), exist_ok=True )
+    truncated  = self._replay()
+    self._fid  = open( path, 'a' )
+    if truncated: self._fid.write( '\n' )                                        # Terminate partial line so new entries are readable
+
+  def _replay( self ):
+    """
+    Rebuild state of work items from the journal file
+
+    Returns:
+      bool : True if the last line of the journal is incomplete
+
+    """
+
+    line = '\n'
+    if not os.path.isfile( self.path ): return False
+    with open( self.path, 'r' ) as fid:
+      for line in fid:
+        try:
+          entry = json.loads( line )
+        except:
+          self.log.warning( f'Ignoring corrupt journal entry in : {self.path}' )
+          continue
+        self.state[ entry['item'] ] = entry['state']
+
+    nStarted = len( self.inFlight() )
+    if nStarted > 0:
+      self.log.info( f'Re-queuing {nStarted} in-flight items from : {self.path}' )
+
+    return not line.endswith( '\n' )
+
+  def _write( self, item, state, sync = True ):
+    """Write state change for item to the journal"""
+
+    self.state[item] = state
+    self._fid.write( json.dumps( {'item' : item, 'state' : state} ) + '\n' )
+    if sync: self._sync()
+
+  def _sync( self ):
+    """Flush journal to disk"""
+
+    self._fid.flush()
+    os.fsync( self._fid.fileno() )
+
+  def plan( self, items ):
+    """Record that work items are planned; items already journaled are ignored"""
+
+    for item in items:
+      if item not in self.state:
+        self._write( item, PLANNED, sync = False )
+    self._sync()
+
+  def start( self, item ):
+    """Record that work on an item has started"""
+
+    self._write( item, STARTED )
+
+  def done( self, item ):
+    """Record that an item has been completed"""
+
+    if self.state.get( item ) != DONE:
+      self._write( item, DONE )
+
+  def isDone( self, item ):
+    return self.state.get( item ) == DONE
+
+  def isStarted( self, item ):
+    return self.state.get( item ) == STARTED
+
+  def inFlight( self ):
+    """List of items that were started, but not completed"""
+
+    return [item for item, state in self.state.items() if state == STARTED]
+
+  def remaining( self, items ):
+    """List of items that have not been completed"""
+
+    return [item for item in items if not self.isDone( item )]
+
+  def close( self ):
+    if not self._fid.closed:
+      self._fid.close()
@@ -0,0 +1,173 @@
+import logging
+from fnmatch import fnmatch
+
+def parseRule( rule ):
+  """
+  Parse a priority rule string
+
+  Rules have the form PRODUCTS[@START-END], where PRODUCTS is a comma
+  separated list of product names, which may contain shell-style wildcards,
+  and START and END are the first and last forecast hours, inclusive, that
+  the rule applies to. Either hour may be omitted; e.g., '4-panel@0-48',
+  'precip,mslp@-24', or '*-hPa'.
+
+  Arguments:
+    rule (str) : Rule to parse
+
+  Returns:
+    tuple : List of product patterns, first forecast hour, last forecast
+      hour; hours are None if not bounded
+
+  """
+
+  if '@' in rule:
+    products, hours = rule.split('@', 1)
+    start, _, end   = hours.partition('-')
+    start = int(start) if start else None
+    end   = int(end)   if end   else None
+  else:
+    products, start, end = rule, None, None
+  return [product.strip() for product in products.split(',')], start, end
+
+def rulePriority( rules ):
+  """
+  Build a priority function from a list of rules
+
+  The priority of a work item is the index of the first rule that matches
+  it; work items that match no rules are given the lowest priority. For
+  example, ['4-panel@0-48'] renders the first 48 hours of 4-panel images
+  before anything else.
+
+  Arguments:
+    rules (list) : Rule strings; see parseRule()
+
+  Returns:
+    function : Priority function that takes forecast hour and product name
+      and returns priority; lower values are rendered first
+
+  """
+
+  parsed = [ parseRule(rule) if isinstance(rule, str) else rule for rule in rules ]
+
+  def priority( fcstHour, product ):
+    for i, (products, start, end) in enumerate( parsed ):
+      if start is not None and fcstHour < start: continue
+      if end   is not None and fcstHour > end:   continue
+      if any( fnmatch( product, pattern ) for pattern in products ):
+        return i
+    return len( parsed )
+
+  return priority
+
+def parseCadence( rule ):
+  """
+  Parse a cadence rule string
+
+  Rules have the form PRODUCTS[@START-END]/EVERY, where PRODUCTS, START,
+  and END are the same as for priority rules, see parseRule(), and EVERY
+  is the number of hours between the forecast hours the products are
+  created for; e.g., '*@-36/1', '*@37-84/3', or 'precip-24hr/6'.
+
+  Arguments:
+    rule (str) : Rule to parse
+
+  Returns:
+    tuple : List of product patterns, first forecast hour, last forecast
+      hour, and hours between forecast hours
+
+  """
+
+  products, sep, every = rule.rpartition('/')
+  if not sep:
+    raise Exception( f'Cadence rule has no interval : {rule}' )
+  every = int(every)
+  if every < 1:
+    raise Exception( f'Cadence rule interval must be positive : {rule}' )
+  return (*parseRule( products ), every)
+
+def ruleCadence( rules ):
+  """
+  Build a cadence function from a list of rules
+
+  A product is created for a forecast hour if the hour is a multiple of
+  the interval of the first rule that matches it; products and hours that
+  match no rules are created for every forecast hour. For example,
+  ['precip-24hr/6', '*@-36/1', '*@37-/3'] creates 24 hour precipitation
+  every 6 hours, and other products hourly to 36 hours, then every 3 hours.
+
+  Products that use accumulated fields get every available forecast hour
+  downloaded, and accumulated, up to the hours they are created for,
+  whatever the cadence, so that no hour is missed; see
+  data_backends.accumulator.
+
+  Arguments:
+    rules (list) : Rule strings; see parseCadence()
+
+  Returns:
+    function : Cadence function that takes forecast hour and product name
+      and returns True if the product is created for that hour
+
+  """
+
+  parsed = [ parseCadence(rule) if isinstance(rule, str) else rule for rule in rules ]
+
+  def cadence( fcstHour, product ):
+    for products, start, end, every in parsed:
+      if start is not None and fcstHour < start: continue
+      if end   is not None and fcstHour > end:   continue
+      if any( fnmatch( product, pattern ) for pattern in products ):
+        return fcstHour % every == 0
+    return True
+
+  return cadence
+
+def schedule( items, priority, order = None ):
+  """
+  Order work items by priority
+
+  Ties are broken by forecast hour, and then by the order of the products,
+  so that the default priority renders all products of each forecast hour
+  in the standard order.
+
+  Arguments:
+    items (list) : Work items; tuples of (forecast time, product)
+    priority (function) : Priority function; see rulePriority()
+
+  Keyword arguments:
+    order (list) : Standard order of product names
+
+  Returns:
+    list : Sorted work items
+
+  """
+
+  order = {product : i for i, product in enumerate( order or [] )}
+
+  def key( item ):
+    time, product = item
+    fcstHour      = time[0].getFcstTime() // 3600
+    return (priority( fcstHour, product ), fcstHour, order.get( product, len(order) ))
+
+  return sorted( items, key = key )
+
+def batches( items ):
+  """
+  Group consecutive work items for the same forecast time
+
+  Arguments:
+    items (list) : Sorted work items; tuples of (forecast time, product)
+
+  Returns:
+    list : Tuples of (forecast time, list of products)
+
+  """
+
+  out = []
+  for time, product in items:
+    if len(out) > 0 and out[-1][0] is time:
+      out[-1][1].append( product )
+    else:
+      out.append( (time, [product]) )
+
+  logging.getLogger(__name__).debug( f'Scheduled {len(items)} work items in {len(out)} batches' )
+  return out
@@ -0,0 +1,99 @@
+import logging
+import json, hashlib
+
+import numpy as np
+
+from .version import __version__
+from .plotting.image_utils import imageText
+
+STAMP_KEY   = 'hdwx-stamp'                                                      # Name of PNG text chunk that holds the stamp of an image
+PREVIEW_KEY = 'hdwx-preview'                                                    # Name of PNG text chunk that marks a preview image
+INPUTS_KEY  = 'inputs'                                                          # Key of the InputStamps in the data of a forecast hour
+
+def fieldDigest( var ):
+  """
+  Digest of the values, and units, of a field
+
+  Arguments:
+    var (Quantity, ndarray) : Field to digest
+
+  Returns:
+    str : Hex digest
+
+  """
+
+  arr = np.ascontiguousarray( getattr( var, 'magnitude', var ) )
+  h   = hashlib.blake2b( digest_size = 16 )
+  h.update( f'{getattr( var, "units", "" )}|{arr.dtype.str}|{arr.shape}'.encode() )
+  h.update( arr )
+  return h.hexdigest()
+
+def readStamp( sfile ):
+  """Stamp of an existing image; None if the image is missing or has no stamp"""
+
+  return imageText( sfile ).get( STAMP_KEY, None )
+
+def isPreview( sfile ):
+  """Check if an existing image is a preview, to be replaced by the full render"""
+
+  return PREVIEW_KEY in imageText( sfile )
+
+class InputStamps( object ):
+  """
+  Stamps of the inputs that products of a forecast hour are drawn from
+
+  A stamp is a hash of the fields a product uses, the parameters, and style
+  inputs, it is drawn with, and the package version; two images
+  with the same stamp come out the same, so an image need not be drawn
+  again when its stamp has not changed. Fields are digested once per
+  forecast hour, on the full model grid, and shared by all products and
+  domains.
+
+  """
+
+  def __init__(self, data):
+    """
+    Arguments:
+      data (AWIPSData) : Data for a forecast hour, on the full model grid
+
+    """
+
+    self.log     = logging.getLogger(__name__)
+    self.data    = data
+    self.digests = {}
+
+  def field( self, name, level ):
+    """Digest of a field; None if the field is not in the data"""
+
+    key = (name, level)
+    if key not in self.digests:
+      var = self.data.get( name, {} ).get( level, None )
+      if var is None: return None
+      self.digests[key] = fieldDigest( var )
+    return self.digests[key]
+
+  def stamp( self, key, uses, **params ):
+    """
+    Stamp of a product
+
+    Arguments:
+      key (str) : Name of the product
+      uses (dict) : Levels of each field, keyed by name, the product uses
+
+    Keyword arguments:
+      Parameters the product is drawn with; e.g., domain, dpi, and digests
+        of style inputs. Must be JSON serializable, or have a stable string
+        representation
+
+    Returns:
+      str : Hex digest
+
+    """
+
+    inputs = {'version' : __version__,
+              'product' : key,
+              'fields'  : {f'{name}|{level}' : self.field( name, level )
+                             for name, levels in uses.items() for level in levels},
+              **params}
+    text   = json.dumps( inputs, sort_keys = True, default = str )
+    return hashlib.blake2b( text.encode(), digest_size = 16 ).hexdigest()
@@ -0,0 +1,161 @@
+import logging
+import os, re, json, hashlib
+from functools import lru_cache
+
+import numpy as np
+from matplotlib.colors import Colormap, BoundaryNorm
+
+from .plotting import color_maps, contour_levels
+
+dir = os.path.dirname( os.path.realpath(__file__) )
+with open( os.path.join( dir, 'plot_opts.json' ), 'r' ) as fid:
+  OPTS = json.load(fid)
+
+MODULES = {'color_maps' : color_maps, 'contour_levels' : contour_levels}
+NAME_RE = re.compile( r'^(?:(?P<module>\w+)\.)?(?P<entry>\w+)(?:\[(?P<level>[^\]]+)\])?$' )
+
+def _canonical( value ):
+  """Convert a style value to JSON serializable values that compare equal when the style is the same"""
+
+  if isinstance( value, dict ):
+    return {str(key) : _canonical( val ) for key, val in value.items()}
+  if isinstance( value, (list, tuple) ):
+    return [_canonical( val ) for val in value]
+  if isinstance( value, np.ndarray ):
+    return value.tolist()
+  if isinstance( value, Colormap ):
+    colors = getattr( value, 'colors', None )
+    return {'colors' : _canonical( np.asarray( colors ) ) if colors is not None else value.name,
+            'under'  : _canonical( np.asarray( value.get_under() ) ),
+            'over'   : _canonical( np.asarray( value.get_over() ) )}
+  if isinstance( value, BoundaryNorm ):
+    return {'boundaries' : _canonical( value.boundaries ), 'ncolors' : value.Ncmap}
+  if isinstance( value, np.generic ):
+    return value.item()
+  return value
+
+def styleValue( name ):
+  """
+  Get the value of a style input
+
+  Arguments:
+    name (str) : Name of the style input. Either the name of an entry of
+      plot_opts.json, e.g., 'barb_Opts', or a palette, or level set, of the
+      color_maps or contour_levels modules, with an optional level; e.g.,
+      'color_maps.precip' or 'contour_levels.heights[500.0MB]'
+
+  Returns:
+    The value of the style input
+
+  """
+
+  match = NAME_RE.match( name )
+  if match is None:
+    raise Exception( f'Invalid style input name : {name}' )
+  module, entry, level = match.group( 'module', 'entry', 'level' )
+  if module is None:
+    value = OPTS[entry]
+  elif module in MODULES:
+    value = getattr( MODULES[module], entry )
+  else:
+    raise Exception( f'Unknown style module : {module}' )
+  return value if level is None else value[level]
+
+@lru_cache( maxsize = None )
+def styleDigest( name ):
+  """
+  Digest of the value of a style input; see styleValue()
+
+  Style inputs only change when the package is reloaded, so digests are
+  computed once per process.
+
+  """
+
+  text = json.dumps( _canonical( styleValue( name ) ), sort_keys = True, default = str )
+  return hashlib.blake2b( text.encode(), digest_size = 16 ).hexdigest()
+
+def styleDigests( names ):
+  """Digests of style inputs, keyed by name"""
+
+  return {name : styleDigest( name ) for name in names}
+
+class StyleRecord( object ):
+  """
+  Record of the style inputs that the images of each product were drawn with
+
+  The digest of every style input of a product is recorded once images of
+  the product are drawn for a model; when style inputs change, the record
+  tells which products are affected, and only those need be drawn again.
+
+  """
+
+  def __init__(self, path):
+    """
+    Arguments:
+      path (str) : Full path of the record file
+
+    """
+
+    self.log    = logging.getLogger(__name__)
+    self.path   = path
+    self.styles = {}
+    if os.path.isfile( path ):
+      try:
+        with open( path, 'r' ) as fid:
+          self.styles = json.load( fid )
+      except Exception as err:
+        self.log.warning( f'Ignoring unreadable style record : {path}; {err}' )
+
+  def changed( self, products ):
+    """
+    Find products whose style inputs have changed since they were recorded
+
+    Products that have never been recorded are not considered changed.
+
+    Arguments:
+      products (dict) : Names of style inputs of each product, keyed by
+        product name
+
+    Returns:
+      dict : Names of the changed, added, or removed style inputs of each
+        affected product, keyed by product name
+
+    """
+
+    changed = {}
+    for key, names in products.items():
+      if key not in self.styles: continue
+      current  = styleDigests( names )
+      recorded = self.styles[key]
+      diff     = sorted( name for name in set(current).union( recorded )
+                              if current.get( name ) != recorded.get( name ) )
+      if len(diff) > 0: changed[key] = diff
+    return changed
+
+  def update( self, products, replace = True ):
+    """
+    Record the current style inputs of products
+
+    Arguments:
+      products (dict) : Names of style inputs of each product, keyed by
+        product name
+
+    Keyword arguments:
+      replace (bool) : If set, replace existing records of the products;
+        otherwise, only products with no record are recorded
+
+    """
+
+    styles = {key : styleDigests( names ) for key, names in products.items()
+                                          if replace or key not in self.styles}
+    if len(styles) == 0: return
+    self.styles.update( styles )
+
+    tmp = f'{self.path}.{os.getpid()}.tmp'
+    try:
+      os.makedirs( os.path.dirname( self.path ), exist_ok=True )
+      with open( tmp, 'w' ) as fid:
+        json.dump( self.styles, fid, indent = 1, sort_keys = True )
+      os.replace( tmp, self.path )
+    except Exception as err:
+      self.log.warning( f'Failed to write style record : {self.path}; {err}' )
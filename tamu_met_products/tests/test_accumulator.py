@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip( 'numpy' )
+
+from tamu_met_products.data_backends.accumulator import (
+  Accumulator, PRECIP, T2M, TOTAL, TMAX, TMIN, STATE
+)
+
+INIT = datetime( 2024, 1, 1, 0 )
+
+class Hour( dict ):
+  """Data of a forecast hour; stands in for AWIPSData"""
+
+  def getVar( self, name, level ):
+    return self[name][level]
+
+class StateCache( object ):
+  """Running states kept in memory; stands in for GridCache"""
+
+  def __init__(self):
+    self.states = {}
+
+  def stateTimes( self, model, initTime, name ):
+    return sorted( fcst for key, fcst in self.states if key == (model, initTime, name) )
+
+  def loadState( self, model, initTime, fcst, name ):
+    return self.states.get( ((model, initTime, name), fcst), None )
+
+  def saveState( self, model, initTime, fcst, name, data ):
+    self.states[ ((model, initTime, name), fcst) ] = data
+
+def hour( fcst, precip = None, t2m = None ):
+  data = Hour( initTime = INIT, fcstTime = INIT + timedelta( hours = fcst ) )
+  if precip is not None: data[PRECIP[0]] = {PRECIP[1] : np.full( 2, float(precip) )}
+  if t2m    is not None: data[T2M[0]]    = {T2M[1]    : np.full( 2, float(t2m) )}
+  return data
+
+def test_unseenListsEveryHour():
+  """Every hour not accumulated is reported, not only period ends"""
+
+  fcsts = [fcst * 3600 for fcst in range( 13 )]
+  assert Accumulator( 'NAM40' ).unseen( INIT, fcsts ) == fcsts
+
+  cache = StateCache()
+  accum = Accumulator( 'NAM40', cache = cache )
+  for fcst in range( 4 ):
+    accum.update( hour( fcst, t2m = 280 ) )
+  assert accum.unseen( INIT, fcsts ) == fcsts[4:]
+
+def test_extremesSampleEveryHour():
+  """Extremes between the rendered hours are kept"""
+
+  accum = Accumulator( 'NAM40' )
+  temps = [280, 283, 291, 285, 279, 270, 276]                                   # Peak and trough off the 3-hourly cadence
+  for fcst, t2m in enumerate( temps ):
+    data = accum.update( hour( fcst, t2m = t2m ) )
+  assert data[TMAX][T2M[1]][0] == max( temps )
+  assert data[TMIN][T2M[1]][0] == min( temps )
+
+def test_outOfOrderHourIsNotSaved():
+  """An hour accumulated before the hours it follows does not poison later ones"""
+
+  cache = StateCache()
+  accum = Accumulator( 'NAM40', cache = cache )
+  data  = accum.update( hour( 12, precip = 2, t2m = 280 ) )                     # Hours 0-11 not accumulated yet
+  assert TOTAL not in data
+  assert accum.unseen( INIT, [12 * 3600] ) == [12 * 3600]
+
+  accum = Accumulator( 'NAM40', cache = cache )                                 # As another worker, continuing from the cache
+  for fcst, precip in ((0, None), (6, 1), (12, 2)):
+    data = accum.update( hour( fcst, precip = precip, t2m = 280 ) )
+  assert data[TOTAL][PRECIP[1]][0] == 3
+
+  data = Accumulator( 'NAM40', cache = cache ).update( hour( 18, precip = 4, t2m = 280 ) )
+  assert data[TOTAL][PRECIP[1]][0] == 7
+
+def test_earlierHourAgain():
+  """Going back to an earlier hour, e.g., for priority rules, does not miss periods after it"""
+
+  accum = Accumulator( 'NAM40', cache = StateCache() )
+  for fcst, precip in ((0, None), (6, 1), (3, None), (7, None)):
+    data = accum.update( hour( fcst, precip = precip, t2m = 280 ) )
+  assert data[TOTAL][PRECIP[1]][0] == 1
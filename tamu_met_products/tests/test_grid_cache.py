@@ -0,0 +1,78 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+np = pytest.importorskip( 'numpy' )
+pytest.importorskip( 'metpy' )
+pytest.importorskip( 'awips' )
+
+from metpy.units import units
+
+from tamu_met_products.data_backends.grid_cache import GridCache, TIMEFMT
+from tamu_met_products.data_backends.time_index import ISO
+
+INIT = datetime( 2024, 1, 1, 0 )
+
+class Time( object ):
+  """AWIPS time; stands in for DataTime"""
+
+  def __init__(self, init, hour):
+    self.init = init
+    self.hour = hour
+
+  def __str__( self ):
+    return self.init.strftime( ISO )
+
+  def getFcstTime( self ):
+    return self.hour * 3600
+
+def grids():
+  return {'lon'         : np.zeros( (2, 2) ),
+          'lat'         : np.ones( (2, 2) ),
+          'temperature' : {'2.0FHAG' : np.full( (2, 2), 280.0 ) * units( 'K' )},
+          'precip'      : {'0.0SFC'  : np.arange( 4.0 ).reshape( 2, 2 )}}
+
+def test_saveAndLoad( tmp_path ):
+  """Grids, units, and coordinates are read back as written"""
+
+  cache = GridCache( str( tmp_path ) )
+  path  = cache.save( 'NAM40', [Time( INIT, 3 )], grids(), ['temperature', 'precip'] )
+  assert os.path.isfile( path ) and not os.path.isfile( f'{path}.{os.getpid()}.tmp' )
+
+  data = cache.load( 'NAM40', Time( INIT, 3 ) )
+  assert data['temperature']['2.0FHAG'].units == units( 'K' )
+  assert (data['temperature']['2.0FHAG'].magnitude == 280.0).all()
+  assert (data['precip']['0.0SFC'] == grids()['precip']['0.0SFC']).all()
+  assert (data['lat'] == 1).all()
+  assert cache.load( 'NAM40', Time( INIT, 6 ) ) is None
+
+def test_writerAbort( tmp_path ):
+  """An aborted writer leaves nothing behind"""
+
+  cache  = GridCache( str( tmp_path ) )
+  writer = cache.writer( 'NAM40', Time( INIT, 3 ) )
+  writer.addFields( grids(), ['temperature'] )
+  writer.abort()
+  assert os.listdir( os.path.dirname( writer.path ) ) == []
+  assert cache.load( 'NAM40', Time( INIT, 3 ) ) is None
+
+def test_states( tmp_path ):
+  cache = GridCache( str( tmp_path ) )
+  for hour in (12, 6):
+    cache.saveState( 'NAM40', INIT, hour * 3600, 'accum', {'precip total' : {'0.0SFC' : np.ones( 2 ) * hour}} )
+  cache.save( 'NAM40', Time( INIT, 3 ), grids(), ['precip'] )
+  assert cache.stateTimes( 'NAM40', INIT, 'accum' ) == [6 * 3600, 12 * 3600]
+  assert (cache.loadState( 'NAM40', INIT, 6 * 3600, 'accum' )['precip total']['0.0SFC'] == 6).all()
+  assert (cache.grid( 'NAM40' )[1] == 1).all()
+
+@pytest.mark.parametrize( 'retain', [2, 0] )
+def test_prune( tmp_path, retain ):
+  """Only the newest cycles retained are kept; none if retain is zero"""
+
+  cache  = GridCache( str( tmp_path ), retain = retain )
+  cycles = [INIT + timedelta( hours = 6 * i ) for i in range( 3 )]
+  for cycle in cycles:
+    cache.save( 'NAM40', Time( cycle, 0 ), grids(), [] )
+  cache.prune( 'NAM40' )
+  assert cache.cycles( 'NAM40' ) == (cycles[-retain:] if retain > 0 else [])
@@ -0,0 +1,39 @@
+import os
+
+from tamu_met_products.run_journal import RunJournal, PLANNED, DONE
+
+def test_replay( tmp_path ):
+  """State of every item is recovered when a journal is opened again"""
+
+  path    = os.path.join( tmp_path, 'journal', 'cycle.jsonl' )
+  journal = RunJournal( path )
+  journal.plan( ['a', 'b', 'c'] )
+  journal.start( 'a' )
+  journal.done( 'a' )
+  journal.start( 'b' )
+  journal.close()
+
+  journal = RunJournal( path )
+  assert journal.isDone( 'a' )
+  assert journal.inFlight() == ['b']
+  assert journal.state['c'] == PLANNED
+  assert journal.remaining( ['a', 'b', 'c'] ) == ['b', 'c']
+  journal.plan( ['a', 'd'] )                                                    # Items already journaled keep their state
+  assert journal.state['a'] == DONE
+  journal.close()
+
+def test_truncatedLine( tmp_path ):
+  """A partial last line is ignored, and entries after it are readable"""
+
+  path    = os.path.join( tmp_path, 'cycle.jsonl' )
+  journal = RunJournal( path )
+  journal.plan( ['a'] )
+  journal.close()
+  with open( path, 'a' ) as fid:
+    fid.write( '{"item" : "a", "sta' )
+
+  journal = RunJournal( path )
+  assert not journal.isDone( 'a' )
+  journal.done( 'a' )
+  journal.close()
+  assert RunJournal( path ).isDone( 'a' )
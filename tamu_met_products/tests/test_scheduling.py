@@ -0,0 +1,55 @@
+import pytest
+
+from tamu_met_products.scheduling import (
+  parseRule, rulePriority, parseCadence, ruleCadence, schedule, batches
+)
+
+class Time( object ):
+  """Forecast time; stands in for DataTime"""
+
+  def __init__(self, hour):
+    self.hour = hour
+
+  def getFcstTime( self ):
+    return self.hour * 3600
+
+def test_parseRule():
+  assert parseRule( '4-panel@0-48' )      == (['4-panel'], 0, 48)
+  assert parseRule( 'precip, mslp@-24' )  == (['precip', 'mslp'], None, 24)
+  assert parseRule( '*-hPa@12-' )         == (['*-hPa'], 12, None)
+  assert parseRule( '*' )                 == (['*'], None, None)
+
+def test_rulePriority():
+  priority = rulePriority( ['4-panel@0-48', '*-hPa'] )
+  assert priority(  0, '4-panel' ) == 0
+  assert priority( 49, '4-panel' ) == 2                                         # Past the rule; no other rule matches
+  assert priority( 49, '500-hPa' ) == 1
+  assert priority(  0, 'precip' )  == 2
+
+def test_parseCadence():
+  assert parseCadence( '*@37-84/3' ) == (['*'], 37, 84, 3)
+  with pytest.raises( Exception ):
+    parseCadence( '*@0-36' )
+  with pytest.raises( Exception ):
+    parseCadence( '*/0' )
+
+def test_ruleCadence():
+  cadence = ruleCadence( ['precip-24hr/6', '*@-36/1', '*@37-/3'] )
+  assert cadence( 12, 'precip-24hr' ) and not cadence( 13, 'precip-24hr' )
+  assert cadence( 13, '4-panel' )
+  assert cadence( 39, '4-panel' ) and not cadence( 40, '4-panel' )
+  assert ruleCadence( [] )( 7, '4-panel' )
+
+def test_scheduleAndBatches():
+  """Work is ordered by priority, then hour, then product; and grouped by time"""
+
+  times = [[Time( hour )] for hour in range( 3 )]                               # As listed by fcst_times()
+  items = [(time, product) for time in times for product in ('precip', '4-panel')]
+  work  = schedule( items, rulePriority( ['4-panel'] ), order = ['4-panel', 'precip'] )
+  assert [(time[0].hour, product) for time, product in work] == [
+    (0, '4-panel'), (1, '4-panel'), (2, '4-panel'),
+    (0, 'precip'),  (1, 'precip'),  (2, 'precip')]
+
+  work  = schedule( items, rulePriority( [] ), order = ['4-panel', 'precip'] )
+  assert [(time[0].hour, products) for time, products in batches( work )] == [
+    (0, ['4-panel', 'precip']), (1, ['4-panel', 'precip']), (2, ['4-panel', 'precip'])]
@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip( 'numpy' )
+pytest.importorskip( 'PIL' )
+
+from tamu_met_products.stamps import InputStamps, fieldDigest
+
+def hour( mslp ):
+  return {'mslp' : {'0.0MSL' : mslp}, 'temperature' : {'2.0FHAG' : np.zeros( (2, 2) )}}
+
+USES = {'mslp' : ['0.0MSL']}
+
+def test_fieldDigest():
+  """Digests follow values, type, and shape"""
+
+  field = np.arange( 4.0 )
+  assert fieldDigest( field ) == fieldDigest( field.copy() )
+  assert fieldDigest( field ) != fieldDigest( field + 1 )
+  assert fieldDigest( field ) != fieldDigest( field.astype( np.float32 ) )
+  assert fieldDigest( field ) != fieldDigest( field.reshape( 2, 2 ) )
+
+def test_stamp():
+  """Stamps change with the fields a product uses, and its parameters, only"""
+
+  mslp  = np.full( (2, 2), 1016.0 )
+  stamp = InputStamps( hour( mslp ) ).stamp( 'mslp', USES, domain = 'CONUS', dpi = 90 )
+  assert InputStamps( hour( mslp.copy() ) ).stamp( 'mslp', USES, domain = 'CONUS', dpi = 90 ) == stamp
+
+  other = hour( mslp )
+  other['temperature']['2.0FHAG'] = np.ones( (2, 2) )                           # Not used by the product
+  assert InputStamps( other ).stamp( 'mslp', USES, domain = 'CONUS', dpi = 90 ) == stamp
+
+  assert InputStamps( hour( mslp + 1 ) ).stamp( 'mslp', USES, domain = 'CONUS', dpi = 90 ) != stamp
+  assert InputStamps( hour( mslp ) ).stamp( 'mslp', USES, domain = 'CONUS', dpi = 180 ) != stamp
+
+def test_missingField():
+  stamps = InputStamps( hour( np.zeros( 2 ) ) )
+  assert stamps.field( 'mslp', '500.0MB' ) is None
+  assert stamps.field( 'mslp', '0.0MSL' ) is not None
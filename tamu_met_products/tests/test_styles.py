@@ -0,0 +1,44 @@
+import os, json
+
+import pytest
+
+pytest.importorskip( 'numpy' )
+pytest.importorskip( 'matplotlib' )
+
+from tamu_met_products.styles import StyleRecord, styleValue, styleDigest, OPTS
+
+def test_styleValue():
+  assert styleValue( 'barb_Opts' ) == OPTS['barb_Opts']
+  levels = styleValue( 'contour_levels.heights' )
+  assert (styleValue( 'contour_levels.heights[500.0MB]' ) == levels['500.0MB']).all()
+  with pytest.raises( Exception ):
+    styleValue( 'not a name' )
+  with pytest.raises( Exception ):
+    styleValue( 'unknown.heights' )
+
+def test_styleDigest():
+  assert styleDigest( 'color_maps.precip' ) == styleDigest( 'color_maps.precip' )
+  assert styleDigest( 'contour_levels.heights[500.0MB]' ) != styleDigest( 'contour_levels.heights[850.0MB]' )
+
+def test_record( tmp_path ):
+  """Only recorded products whose style inputs differ are changed"""
+
+  path     = os.path.join( tmp_path, '.styles.json' )
+  products = {'mslp' : ['contour_Opts', 'contour_levels.mslp'], 'precip' : ['color_maps.precip']}
+  record   = StyleRecord( path )
+  assert record.changed( products ) == {}                                       # Nothing recorded yet
+  record.update( {'mslp' : products['mslp']} )
+  assert StyleRecord( path ).changed( products ) == {}
+
+  with open( path, 'r' ) as fid:
+    styles = json.load( fid )
+  styles['mslp']['contour_levels.mslp'] = 'old'
+  with open( path, 'w' ) as fid:
+    json.dump( styles, fid )
+
+  record = StyleRecord( path )
+  assert record.changed( products ) == {'mslp' : ['contour_levels.mslp']}
+  record.update( products, replace = False )                                    # Changes are kept until replaced
+  assert StyleRecord( path ).changed( products ) == {'mslp' : ['contour_levels.mslp']}
+  record.update( products )
+  assert StyleRecord( path ).changed( products ) == {}
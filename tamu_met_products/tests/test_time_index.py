@@ -0,0 +1,72 @@
+import os
+from datetime import datetime, timedelta
+
+from tamu_met_products.data_backends.time_index import TimeIndex, ISO
+
+INIT = datetime( 2024, 1, 1, 0 )
+NEXT = INIT + timedelta( hours = 6 )
+
+class Period( object ):
+  def duration( self ):
+    return 0
+
+class Time( object ):
+  """AWIPS time; stands in for DataTime"""
+
+  def __init__(self, init, hour):
+    self.init = init
+    self.hour = hour
+
+  def __str__( self ):
+    return self.init.strftime( ISO )
+
+  def getFcstTime( self ):
+    return self.hour * 3600
+
+  def getValidPeriod( self ):
+    return Period()
+
+def times( init, hours ):
+  return [Time( init, hour ) for hour in hours]
+
+def test_newerCycleMustSettle():
+  """A cycle with a newer one is only complete once it is old enough"""
+
+  index = TimeIndex( settle = 12 * 3600 )
+  index.add( times( INIT, range( 0, 40, 3 ) ) + times( NEXT, [0] ), now = INIT + timedelta( hours = 7 ) )
+  assert not index.isComplete( INIT )                                           # Late hours may still be ingesting
+  index.add( times( INIT, range( 0, 85, 3 ) ) + times( NEXT, [0] ), now = INIT + timedelta( hours = 12 ) )
+  assert index.isComplete( INIT )
+  assert max( index.run( INIT ) ) == 84 * 3600
+  assert not index.isComplete( NEXT )
+
+def test_finalHour():
+  """With the final forecast hour known, a cycle is complete once it has that hour"""
+
+  index = TimeIndex( final = 84 * 3600, settle = 0 )
+  index.add( times( INIT, range( 0, 40, 3 ) ) + times( NEXT, [0] ), now = INIT + timedelta( days = 1 ) )
+  assert not index.isComplete( INIT )
+  index.add( times( INIT, range( 0, 85, 3 ) ), now = INIT + timedelta( hours = 1 ) )
+  assert index.isComplete( INIT )
+
+def test_completeCyclesAreKept():
+  """Times of complete cycles are not replaced, and cycles gone from the server are removed"""
+
+  index = TimeIndex( final = 6 * 3600 )
+  index.add( times( INIT, [0, 6] ) )
+  index.add( times( INIT, [0] ) + times( NEXT, [0] ) )
+  assert list( index.run( INIT ) ) == [0, 6 * 3600]
+  assert index.sync( [NEXT] )
+  assert index.run( INIT ) is None
+  assert not index.sync( [NEXT] )
+
+def test_saveAndLoad( tmp_path ):
+  path  = os.path.join( tmp_path, 'cache', 'NAM40.times.pkl' )
+  index = TimeIndex( path, final = 6 * 3600 )
+  index.add( times( INIT, [0, 6] ) )
+  index.save()
+  assert TimeIndex( path ).isComplete( INIT )
+
+  with open( path, 'wb' ) as fid:
+    fid.write( b'not an index' )
+  assert TimeIndex( path ).cycles == {}
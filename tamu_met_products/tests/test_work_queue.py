@@ -0,0 +1,86 @@
+import os, time
+
+from tamu_met_products.work_queue import WorkQueue, QUEUED, LEASED, DONE, FAILED
+
+CYCLE = '20240101T000000'
+
+def items( cycle = CYCLE, fcsts = (0, 3600), products = ('4-panel', 'precip') ):
+  return [('NAM40', cycle, fcst, product) for fcst in fcsts for product in products]
+
+def test_leaseOneForecastTime( tmp_path ):
+  """All items of the highest ranked forecast time are leased together"""
+
+  queue = WorkQueue( os.path.join( tmp_path, 'queue.db' ) )
+  assert queue.enqueue( items() ) == 4
+  leased = queue.lease( 'a' )
+  assert leased == items( fcsts = (0,) )
+  assert queue.counts() == {QUEUED : 2, LEASED : 2}
+
+def test_noDoubleLease( tmp_path ):
+  """Items leased by one worker are not handed to another"""
+
+  queue = WorkQueue( os.path.join( tmp_path, 'queue.db' ) )
+  queue.enqueue( items() )
+  first  = queue.lease( 'a' )
+  second = queue.lease( 'b' )
+  assert set( first ).isdisjoint( second )
+  assert queue.lease( 'c' ) == []
+  assert all( queue.ack( 'a', item ) for item in first )
+  assert not queue.ack( 'a', second[0] )                                        # Not leased by this worker
+  assert queue.outstanding() == 2
+
+def test_expiredLeaseIsHandedOver( tmp_path ):
+  """Items of a worker whose lease expired go to another, and only it may ack them"""
+
+  queue = WorkQueue( os.path.join( tmp_path, 'queue.db' ), lease = 0.05 )
+  queue.enqueue( items( fcsts = (0,) ) )
+  first = queue.lease( 'a' )
+  assert queue.lease( 'b' ) == []
+  time.sleep( 0.1 )
+  assert queue.lease( 'b' ) == first
+  assert not any( queue.ack( 'a', item ) for item in first )                    # Lease was lost; the item is not rendered twice
+  assert all( queue.ack( 'b', item ) for item in first )
+  assert queue.counts() == {DONE : 2}
+
+def test_renewKeepsLease( tmp_path ):
+  """Renewed leases do not expire"""
+
+  queue = WorkQueue( os.path.join( tmp_path, 'queue.db' ), lease = 0.2 )
+  queue.enqueue( items( fcsts = (0,) ) )
+  first = queue.lease( 'a' )
+  time.sleep( 0.15 )
+  queue.renew( 'a', first )
+  time.sleep( 0.1 )
+  assert queue.lease( 'b' ) == []
+
+def test_failedAfterMaxAttempts( tmp_path ):
+  """Items whose leases keep expiring are marked failed"""
+
+  queue = WorkQueue( os.path.join( tmp_path, 'queue.db' ), lease = 0.01, max_attempts = 2 )
+  queue.enqueue( items( fcsts = (0,), products = ('precip',) ) )
+  for _ in range( 2 ):
+    assert len( queue.lease( 'a' ) ) == 1
+    time.sleep( 0.02 )
+  assert queue.lease( 'a' ) == []
+  assert queue.counts() == {FAILED : 1}
+
+def test_enqueueAgain( tmp_path ):
+  """Finished items are queued again; queued and leased items are untouched"""
+
+  queue = WorkQueue( os.path.join( tmp_path, 'queue.db' ) )
+  queue.enqueue( items() )
+  for item in queue.lease( 'a' ):
+    queue.ack( 'a', item )
+  queue.lease( 'b' )
+  assert queue.enqueue( items() ) == 2
+  assert queue.counts() == {QUEUED : 2, LEASED : 2}
+
+def test_pruneOldCycles( tmp_path ):
+  """Finished items of cycles older than those retained are removed"""
+
+  queue = WorkQueue( os.path.join( tmp_path, 'queue.db' ), retain = 1 )
+  queue.enqueue( items( fcsts = (0,) ) )
+  for item in queue.lease( 'a' ):
+    queue.ack( 'a', item )
+  queue.enqueue( items( cycle = '20240101T060000', fcsts = (0,) ) )
+  assert queue.counts() == {QUEUED : 2}
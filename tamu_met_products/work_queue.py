@@ -0,0 +1,241 @@
+import logging
+import os, time, sqlite3
+from contextlib import contextmanager
+from threading import Thread, Event
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE   = 'done'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+  model         TEXT    NOT NULL,
+  cycle         TEXT    NOT NULL,
+  fcst          INTEGER NOT NULL,
+  product       TEXT    NOT NULL,
+  rank          INTEGER NOT NULL DEFAULT 0,
+  state         TEXT    NOT NULL DEFAULT 'queued',
+  worker        TEXT,
+  lease_expires REAL,
+  attempts      INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (model, cycle, fcst, product)
+);
+CREATE INDEX IF NOT EXISTS items_state ON items (state, rank);
+"""
+
+class WorkQueue( object ):
+  """
+  Work queue of products to render, backed by a SQLite file
+
+  A coordinator enqueues (model, cycle, forecast time, product) items and
+  any number of workers, on any host that can see the file, lease the items
+  for one forecast time at a time so that the data only has to be
+  downloaded once. Leases expire if not renewed, so the items of a worker
+  that died are handed to another worker. Items are only acknowledged by
+  the worker that holds the lease, so no product is rendered twice.
+
+  The file is opened with the default rollback journal, rather than WAL,
+  as WAL does not work on network file systems.
+
+  """
+
+  def __init__(self, path, lease = 600.0, max_attempts = 3, retain = 2):
+    """
+    Arguments:
+      path (str) : Path to the SQLite file; created if it does not exist
+
+    Keyword arguments:
+      lease (float) : Seconds that a worker holds items before they are
+        handed to another worker, unless the lease is renewed
+      max_attempts (int) : Number of times an item is leased before it
+        is marked failed
+      retain (int) : Number of most recent cycles of each model whose
+        finished items, done or failed, are kept; older ones are removed
+        when items are enqueued
+
+    """
+
+    self.log          = logging.getLogger(__name__)
+    self.path         = path
+    self.leaseTime    = lease
+    self.max_attempts = max_attempts
+    self.retain       = retain
+
+    root = os.path.dirname( os.path.abspath( path ) )
+    os.makedirs( root, exist_ok=True )
+    with self._connect() as conn:
+      conn.executescript( SCHEMA )
+
+  @contextmanager
+  def _connect( self ):
+    """New connection for every operation; connections are not thread safe"""
+
+    conn = sqlite3.connect( self.path, timeout = 60.0, isolation_level = None )
+    try:
+      yield conn
+    finally:
+      conn.close()
+
+  @contextmanager
+  def _transaction( self ):
+    """Write transaction; takes the database lock up front"""
+
+    with self._connect() as conn:
+      conn.execute( 'BEGIN IMMEDIATE' )
+      try:
+        yield conn
+      except:
+        conn.execute( 'ROLLBACK' )
+        raise
+      else:
+        conn.execute( 'COMMIT' )
+
+  def enqueue( self, items ):
+    """
+    Add work items to the queue
+
+    Items that are already queued, or leased, are left untouched; items
+    that are done, or failed, are queued again, so products can be created
+    again, e.g., when updating. Finished items of old cycles are removed.
+
+    Arguments:
+      items (list) : Tuples of (model, cycle, forecast seconds, product);
+        position in the list is the rank of the item, lower ranks are
+        leased first
+
+    Returns:
+      int : Number of items added, or queued again
+
+    """
+
+    rows = [ (*item, rank) for rank, item in enumerate( items ) ]
+    with self._transaction() as conn:
+      before = conn.total_changes
+      conn.executemany(
+        'INSERT INTO items (model, cycle, fcst, product, rank) VALUES (?, ?, ?, ?, ?) '
+        'ON CONFLICT (model, cycle, fcst, product) DO UPDATE '
+        'SET state = ?, rank = excluded.rank, worker = NULL, lease_expires = NULL, attempts = 0 '
+        'WHERE state IN (?, ?)',
+        [ (*row, QUEUED, DONE, FAILED) for row in rows ]
+      )
+      added  = conn.total_changes - before
+      self._prune( conn, {item[0] for item in items} )
+    self.log.info( f'Enqueued {added} of {len(rows)} work items' )
+    return added
+
+  def _prune( self, conn, models ):
+    """Remove finished items of all but the most recent cycles of models"""
+
+    if not self.retain: return
+    for model in models:
+      cur = conn.execute(
+        'DELETE FROM items WHERE model = ? AND state IN (?, ?) AND cycle NOT IN '
+        '(SELECT DISTINCT cycle FROM items WHERE model = ? ORDER BY cycle DESC LIMIT ?)',
+        (model, DONE, FAILED, model, self.retain)
+      )
+      if cur.rowcount > 0:
+        self.log.debug( f'Removed {cur.rowcount} finished {model} items of old cycles' )
+
+  def lease( self, worker ):
+    """
+    Lease all available items for the highest ranked forecast time
+
+    Arguments:
+      worker (str) : Unique name of the worker
+
+    Returns:
+      list : Tuples of (model, cycle, forecast seconds, product); empty if
+        there are no items available
+
+    """
+
+    now = time.time()
+    with self._transaction() as conn:
+      available = "(state = ? OR (state = ? AND lease_expires < ?))"
+      conn.execute(
+        f'UPDATE items SET state = ? WHERE {available} AND attempts >= ?',
+        (FAILED, QUEUED, LEASED, now, self.max_attempts)
+      )                                                                         # Give up on items that keep failing
+      row = conn.execute(
+        f'SELECT model, cycle, fcst FROM items WHERE {available} ORDER BY rank LIMIT 1',
+        (QUEUED, LEASED, now)
+      ).fetchone()
+      if row is None: return []
+
+      items = conn.execute(
+        f'SELECT model, cycle, fcst, product FROM items '
+        f'WHERE model = ? AND cycle = ? AND fcst = ? AND {available} ORDER BY rank',
+        (*row, QUEUED, LEASED, now)
+      ).fetchall()
+      conn.executemany(
+        'UPDATE items SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 '
+        'WHERE model = ? AND cycle = ? AND fcst = ? AND product = ?',
+        [ (LEASED, worker, now + self.leaseTime, *item) for item in items ]
+      )
+
+    if len(items) > 0:
+      self.log.debug( f'Worker {worker} leased {len(items)} items' )
+    return items
+
+  def renew( self, worker, items ):
+    """Extend the lease on items held by worker"""
+
+    with self._transaction() as conn:
+      conn.executemany(
+        'UPDATE items SET lease_expires = ? '
+        'WHERE model = ? AND cycle = ? AND fcst = ? AND product = ? AND worker = ? AND state = ?',
+        [ (time.time() + self.leaseTime, *item, worker, LEASED) for item in items ]
+      )
+
+  def _release( self, worker, item, state ):
+    with self._transaction() as conn:
+      cur = conn.execute(
+        'UPDATE items SET state = ?, lease_expires = NULL '
+        'WHERE model = ? AND cycle = ? AND fcst = ? AND product = ? AND worker = ? AND state = ?',
+        (state, *item, worker, LEASED)
+      )
+    if cur.rowcount == 0:
+      self.log.warning( f'Worker {worker} no longer holds lease on : {item}' )
+    return cur.rowcount > 0
+
+  def ack( self, worker, item ):
+    """Mark an item, leased by worker, as done"""
+
+    return self._release( worker, item, DONE )
+
+  def fail( self, worker, item ):
+    """Return an item, leased by worker, to the queue to be retried"""
+
+    return self._release( worker, item, QUEUED )
+
+  def counts( self ):
+    """Dictionary with number of items in each state"""
+
+    with self._connect() as conn:
+      return dict( conn.execute( 'SELECT state, COUNT(*) FROM items GROUP BY state' ).fetchall() )
+
+  def outstanding( self ):
+    """Number of items that are queued or leased"""
+
+    counts = self.counts()
+    return counts.get( QUEUED, 0 ) + counts.get( LEASED, 0 )
+
+  @contextmanager
+  def heartbeat( self, worker, items ):
+    """Context manager that renews the lease on items while work is done"""
+
+    stop = Event()
+    def beat():
+      while not stop.wait( self.leaseTime / 3.0 ):
+        try:
+          self.renew( worker, items )
+        except Exception as err:
+          self.log.warning( f'Failed to renew lease : {err}' )
+    thread = Thread( target = beat, daemon = True )
+    thread.start()
+    try:
+      yield
+    finally:
+      stop.set()
+      thread.join()